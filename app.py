@@ -1,18 +1,45 @@
-from flask import Flask, jsonify, request, render_template, redirect, url_for, session, flash 
+from flask import Flask, Response, make_response, jsonify, request, render_template, redirect, url_for, session, flash, g, stream_with_context
 from werkzeug.security import generate_password_hash, check_password_hash
 from dotenv import load_dotenv
-from datetime import datetime
-from datetime import timedelta as td
+from datetime import datetime, timedelta
+from functools import partial, wraps
 import os
+import sqlite3
+import tempfile
+import threading
+import time
 import pymysql
-import random
-from simple_spaced_repetition import Card
-from wiki_api import fetch_wikipedia_article, remove_references, process_text, translate_words
+import numpy as np
+from card_state import CardState, card_from_row
+from db_pool import ConnectionPool
+from deck_io import EXPORT_CHUNK_SIZE, format_export_chunks, iter_file_rows
+import deck_stats
+import metrics
+from spaced_repetition import forecast_due_per_day, interval_us
+from fragment_cache import FragmentCache
+from jobs import JobFailed, JobManager
+from repository import MERGE_POLICIES, MySQLRepository
+from review_log import ReviewEvent, ReviewLogWriter
+from review_session import ReviewSession, create_review_session_store, new_session_token
+from shard_router import ShardRouter, shard_databases
+import sqlite_repository
+from sqlite_repository import SQLiteRepository, SQLiteTranslationStore, connect_sqlite
+from translation_cache import MySQLTranslationStore, TranslationCache
+from wiki_api import (
+    fetch_article_word_freq, translate_words, default_translator, warm_up,
+    fetch_wikipedia_articles, fetch_category_titles, process_corpus, article_cache
+)
 
 load_dotenv()
 
 app = Flask(__name__)
-app.secret_key = 'capybara'
+app.secret_key = os.getenv('SECRET_KEY', 'capybara')  # async_api.py reads the same session cookie
+
+# Where decks, cards and reviews are stored (repository.py): 'mysql', or 'sqlite' for a
+# single node with everything in one embedded database file (SQLITE_PATH)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mysql')
+SQLITE_PATH = os.getenv('SQLITE_PATH', sqlite_repository.DEFAULT_PATH)
+SQLITE_POOL_MAX_SIZE = int(os.getenv('SQLITE_POOL_MAX_SIZE', 10))
 
 # Get MySQL connection details from environment variables
 MYSQL_HOST = os.getenv('MYSQL_HOST')
@@ -20,67 +47,204 @@ MYSQL_USER = os.getenv('MYSQL_USER')
 MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD')
 MYSQL_DB = os.getenv('MYSQL_DB')
 
-class NewCard(Card):
-    def __init__(self, id, front, back, last_reviewed=None, interval=None, ease=2.5, step=0, status='learning'):
-        
-        interval_td = td(seconds=interval) if isinstance(interval, (int, float)) else interval
-        super().__init__(status=status, interval=interval_td, ease=ease, step=step)
+# Connection pool sizing (see .env.example)
+MYSQL_POOL_MIN_SIZE = int(os.getenv('MYSQL_POOL_MIN_SIZE', 2))
+MYSQL_POOL_MAX_SIZE = int(os.getenv('MYSQL_POOL_MAX_SIZE', 10))
+MYSQL_POOL_TIMEOUT = float(os.getenv('MYSQL_POOL_TIMEOUT', 5))
 
-        self.id = id
-        self.front = front
-        self.back = back
+# Review queues live server-side; only a short token goes in the session cookie
+REVIEW_SESSION_BACKEND = os.getenv('REVIEW_SESSION_BACKEND', 'memory')
+REVIEW_SESSION_TTL = int(os.getenv('REVIEW_SESSION_TTL', 3600))
+REDIS_URL = os.getenv('REDIS_URL')
 
-        if isinstance(last_reviewed, str):
-            self.last_reviewed = datetime.strptime(last_reviewed, "%Y-%m-%d %H:%M:%S")
-        elif isinstance(last_reviewed, float):
-            self.last_reviewed = datetime.fromtimestamp(last_reviewed)
-        else:
-            self.last_reviewed = last_reviewed or datetime.now()
-    def grade_answer(self, response):
-        option_dict = dict(self.options())
-        if response not in option_dict:
-            raise ValueError(f"Invalid response: {response}")
-        
-        next_state = option_dict[response]
-
-        self.status = next_state.status
-        self.interval = next_state.interval
-        self.ease = next_state.ease
-        self.step = next_state.step
-        self.last_reviewed = datetime.now()
-    
-def get_db_connection():
+# Worker threads for background jobs such as Wikipedia deck creation
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+
+# Review log write-behind buffer (review_log.py): local spool directory and flush thresholds
+REVIEW_LOG_SPOOL_DIR = os.getenv('REVIEW_LOG_SPOOL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'review_spool'))
+REVIEW_LOG_BATCH_SIZE = int(os.getenv('REVIEW_LOG_BATCH_SIZE', 200))
+REVIEW_LOG_FLUSH_INTERVAL = float(os.getenv('REVIEW_LOG_FLUSH_INTERVAL', 1.0))
+REVIEW_LOG_FSYNC = os.getenv('REVIEW_LOG_FSYNC', '1') == '1'
+
+# Statements and requests slower than this (milliseconds) are logged to flashcards.slow; 0 turns the log off
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 500))
+metrics.slow_query_seconds = SLOW_QUERY_MS / 1000 if SLOW_QUERY_MS > 0 else None
+metrics.slow_request_seconds = SLOW_REQUEST_MS / 1000 if SLOW_REQUEST_MS > 0 else None
+
+# Load NLTK tokenizers/stopwords at import (e.g. gunicorn --preload) instead of on the first deck
+if os.getenv('NLTK_WARM_UP') == '1':
+    warm_up()
+
+def connect_mysql(host=MYSQL_HOST, db=MYSQL_DB):
     connection = pymysql.connect(
-        host=MYSQL_HOST,
+        host=host,
         user=MYSQL_USER,
         password=MYSQL_PASSWORD,
-        db=MYSQL_DB,  # the database you want to use
+        db=db,  # the database you want to use
         charset='utf8mb4',
-        cursorclass=pymysql.cursors.DictCursor
+        cursorclass=metrics.InstrumentedCursor  # DictCursor that times every statement
     )
     return connection
 
-shuffled_cards = []
-current_card_index = 0 
+if STORAGE_BACKEND == 'mysql':
+    Repository, TranslationStore = MySQLRepository, MySQLTranslationStore
+    # One pool per shard (MYSQL_SHARDS); a single database unless sharding is configured
+    shard_router = ShardRouter([
+        ConnectionPool(
+            partial(connect_mysql, host, db),
+            min_size=MYSQL_POOL_MIN_SIZE,
+            max_size=MYSQL_POOL_MAX_SIZE,
+            timeout=MYSQL_POOL_TIMEOUT
+        )
+        for host, db in shard_databases(default_host=MYSQL_HOST, default_db=MYSQL_DB)
+    ])
+elif STORAGE_BACKEND == 'sqlite':
+    Repository, TranslationStore = SQLiteRepository, SQLiteTranslationStore
+    # A single shard; connections are pooled so each keeps its pragmas and statement cache
+    shard_router = ShardRouter([
+        ConnectionPool(partial(connect_sqlite, SQLITE_PATH), min_size=1, max_size=SQLITE_POOL_MAX_SIZE,
+                       timeout=MYSQL_POOL_TIMEOUT)
+    ])
+else:
+    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+# Shard 0: users, translations, and everything when there is only one database
+db_pool = shard_router.directory
+
+def shard_connection(shard):
+    connections = g.setdefault('db_connections', {})
+    connection = connections.get(shard)
+    if connection is None or connection.released:
+        connection = shard_router.pools[shard].acquire()
+        connections[shard] = connection
+    return connection
+
+# One pooled connection per request (on the logged-in user's shard); it goes back to the
+# pool on close() or at teardown
+def get_db_connection():
+    return shard_connection(shard_router.shard_for(session.get('user_id')))
+
+# The users table lives on the directory shard only
+def get_directory_connection():
+    return shard_connection(0)
+
+# Routes and jobs go through a Repository instead of writing SQL themselves
+def get_repository():
+    return Repository(get_db_connection())
+
+def get_directory_repository():
+    return Repository(get_directory_connection())
+
+# Jobs run outside a request: check a connection out of the user's pool directly
+def open_repository(user_id):
+    return Repository(shard_router.pool_for(user_id).acquire())
+
+@app.teardown_appcontext
+def release_db_connection(exception):
+    for connection in g.pop('db_connections', {}).values():
+        connection.close()
+
+# Per-route latency, status and query count for /metrics
+@app.before_request
+def start_request_metrics():
+    g.metrics_started = time.perf_counter()
+    g.metrics_token = metrics.begin_request()
+
+@app.after_request
+def record_response_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exception):
+    # Popped: a streamed response (export_deck) runs the teardown again when the stream ends
+    token = g.pop('metrics_token', None)
+    if token is not None:
+        # The rule pattern (/deck/<int:deck_id>), not the path, keeps the label set small
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.end_request(token, route, request.method, g.get('metrics_status', 500),
+                            time.perf_counter() - g.metrics_started)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    for shard, stats in enumerate(shard_router.stats()):
+        metrics.db_pool_connections.set(str(shard), 'idle', value=stats['idle'])
+        metrics.db_pool_connections.set(str(shard), 'in_use', value=stats['in_use'])
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/db_pool_stats', methods=['GET'])
+def db_pool_stats():
+    if len(shard_router.pools) > 1:
+        return jsonify(shard_router.stats())
+    return jsonify(db_pool.stats())
+
+# Every deck and card route works inside the logged-in user's partition
+def login_required(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if 'user_id' not in session:
+            if request.path.startswith(('/api/', '/jobs/')):
+                return jsonify({"message": "Login required."}), 401
+            return redirect(url_for('signinpage'))
+        return view(*args, **kwargs)
+    return wrapped
+
+review_sessions = create_review_session_store(
+    REVIEW_SESSION_BACKEND,
+    ttl=REVIEW_SESSION_TTL,
+    redis_url=REDIS_URL
+)
+
+jobs = JobManager(max_workers=JOB_WORKERS)
+
+# Created on first use in each worker process: its flush thread and spool lock must not be
+# shared across a fork (gunicorn --preload)
+review_log = None
+review_log_lock = threading.Lock()
+
+def get_review_log():
+    global review_log
+    with review_log_lock:
+        if review_log is None or review_log.owner.split('-')[0] != str(os.getpid()):
+            review_log = ReviewLogWriter(
+                shard_router.pool_for,
+                REVIEW_LOG_SPOOL_DIR,
+                Repository,
+                batch_size=REVIEW_LOG_BATCH_SIZE,
+                flush_interval=REVIEW_LOG_FLUSH_INTERVAL,
+                fsync=REVIEW_LOG_FSYNC
+            )
+        return review_log
+
+@app.route('/review_log_stats', methods=['GET'])
+def review_log_stats():
+    return jsonify(get_review_log().stats())
+
+# Translations are memoized in the translations table so common words are only translated once
+translation_cache = TranslationCache(
+    translator=default_translator(),
+    store=TranslationStore(db_pool.acquire)
+)
 
 @app.route('/')
 def index():
     if 'user_id' in session:
-        connection = get_db_connection()
-        with connection.cursor() as cursor: # aggregate function 
-            cursor.execute("""
-                SELECT decks.id, decks.name, COUNT(flashcards.id) AS flashcard_count
-                FROM decks
-                LEFT JOIN flashcards ON flashcards.deck_id = decks.id
-                GROUP BY decks.id
-                ORDER BY decks.name
-            """)
-            decks = cursor.fetchall()
-        connection.close()
+        user_id = session['user_id']
+        repository = get_repository()
+        # Counts come from the materialized deck_stats table (O(#decks)); decks whose
+        # stats are from an earlier day are recomputed first so due counts roll over
+        if repository.refresh_stale_deck_stats(user_id):
+            repository.commit()
+        decks = repository.deck_list(user_id)
+        repository.close()
         return render_template('index.html', decks=decks)
     else: 
         return render_template('signinpage.html')
 
+# What create_user raises for a duplicate username on either backend
+USERNAME_TAKEN_ERRORS = (pymysql.err.IntegrityError, sqlite3.IntegrityError)
+
 @app.route('/signup', methods=['GET','POST'])
 def signup():
     if request.method == 'POST':
@@ -89,87 +253,225 @@ def signup():
         password = request.form['password']
         hashed_pw = generate_password_hash(password)
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("INSERT INTO users (username, email, password_hash) VALUES (%s, %s, %s)", 
-                       (username, email, hashed_pw))
-        conn.commit()
-        conn.close()
+        repository = get_directory_repository()
+        try:
+            repository.create_user(username, email, hashed_pw)
+            repository.commit()
+        except USERNAME_TAKEN_ERRORS:
+            # users.username is unique (migration 0007)
+            repository.rollback()
+            return render_template('signup.html', error="That username is already taken."), 409
+        finally:
+            repository.close()
         return redirect(url_for('login'))
 
     return render_template('signup.html')
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
-    print("Request method:", request.method)
-
     if request.method == 'POST':
 
         username = request.form['username']
         password = request.form['password']
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
-        user = cursor.fetchone()
-        conn.close()
+        repository = get_directory_repository()
+        user = repository.user_by_username(username)
+        repository.close()
 
         if user and check_password_hash(user['password_hash'], password):
             session['user_id'] = user['id']
-            print("Login successful.")
+            app.logger.info("Login successful for user %s", user['id'])
             return redirect(url_for('index'))
         else:
-            print("Invalid credentials.")
+            app.logger.info("Invalid credentials for %s", username)
 
     return render_template('login.html')
 
 @app.route('/logout', methods=['POST'])
 def logout():
     session.pop('user_id', None)  # Remove the user_id from the session
+    session.pop('review_token', None)
     return redirect(url_for('signinpage'))
 
 @app.route('/signinpage')
 def signinpage():
     return render_template('signinpage.html')
 
+DECK_PAGE_SIZE = int(os.getenv('DECK_PAGE_SIZE', 100))
+
+# Rendered card lists, keyed by (user, deck, version, page)
+deck_page_cache = FragmentCache(max_entries=int(os.getenv('DECK_PAGE_CACHE_SIZE', 256)))
+
 @app.route('/deck/<int:deck_id>', methods=['GET'])
+@login_required
 def print_deck(deck_id):
-    connection = get_db_connection()
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT name FROM decks WHERE id = %s",(deck_id,))
-        deck=cursor.fetchone()
-
-        if deck is None: 
-            return "Deck not found!", 404
-        
-        deck_name = deck['name']
-        cursor.execute("SELECT * FROM flashcards WHERE deck_id = %s", (deck_id,))
-        flashcards = cursor.fetchall()
-    connection.close()
-    
-    if deck:
-        return render_template('deck.html', deck_name=deck_name, flashcards=flashcards, deck_id=deck_id)
+    user_id = session['user_id']
+    after = request.args.get('after', 0, type=int)
+
+    repository = get_repository()
+    deck = repository.owned_deck(deck_id, user_id)
+
+    if deck is None: 
+        repository.close()
+        return "Deck not found!", 404
+
+    # Unchanged since the browser's copy: answer from the version alone
+    etag = f"deck-{user_id}-{deck_id}-{deck['version']}-{after}"
+    if request.if_none_match.contains(etag):
+        repository.close()
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    key = (user_id, deck_id, deck['version'], after)
+    cards_html = deck_page_cache.get(key)
+    if cards_html is None:
+        # One page in id order, only the columns the template shows
+        flashcards = repository.deck_page(deck_id, after, DECK_PAGE_SIZE + 1)
+        next_after = None
+        if len(flashcards) > DECK_PAGE_SIZE:
+            flashcards = flashcards[:DECK_PAGE_SIZE]
+            next_after = flashcards[-1]['id']
+        cards_html = render_template('deck_cards.html', flashcards=flashcards, deck_id=deck_id,
+                                     after=after, next_after=next_after)
+        deck_page_cache.put(key, cards_html)
+    repository.close()
+
+    response = make_response(render_template('deck.html', deck_name=deck['name'], deck_id=deck_id,
+                                              cards_html=cards_html, deck=deck))
+    response.set_etag(etag)
+    # Let the browser keep the page but check back every time (cheap 304 when unchanged)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/wiki_cache_stats', methods=['GET'])
+def wiki_cache_stats():
+    return jsonify(article_cache.stats() if article_cache else {"enabled": False})
+
+@app.route('/deck_page_cache_stats', methods=['GET'])
+def deck_page_cache_stats():
+    return jsonify(deck_page_cache.stats())
 
 
 @app.route('/add_deck', methods=['POST'])
+@login_required
 def add_deck():
     deck_name = request.form['deck_name']
 
     if deck_name:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-
-        cursor.execute("INSERT INTO decks (name) VALUES (%s)", (deck_name,))
-        connection.commit()
-
-        connection.close()
+        repository = get_repository()
+        repository.create_deck(session['user_id'], deck_name)
+        repository.commit()
+        repository.close()
 
         return redirect(url_for('index'))
     else:
         return jsonify({"message": "Deck name cannot be empty."})
     
+# Wikipedia decks are built by a background job; the page polls /jobs/<job_id> for progress
+def build_wikipedia_deck(job, user_id, deck_name, lang_code):
+    # The article cache keeps the word counts with the extract, so an unchanged article is
+    # neither downloaded nor processed again. process_text skips <ref>/<sup> while parsing.
+    job.update(stage='fetching article', progress=5)
+    word_freq = fetch_article_word_freq(deck_name, lang_code)
+
+    # If the fetch failed or the article is empty, fail the job and don't create the deck
+    if not word_freq:
+        raise JobFailed("Failed to fetch Wikipedia article. Please try again.")
+
+    top_words = [word for word, _ in word_freq.most_common(100)]
+    deck_id = translate_and_save_deck(job, user_id, deck_name, lang_code, top_words, source_title=deck_name)
+    return {"deck_id": deck_id}
+
+# Translation is the slow stage of the Wikipedia jobs, so it gets most of the progress bar (20% -> 90%)
+def translate_with_progress(job, words, lang_code):
+    job.update(stage=f'translating {len(words)} words', progress=20)
+    return translate_words(
+        words, source_lang=lang_code, target_lang='en', cache=translation_cache,
+        progress=lambda done, total: job.update(progress=20 + 70 * done / total)
+    )
+
+# Shared tail of the Wikipedia jobs: translate the word list and store it as a new deck
+def translate_and_save_deck(job, user_id, deck_name, lang_code, top_words, source_title=None):
+    translations = translate_with_progress(job, top_words, lang_code)
+
+    job.update(stage='saving deck', progress=90)
+    repository = open_repository(user_id)
+    try:
+        deck_id = repository.create_deck(user_id, deck_name, lang_code, source_title)
+        repository.insert_cards(user_id, deck_id, translations)
+        repository.refresh_deck_stats([deck_id])
+        repository.commit()
+    finally:
+        repository.close()
+
+    return deck_id
+
+# Refresh an existing deck from its article: recount the words (cached per revision), and
+# translate and add only the top-N words the deck doesn't have. Existing cards keep their
+# scheduling state; words that dropped out of the top N are left in the deck.
+def refresh_wikipedia_deck(job, user_id, deck_id, title, lang_code, top_n):
+    job.update(stage='fetching article', progress=5)
+    word_freq = fetch_article_word_freq(title, lang_code)
+    if not word_freq:
+        raise JobFailed("Failed to fetch Wikipedia article. Please try again.")
+    top_words = [word for word, _ in word_freq.most_common(top_n)]
+
+    repository = open_repository(user_id)
+    try:
+        existing = repository.deck_terms(user_id, deck_id)
+    finally:
+        repository.close()
+    new_words = [word for word in top_words if word.casefold() not in existing]
+    translations = translate_with_progress(job, new_words, lang_code) if new_words else []
+
+    job.update(stage='saving cards', progress=90)
+    repository = open_repository(user_id)
+    try:
+        # Lock the deck so two refreshes of one deck can't both add a word, then diff
+        # again against the terms committed while we were translating
+        deck = repository.lock_deck(deck_id, user_id)
+        if deck is None:
+            raise JobFailed("Deck not found.")
+        existing = repository.deck_terms(user_id, deck_id)
+        translations = [(term, definition) for term, definition in translations if term.casefold() not in existing]
+
+        if translations:
+            repository.insert_cards(user_id, deck_id, translations)
+            repository.refresh_deck_stats([deck_id])
+        source_changed = (deck['source_title'], deck['language_code']) != (title, lang_code)
+        if source_changed:
+            repository.set_deck_source(deck_id, title, lang_code)
+        if translations or source_changed:
+            repository.bump_deck_version(deck_id)
+        repository.commit()
+    finally:
+        repository.close()
+
+    return {"deck_id": deck_id, "added": len(translations), "already_in_deck": len(top_words) - len(translations)}
+
+# Corpus variant: the top words across many articles (a list of titles or a category)
+def build_wikipedia_corpus_deck(job, user_id, deck_name, lang_code, titles, category, top_n):
+    job.update(stage='fetching articles', progress=2)
+    if category:
+        titles = titles + fetch_category_titles(category, lang_code)
+    articles = fetch_wikipedia_articles(titles, lang_code)
+
+    if not articles:
+        raise JobFailed("None of the Wikipedia articles could be fetched. Please try again.")
+
+    job.update(stage=f'processing {len(articles)} articles', progress=10)
+    word_freq = process_corpus(
+        articles, lang_code,
+        progress=lambda done, total: job.update(progress=10 + 10 * done / total)
+    )
+
+    top_words = [word for word, _ in word_freq.most_common(top_n)]
+    deck_id = translate_and_save_deck(job, user_id, deck_name, lang_code, top_words)
+    return {"deck_id": deck_id}
+
 @app.route('/add_deck_wikipedia', methods=['POST'])
+@login_required
 def add_deck_wikipedia():
     deck_name = request.form['deck_name']
     lang_code = request.form['language']
@@ -177,270 +479,473 @@ def add_deck_wikipedia():
     if not deck_name:
         return jsonify({"message": "Deck name is required."}), 400
 
-    # Attempt to fetch the article
-    article_content = fetch_wikipedia_article(deck_name, lang_code)
-
-    # If article content is empty or fetch failed, return an error and don't create the deck
-    if not article_content:
-        return jsonify({"message": "Failed to fetch Wikipedia article. Please try again."}), 400
-
-    # Continue with the normal processing if the article is fetched successfully
-    clean_article = remove_references(article_content)
-    word_freq = process_text(clean_article, lang_code)
-
-    top_words = [word for word, _ in word_freq.most_common(100)]
-    translations = translate_words(top_words, source_lang=lang_code, target_lang='en')
-
-    connection = get_db_connection()
-    cursor = connection.cursor()
-    cursor.execute("INSERT INTO decks (name, language_code) VALUES (%s, %s)", (deck_name, lang_code))
-    connection.commit()
-
-    cursor.execute("SELECT LAST_INSERT_ID() AS id")
-    deck_id = cursor.fetchone()['id']
+    user_id = session['user_id']
+    job = jobs.submit(f"wikipedia:{lang_code}:{deck_name}", build_wikipedia_deck, user_id, deck_name, lang_code,
+                      owner_id=user_id)
+    return jsonify({"job_id": job.id, "status_url": url_for('job_status', job_id=job.id)}), 202
+
+@app.route('/refresh_deck_wikipedia/<int:deck_id>', methods=['POST'])
+@login_required
+def refresh_deck_wikipedia(deck_id):
+    user_id = session['user_id']
+    top_n = min(request.form.get('top_n', 100, type=int), 1000)
+
+    repository = get_repository()
+    deck = repository.owned_deck(deck_id, user_id)
+    repository.close()
+    if deck is None:
+        return jsonify({"message": "Deck not found."}), 404
+
+    # Defaults to the article the deck was built from (or, for older decks, its name)
+    title = request.form.get('title', '').strip() or deck['source_title'] or deck['name']
+    lang_code = request.form.get('language') or deck['language_code']
+    if not lang_code:
+        return jsonify({"message": "Choose the article's language to refresh this deck."}), 400
+    if top_n < 1:
+        return jsonify({"message": "Words must be at least 1."}), 400
+
+    job = jobs.submit(f"wikipedia-refresh:{deck_id}:{title}", refresh_wikipedia_deck, user_id, deck_id, title,
+                      lang_code, top_n, owner_id=user_id)
+    return jsonify({"job_id": job.id, "status_url": url_for('job_status', job_id=job.id)}), 202
+
+@app.route('/add_deck_wikipedia_corpus', methods=['POST'])
+@login_required
+def add_deck_wikipedia_corpus():
+    deck_name = request.form['deck_name']
+    lang_code = request.form['language']
+    titles = [title.strip() for title in request.form.get('titles', '').splitlines() if title.strip()]
+    category = request.form.get('category', '').strip()
+    top_n = min(request.form.get('top_n', 100, type=int), 1000)
 
-    for source_word, translated_word in translations:
-        cursor.execute("""INSERT INTO flashcards (term, definition, deck_id) VALUES (%s, %s, %s)""", (source_word, translated_word, deck_id))
+    if not deck_name:
+        return jsonify({"message": "Deck name is required."}), 400
+    if not titles and not category:
+        return jsonify({"message": "Give at least one article name or a category."}), 400
+
+    user_id = session['user_id']
+    job = jobs.submit(
+        f"wikipedia-corpus:{lang_code}:{deck_name}",
+        build_wikipedia_corpus_deck, user_id, deck_name, lang_code, titles, category, top_n,
+        owner_id=user_id
+    )
+    return jsonify({"job_id": job.id, "status_url": url_for('job_status', job_id=job.id)}), 202
 
-    connection.commit()
-    connection.close()
+@app.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None or job.owner_id != session['user_id']:
+        return jsonify({"message": "Job not found."}), 404
 
-    return redirect(url_for('print_deck', deck_id=deck_id))
+    status = job.to_dict()
+    if job.status == 'done':
+        status['deck_url'] = url_for('print_deck', deck_id=job.result['deck_id'])
+    return jsonify(status)
 
 @app.route('/delete_deck/<int:deck_id>', methods=['POST'])
+@login_required
 def delete_deck(deck_id):
-    connection = get_db_connection()
-    with connection.cursor() as cursor:
-        cursor.execute("DELETE FROM flashcards WHERE deck_id = %s", (deck_id,))
-        cursor.execute("DELETE FROM decks WHERE id = %s", (deck_id,))
-        connection.commit()
-    connection.close()
+    repository = get_repository()
+    # Cards and deck_stats go with it (ON DELETE CASCADE)
+    repository.delete_deck(deck_id, session['user_id'])
+    repository.commit()
+    repository.close()
     return redirect(url_for('index'))
 
+# Bulk import: the upload is read and inserted in chunks, never held in memory as a whole
+@app.route('/import_deck/<int:deck_id>', methods=['POST'])
+@login_required
+def import_deck(deck_id):
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({"message": "Choose a file to import."}), 400
+
+    user_id = session['user_id']
+    repository = get_repository()
+    if repository.owned_deck(deck_id, user_id) is None:
+        repository.close()
+        return "Deck not found!", 404
+
+    try:
+        if upload.filename.lower().endswith('.apkg'):
+            # Anki packages are zip + SQLite and need a real file
+            with tempfile.NamedTemporaryFile(suffix='.apkg') as tmp:
+                upload.save(tmp)
+                tmp.flush()
+                count = repository.import_cards(user_id, deck_id, iter_file_rows(tmp.name, upload.filename))
+        else:
+            count = repository.import_cards(user_id, deck_id, iter_file_rows(upload.stream, upload.filename))
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"message": f"Could not read {upload.filename}: {e}. The cards before it were imported."}), 400
+    finally:
+        # Chunks are committed as they go, so recount even after a partial import
+        repository.refresh_deck_stats([deck_id])
+        repository.bump_deck_version(deck_id)
+        repository.commit()
+        repository.close()
+
+    flash(f"Imported {count} flashcards.")
+    return redirect(url_for('print_deck', deck_id=deck_id))
+
+# Streaming export: rows are read page by page and sent as a chunked response
+@app.route('/export_deck/<int:deck_id>', methods=['GET'])
+@login_required
+def export_deck(deck_id):
+    repository = get_repository()
+    if repository.owned_deck(deck_id, session['user_id']) is None:
+        repository.close()
+        return "Deck not found!", 404
+
+    export_format = 'anki' if request.args.get('format') == 'anki' else 'csv'
+    extension = 'txt' if export_format == 'anki' else 'csv'
+
+    def generate():
+        repository = get_repository()
+        yield from format_export_chunks(repository.iter_deck_pages(deck_id, EXPORT_CHUNK_SIZE), export_format)
+        repository.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv' if export_format == 'csv' else 'text/plain',
+        headers={"Content-Disposition": f"attachment; filename=deck_{deck_id}.{extension}"}
+    )
+
 @app.route('/add_flashcard/<int:deck_id>', methods=['POST'])
+@login_required
 def add_flashcard(deck_id):
     term = request.form['term']
     definition = request.form['definition']
 
     if term and definition:
-        connection = get_db_connection()
-        cursor = connection.cursor()
+        user_id = session['user_id']
+        repository = get_repository()
 
-        cursor.execute("""
-            INSERT INTO flashcards (term, definition, deck_id)
-            VALUES (%s, %s, %s)
-        """, (term, definition, deck_id))
+        if repository.owned_deck(deck_id, user_id) is None:
+            repository.close()
+            return "Deck not found!", 404
 
-        connection.commit()
-        connection.close()
+        repository.add_card(user_id, deck_id, term, definition)
+        repository.apply_stats_delta(deck_id, deck_stats.new_card_counts())
+        repository.bump_deck_version(deck_id)
+
+        repository.commit()
+        repository.close()
 
         return redirect(url_for('print_deck', deck_id=deck_id))  
     else:
         return jsonify({"message": "Term and definition cannot be empty."})
 
 @app.route('/delete_flashcard/<int:flashcard_id>', methods=['POST'])
+@login_required
 def delete_flashcard(flashcard_id):
-    connection = get_db_connection()
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT deck_id FROM flashcards WHERE id = %s", (flashcard_id,))
-        flashcard = cursor.fetchone()
-
-        if flashcard is None:
-            return "Flashcard not found!", 404 
-        
-        deck_id = flashcard['deck_id']
+    repository = get_repository()
+    # Counted as of its newest answer, which the review log adds to deck_stats when it flushes
+    deck_id = repository.delete_owned_card(flashcard_id, session['user_id'], overlay=get_review_log().overlay)
 
-        cursor.execute("DELETE FROM flashcards WHERE id = %s", (flashcard_id,))
+    if deck_id is None:
+        repository.close()
+        return "Flashcard not found!", 404 
 
-        connection.commit()
-
-    connection.close()
+    repository.commit()
+    repository.close()
     
     return redirect(url_for('print_deck', deck_id=deck_id))
 
 @app.route('/update_flashcard/<int:flashcard_id>', methods=['GET','POST'])
+@login_required
 def update_flashcard(flashcard_id):
-    connection = get_db_connection()
-    cursor = connection.cursor()
+    user_id = session['user_id']
+    repository = get_repository()
     
     if request.method == 'GET':
-        cursor.execute("SELECT * FROM flashcards WHERE id = %s", (flashcard_id,))
-        flashcard = cursor.fetchone()
+        flashcard = repository.card(flashcard_id, user_id)
 
         if flashcard is None:
-            connection.close()
+            repository.close()
             return "Flashcard not found", 404
 
-        connection.close()
+        repository.close()
         return render_template('update_flashcard.html', flashcard=flashcard)  
 
     if request.method == 'POST':
             updated_term = request.form['term']
             updated_definition = request.form['definition']
 
-            cursor.execute("SELECT deck_id FROM flashcards WHERE id = %s", (flashcard_id,))
-            flashcard = cursor.fetchone()
+            flashcard = repository.card(flashcard_id, user_id)
+
+            if flashcard is None:
+                repository.close()
+                return "Flashcard not found", 404
 
             deck_id = flashcard['deck_id']
 
-            cursor.execute("""
-                UPDATE flashcards
-                SET term = %s, definition = %s
-                WHERE id = %s
-            """, (updated_term, updated_definition, flashcard_id))
+            repository.update_card(flashcard_id, updated_term, updated_definition)
+            repository.bump_deck_version(deck_id)
 
-            connection.commit()
-            connection.close()
+            repository.commit()
+            repository.close()
 
             return redirect(url_for('print_deck', deck_id=deck_id)) 
 
+SEARCH_PAGE_SIZE = 20
+
+# Full-text search (search.py on MySQL, FTS5 on SQLite), ranked by relevance with cursor pagination for flashcards
 @app.route('/search', methods=['GET'])
+@login_required
 def search():
-    query = request.args.get('query')  
+    query = request.args.get('query', '').strip()
+    after = request.args.get('after')
 
-    connection = get_db_connection()
-    cursor = connection.cursor()
+    if not query:
+        return render_template('search_results.html', query=query, decks=[], flashcards=[], next_cursor=None)
 
-    cursor.execute("""
-        SELECT * FROM decks WHERE name LIKE %s
-    """, ('%' + query + '%',))
-    decks_result = cursor.fetchall()
+    repository = get_repository()
 
-    cursor.execute("""
-        SELECT * FROM flashcards WHERE term LIKE %s OR definition LIKE %s
-    """, ('%' + query + '%', '%' + query + '%'))
-    flashcards_result = cursor.fetchall()
+    # Decks are only listed on the first page
+    user_id = session['user_id']
+    decks_result = [] if after else repository.search_decks(user_id, query, SEARCH_PAGE_SIZE)
+    flashcards_result, next_cursor = repository.search_flashcards(user_id, query, SEARCH_PAGE_SIZE, after)
 
-    connection.close()
+    repository.close()
 
-    return render_template('search_results.html', query=query, decks=decks_result, flashcards=flashcards_result)
+    return render_template('search_results.html', query=query, decks=decks_result,
+                           flashcards=flashcards_result, next_cursor=next_cursor)
 
-# get session to have current_index start at 0. be able to recognize a new session 
-@app.route('/review/<int:deck_id>', methods=['GET'])
-def review(deck_id):
-    connection = get_db_connection()
-    cursor = connection.cursor()
-    
-    cursor.execute("SELECT * FROM flashcards WHERE deck_id = %s", (deck_id,))
-    flashcards = cursor.fetchall()
-    connection.close()
-    
-    cards = []
-    for row in flashcards:
-        card = NewCard(
-            id=str(row['id']),
-            front=row['term'],
-            back=row['definition'],
-            last_reviewed=row['last_reviewed'],
-            interval=row['spaced_interval'],
-            ease=row['ease'],
-            step=row['step'],
-            status=row['status']
-        )
-        cards.append(card)
-
-    # Check if new session or deck has changed
-    if (
-        'current_index' not in session or 
-        'shuffled_ids' not in session or
-        session.get('deck_id') != deck_id
-    ):
-        session['current_index'] = 0
-        random.shuffle(cards)
-        session['shuffled_ids'] = [card.id for card in cards]
-        session['deck_id'] = deck_id  # Track current deck
-
-    card_id_order = session.get('shuffled_ids', [])
-    cards_dict = {card.id: card for card in cards}
-
-    if session['current_index'] >= len(card_id_order):
-        flashcard = None  # finished
-    else:
-        current_id = card_id_order[session['current_index']]
-        current_card = cards_dict[current_id]
-        flashcard = {
-            "term": current_card.front,
-            "definition": current_card.back,
-            "id": current_card.id
-        }
+# Number of due cards pulled into the review queue per refill
+REVIEW_BATCH_SIZE = int(os.getenv('REVIEW_BATCH_SIZE', 20))
 
-    return render_template('review.html', flashcard=flashcard)
+def fetch_due_card_ids(repository, user_id, deck_id, limit=REVIEW_BATCH_SIZE):
+    card_ids = repository.due_card_ids(user_id, deck_id, limit)
+    # Cards answered moments ago may not be written yet
+    answered = get_review_log().not_due(card_ids)
+    return [card_id for card_id in card_ids if card_id not in answered]
 
-@app.route('/merge_decks', methods=['POST'])
-def merge_decks():
-    deck_id_1 = int(request.form['deck1_id'])
-    deck_id_2 = int(request.form['deck2_id'])
-    new_deck_name = request.form['new_deck_name']
+# The review token in the cookie points at a server-side queue + cursor
+@app.route('/review/<int:deck_id>', methods=['GET'])
+@login_required
+def review(deck_id):
+    user_id = session['user_id']
+    repository = get_repository()
 
-    connection = get_db_connection()
-    cursor = connection.cursor()
+    token = session.get('review_token')
+    review_session = review_sessions.get(token) if token else None
 
-    # Create the new deck
-    cursor.execute("INSERT INTO decks (name) VALUES (%s)", (new_deck_name,))
-    connection.commit()
+    # Refill the queue when this is a new session, the deck changed, or the batch is used up
+    if review_session is None or review_session.deck_id != deck_id or review_session.exhausted:
+        review_session = ReviewSession(token or new_session_token(), deck_id, fetch_due_card_ids(repository, user_id, deck_id))
+        review_sessions.save(review_session)
+        session['review_token'] = review_session.token
 
-    cursor.execute("SELECT LAST_INSERT_ID() AS id")
-    new_deck_id = cursor.fetchone()['id']
+    current_id = review_session.current_card_id
 
-    # Get flashcards from both decks
-    cursor.execute("SELECT term, definition FROM flashcards WHERE deck_id = %s OR deck_id = %s", (deck_id_1, deck_id_2))
-    flashcards = cursor.fetchall()
+    if current_id is None:
+        flashcard = None  # nothing due
+    else:
+        flashcard = repository.card_text(current_id, user_id)
 
-    # Insert flashcards into the new deck
-    for card in flashcards:
-        cursor.execute(
-            "INSERT INTO flashcards (term, definition, deck_id) VALUES (%s, %s, %s)",
-            (card['term'], card['definition'], new_deck_id)
-        )
+    repository.close()
 
-    connection.commit()
-    connection.close()
+    return render_template('review.html', flashcard=flashcard)
 
-    flash("Decks merged successfully!")
+@app.route('/merge_decks', methods=['POST'])
+@login_required
+def merge_decks():
+    # Any number of decks via deck_ids; the old two-select form fields still work
+    deck_ids = request.form.getlist('deck_ids', type=int)
+    for field in ('deck1_id', 'deck2_id'):
+        if request.form.get(field):
+            deck_ids.append(int(request.form[field]))
+    deck_ids = list(dict.fromkeys(deck_ids))
+    new_deck_name = request.form['new_deck_name']
+    policy = request.form.get('policy', 'newest')
+
+    if len(deck_ids) < 2:
+        return jsonify({"message": "Select at least two decks to merge."}), 400
+    if policy not in MERGE_POLICIES:
+        return jsonify({"message": f"Unknown merge policy: {policy}"}), 400
+
+    user_id = session['user_id']
+    repository = get_repository()
+
+    if not repository.owns_decks(user_id, deck_ids):
+        repository.close()
+        return jsonify({"message": "Deck not found."}), 404
+
+    # Deck and cards are committed together, so a failure leaves no half-built deck
+    try:
+        new_deck_id, card_count = repository.merge_decks(user_id, deck_ids, new_deck_name, policy)
+        repository.refresh_deck_stats([new_deck_id])
+        repository.commit()
+    except Exception:
+        repository.rollback()
+        raise
+    finally:
+        repository.close()
+
+    flash(f"Decks merged successfully! ({card_count} cards)")
     return redirect(url_for('print_deck', deck_id=new_deck_id))
 
 
 @app.route('/grade/<int:card_id>', methods=['POST'])
+@login_required
 def grade(card_id):
     grade = request.form['grade']  
     
-    connection = get_db_connection()
-    cursor = connection.cursor()
-    cursor.execute("SELECT * FROM flashcards WHERE id = %s", (card_id,))
-    row = cursor.fetchone()
-    
-    card = NewCard(
-            id=str(row['id']),
-            front=row['term'],
-            back=row['definition'],
-            last_reviewed=row['last_reviewed'],
-            interval=row['spaced_interval'],
-            ease=row['ease'],
-            step=row['step'],
-            status=row['status']
-        )
+    repository = get_repository()
+    # A previous answer may still be in the write-behind buffer
+    row = get_review_log().overlay(repository.card(card_id, session['user_id']))
+    repository.close()
+
+    if row is None:
+        return "Flashcard not found", 404
     
+    card = card_from_row(row)
     card.grade_answer(grade)  
 
-    cursor.execute("""
-        UPDATE flashcards 
-        SET spaced_interval = %s, ease = %s, step = %s, status = %s, last_reviewed = %s
-        WHERE id = %s
-    """, (
-        card.interval.total_seconds() if card.interval else None,
-        card.ease,
-        card.step,
-        card.status,
-        card.last_reviewed.strftime('%Y-%m-%d %H:%M:%S'),
-        card_id
-    ))
-
-    connection.commit()
-    connection.close()
-    session['current_index'] +=1
+    # Spooled to disk now; card state, history and deck_stats reach the database with the next batch
+    get_review_log().append(ReviewEvent.from_grade(row, card, grade))
+
+    token = session.get('review_token')
+    review_session = review_sessions.get(token) if token else None
+    if review_session is not None:
+        review_session.cursor += 1
+        review_sessions.save(review_session)
    
     return redirect(url_for('review', deck_id=row['deck_id']))
 
+# ---- Batch review JSON API: prefetch cards and sync many grades at once ----
+
+API_MAX_BATCH = 500
+# How far ahead of the server's clock a client's reviewed_at may be
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+def parse_reviewed_at(value, now):
+    if value is None:
+        return now
+    if isinstance(value, (int, float)):
+        try:
+            reviewed_at = datetime.fromtimestamp(value)
+        except (OverflowError, OSError, ValueError):
+            # Too large, too far before the epoch for this platform, or NaN
+            raise ValueError(f"reviewed_at {value!r} is not a valid timestamp")
+    else:
+        reviewed_at = datetime.fromisoformat(value)
+        if reviewed_at.tzinfo is not None:
+            # Stored timestamps are naive server-local time
+            reviewed_at = reviewed_at.astimezone().replace(tzinfo=None)
+    if reviewed_at > now + MAX_CLOCK_SKEW:
+        raise ValueError(f"reviewed_at {value!r} is in the future")
+    return reviewed_at
+
+@app.route('/api/review/<int:deck_id>/cards', methods=['GET'])
+@login_required
+def api_review_cards(deck_id):
+    limit = min(max(request.args.get('limit', REVIEW_BATCH_SIZE, type=int), 1), API_MAX_BATCH)
+
+    repository = get_repository()
+    rows = repository.due_cards(session['user_id'], deck_id, limit)
+    repository.close()
+
+    answered = get_review_log().not_due([row['id'] for row in rows])
+    rows = [row for row in rows if row['id'] not in answered]
+
+    # Nothing is graded here, so the rows go out as plain CardState values, not scheduler Cards
+    return jsonify({"deck_id": deck_id, "cards": [CardState.from_row(row).to_dict() for row in rows]})
+
+@app.route('/api/review/grades', methods=['POST'])
+@login_required
+def api_submit_grades():
+    payload = request.get_json(silent=True)
+    grades = payload.get('grades') if isinstance(payload, dict) else payload
+
+    if not isinstance(grades, list) or not grades:
+        return jsonify({"message": "Expected a non-empty list of grades."}), 400
+    if len(grades) > API_MAX_BATCH:
+        return jsonify({"message": f"At most {API_MAX_BATCH} grades per request."}), 400
+
+    # Accept either {"card_id", "grade", "reviewed_at"} objects or [card_id, grade, reviewed_at] tuples
+    parsed = []
+    now = datetime.now()
+    try:
+        for entry in grades:
+            if isinstance(entry, dict):
+                card_id, response, reviewed_at = entry['card_id'], entry['grade'], entry.get('reviewed_at')
+            else:
+                card_id, response, reviewed_at = (list(entry) + [None])[:3]
+            parsed.append((int(card_id), response, parse_reviewed_at(reviewed_at, now)))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"message": f"Malformed grade entry: {e}"}), 400
+
+    card_ids = sorted({card_id for card_id, _, _ in parsed})
+
+    repository = get_repository()
+    log = get_review_log()
+    rows = {row['id']: log.overlay(row) for row in repository.cards(session['user_id'], card_ids)}
+    repository.close()
+    cards = {card_id: card_from_row(row) for card_id, row in rows.items()}
+
+    missing = [card_id for card_id in card_ids if card_id not in cards]
+    if missing:
+        return jsonify({"message": f"Flashcards not found: {missing}"}), 404
+
+    # Replay offline reviews in the order they happened so repeated grades of one card chain
+    # correctly; every answer becomes its own review_log event
+    events = []
+    try:
+        for card_id, response, reviewed_at in sorted(parsed, key=lambda entry: entry[2]):
+            last_reviewed = rows[card_id]['last_reviewed']
+            if last_reviewed is not None and reviewed_at < last_reviewed:
+                return jsonify({"message": f"Flashcard {card_id} was last reviewed at {last_reviewed.isoformat()}, "
+                                           f"after reviewed_at {reviewed_at.isoformat()}."}), 400
+            cards[card_id].grade_answer(response, reviewed_at)
+            event = ReviewEvent.from_grade(rows[card_id], cards[card_id], response)
+            rows[card_id] = event.apply_to(rows[card_id])
+            events.append(event)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    log.extend(events)
+
+    return jsonify({"updated": len(cards), "cards": [card.to_dict() for card in cards.values()]})
+
+@app.route('/api/retention', methods=['GET'])
+@login_required
+def api_retention():
+    days = min(max(request.args.get('days', 30, type=int), 1), 365)
+
+    repository = get_repository()
+    rows = repository.retention_by_day(session['user_id'], days)
+    repository.close()
+
+    return jsonify({"days": days, "retention": [
+        {"day": row['day'].isoformat(), "reviews": row['reviews'], "retention": float(row['retention'])}
+        for row in rows
+    ]})
+
+@app.route('/api/forecast', methods=['GET'])
+@login_required
+def api_forecast():
+    deck_id = request.args.get('deck_id', type=int)
+    days = min(max(request.args.get('days', 365, type=int), 1), 3650)
+
+    # Numeric tuples only, so a million rows go straight into one array
+    repository = get_repository()
+    rows = np.array(repository.forecast_rows(session['user_id'], deck_id), dtype=np.float64).reshape(-1, 5)
+    repository.close()
+
+    seconds = rows[:, 1]
+    counts = forecast_due_per_day(
+        status=rows[:, 0].astype(np.int8),
+        interval=interval_us(np.where(seconds < 0, np.nan, seconds)),
+        ease=rows[:, 2],
+        step=rows[:, 3].astype(np.int64),
+        due_in=rows[:, 4],
+        days=days
+    )
+
+    # due_per_day[0] is the next 24 hours from now, and so on
+    return jsonify({"deck_id": deck_id, "days": days, "due_per_day": counts.tolist()})
+
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,109 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from metrics import timed
+
+# Bump when the stored layout (or how word counts are computed) changes; older files are ignored
+# 2: full extracts (format 1 entries hold only the lead section, from exintro=False)
+CACHE_FORMAT = 2
+
+
+class ArticleCache:
+    """Size-bounded on-disk cache of Wikipedia extracts and their word counts.
+
+    One gzipped JSON file per (lang_code, title) holds the extract HTML, the revision id
+    and ETag it was fetched with, when it was last validated and, once computed, the
+    word-frequency Counter for it. Files are written atomically, so several worker
+    processes can share the directory. A file's mtime is its last use: hits touch it,
+    and when the directory grows past max_bytes the least recently used files go first.
+    """
+
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def path(self, lang_code, title):
+        key = hashlib.sha1(f"{lang_code}\0{title}".encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    @timed('article_cache_get')
+    def get(self, lang_code, title):
+        path = self.path(lang_code, title)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError, EOFError):
+            entry = None
+        # A hash collision or an old layout reads as a miss
+        if entry is not None and (entry.get('format') != CACHE_FORMAT or entry.get('lang') != lang_code
+                                  or entry.get('title') != title):
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if entry is not None and entry.get('word_freq') is not None:
+            entry['word_freq'] = Counter(entry['word_freq'])
+        return entry
+
+    @timed('article_cache_put')
+    def put(self, lang_code, title, entry):
+        entry = dict(entry, format=CACHE_FORMAT, lang=lang_code, title=title)
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                f.write(json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+            os.replace(tmp_path, self.path(lang_code, title))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        files = []
+        total = 0
+        for item in os.scandir(self.directory):
+            if not item.name.endswith('.json.gz'):
+                continue
+            try:
+                stat = item.stat()
+            except FileNotFoundError:  # removed by another process
+                continue
+            files.append((stat.st_mtime, stat.st_size, item.path))
+            total += stat.st_size
+        files.sort()
+        evicted = 0
+        while total > self.max_bytes and files:
+            _, size, path = files.pop(0)
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        with self._lock:
+            self.evictions += evicted
+        return total
+
+    def stats(self):
+        with self._lock:
+            return {"directory": self.directory, "max_bytes": self.max_bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+
+def entry_is_fresh(entry, max_age, now=None):
+    """True while an entry is young enough to use without asking Wikipedia about it."""
+    return (now or time.time()) - entry.get('validated_at', 0) < max_age
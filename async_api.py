@@ -0,0 +1,367 @@
+"""Asyncio JSON API for review clients, run next to the Flask app.
+
+    python async_api.py [--host 127.0.0.1] [--port 8081]
+
+Serves decks, cards, the next due card and grading under /api/async/ from one process:
+every MySQL round trip is awaited on an aiomysql pool instead of holding a worker, so a
+single process keeps thousands of review clients connected. Users log in through the
+Flask app; its signed session cookie (same SECRET_KEY) is accepted here.
+
+Grading uses the same NewCard scheduler and review log as app.py. Blocking work (the
+review log's fsync, Wikipedia fetches, text processing and translation) runs on a
+thread pool so the event loop never waits on it. It always talks to MySQL, whatever
+STORAGE_BACKEND the Flask app uses.
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import aiomysql
+import pymysql
+from aiohttp import web
+from dotenv import load_dotenv
+from flask import Flask
+from flask.json.tag import TaggedJSONSerializer
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+import deck_stats
+from card_state import CardState, card_from_row
+from db_pool import ConnectionPool
+from jobs import Job, JobFailed, evict_finished
+from repository import MySQLRepository
+from review_log import ReviewEvent, ReviewLogWriter
+from shard_router import ShardRouter, shard_databases
+from translation_cache import MySQLTranslationStore, TranslationCache
+from wiki_api import default_translator, fetch_article_word_freq, translate_words
+
+load_dotenv()
+
+MYSQL_HOST = os.getenv('MYSQL_HOST')
+MYSQL_USER = os.getenv('MYSQL_USER')
+MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD')
+MYSQL_DB = os.getenv('MYSQL_DB')
+
+# Shared with app.py so its session cookie can be read here
+SECRET_KEY = os.getenv('SECRET_KEY', 'capybara')
+SESSION_COOKIE_NAME = 'session'
+# app.py keeps Flask's default lifetime; Flask rejects older cookies and so does this API
+PERMANENT_SESSION_LIFETIME = Flask.default_config['PERMANENT_SESSION_LIFETIME']
+
+# Connections per shard for the event loop; requests beyond that wait on the pool, not on a thread
+ASYNC_MYSQL_POOL_MIN_SIZE = int(os.getenv('ASYNC_MYSQL_POOL_MIN_SIZE', 2))
+ASYNC_MYSQL_POOL_MAX_SIZE = int(os.getenv('ASYNC_MYSQL_POOL_MAX_SIZE', 20))
+# Threads for blocking work: review log appends and Wikipedia jobs
+ASYNC_EXECUTOR_WORKERS = int(os.getenv('ASYNC_EXECUTOR_WORKERS', 8))
+
+# Seconds a finished Wikipedia job's status stays readable (as jobs.JobManager)
+JOB_KEEP_FINISHED = 3600
+
+REVIEW_BATCH_SIZE = 20
+API_MAX_BATCH = 500
+CARDS_PAGE_SIZE = 100
+
+REVIEW_LOG_SPOOL_DIR = os.getenv('REVIEW_LOG_SPOOL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'review_spool'))
+REVIEW_LOG_BATCH_SIZE = int(os.getenv('REVIEW_LOG_BATCH_SIZE', 200))
+REVIEW_LOG_FLUSH_INTERVAL = float(os.getenv('REVIEW_LOG_FLUSH_INTERVAL', 1.0))
+REVIEW_LOG_FSYNC = os.getenv('REVIEW_LOG_FSYNC', '1') == '1'
+
+# Flask's cookie format: itsdangerous, salt "cookie-session", HMAC-SHA1, tagged JSON
+session_serializer = URLSafeTimedSerializer(
+    SECRET_KEY, salt='cookie-session', serializer=TaggedJSONSerializer(),
+    signer_kwargs={'key_derivation': 'hmac', 'digest_method': hashlib.sha1}
+)
+
+
+def session_user_id(request):
+    cookie = request.cookies.get(SESSION_COOKIE_NAME)
+    if not cookie:
+        return None
+    try:
+        max_age = int(PERMANENT_SESSION_LIFETIME.total_seconds())
+        return session_serializer.loads(cookie, max_age=max_age).get('user_id')
+    except BadSignature:  # also SignatureExpired
+        return None
+
+
+@web.middleware
+async def login_required(request, handler):
+    request['user_id'] = session_user_id(request)
+    if request['user_id'] is None:
+        return web.json_response({"message": "Login required."}, status=401)
+    return await handler(request)
+
+
+# ---- Database helpers ----
+
+async def create_shard_router():
+    pools = []
+    for host, db in shard_databases(default_host=MYSQL_HOST, default_db=MYSQL_DB):
+        pools.append(await aiomysql.create_pool(
+            host=host, user=MYSQL_USER, password=MYSQL_PASSWORD, db=db, charset='utf8mb4',
+            minsize=ASYNC_MYSQL_POOL_MIN_SIZE, maxsize=ASYNC_MYSQL_POOL_MAX_SIZE,
+            cursorclass=aiomysql.DictCursor, autocommit=True
+        ))
+    return ShardRouter(pools)
+
+
+def connect_mysql(host, db):
+    return pymysql.connect(host=host, user=MYSQL_USER, password=MYSQL_PASSWORD, db=db, charset='utf8mb4',
+                           cursorclass=pymysql.cursors.DictCursor)
+
+
+def create_sync_router():
+    # Small blocking pools for the threads: review log flushes and the translations table
+    return ShardRouter([
+        ConnectionPool(partial(connect_mysql, host, db), min_size=0, max_size=4)
+        for host, db in shard_databases(default_host=MYSQL_HOST, default_db=MYSQL_DB)
+    ])
+
+
+async def fetch_all(request, sql, args=()):
+    async with request.app['shards'].pool_for(request['user_id']).acquire() as connection:
+        async with connection.cursor() as cursor:
+            await cursor.execute(sql, args)
+            return await cursor.fetchall()
+
+
+async def fetch_one(request, sql, args=()):
+    rows = await fetch_all(request, sql, args)
+    return rows[0] if rows else None
+
+
+async def run_blocking(request, fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(request.app['executor'], partial(fn, *args))
+
+
+def int_param(request, name, default, minimum=None, maximum=None):
+    try:
+        value = int(request.query.get(name, default))
+    except ValueError:
+        raise web.HTTPBadRequest(text=f'{{"message": "{name} must be an integer."}}', content_type='application/json')
+    if minimum is not None and value < minimum:
+        raise web.HTTPBadRequest(text=f'{{"message": "{name} must be at least {minimum}."}}',
+                                 content_type='application/json')
+    return min(value, maximum) if maximum else value
+
+
+# ---- Routes ----
+
+routes = web.RouteTableDef()
+
+
+@routes.get('/api/async/decks')
+async def list_decks(request):
+    user_id = request['user_id']
+    async with request.app['shards'].pool_for(user_id).acquire() as connection:
+        async with connection.cursor() as cursor:
+            # Same materialized counts as the home page; stale days are recomputed first
+            await cursor.execute(deck_stats.STALE_DECKS_SQL, (user_id,))
+            stale = [row['id'] for row in await cursor.fetchall()]
+            if stale:
+                placeholders = ', '.join(['%s'] * len(stale))
+                await cursor.execute(deck_stats.REFRESH_SQL.format(where=f"WHERE decks.id IN ({placeholders})"), stale)
+            await cursor.execute("""
+                SELECT decks.id, decks.name, decks.language_code,
+                       COALESCE(deck_stats.card_count, 0) AS flashcard_count,
+                       COALESCE(deck_stats.due_today_count, 0) AS due_count
+                FROM decks
+                LEFT JOIN deck_stats ON deck_stats.deck_id = decks.id
+                WHERE decks.user_id = %s
+                ORDER BY decks.name
+            """, (user_id,))
+            decks = await cursor.fetchall()
+    return web.json_response({"decks": decks})
+
+
+@routes.get('/api/async/decks/{deck_id:\\d+}/cards')
+async def list_cards(request):
+    deck_id = int(request.match_info['deck_id'])
+    after = int_param(request, 'after', 0)
+    limit = int_param(request, 'limit', CARDS_PAGE_SIZE, minimum=1, maximum=API_MAX_BATCH)
+    rows = await fetch_all(request, """
+        SELECT * FROM flashcards
+        WHERE user_id = %s AND deck_id = %s AND id > %s
+        ORDER BY id
+        LIMIT %s
+    """, (request['user_id'], deck_id, after, limit))
+    cards = [CardState.from_row(row).to_dict() for row in rows]
+    next_after = rows[-1]['id'] if len(rows) == limit else None
+    return web.json_response({"deck_id": deck_id, "cards": cards, "next_after": next_after})
+
+
+@routes.get('/api/async/review/{deck_id:\\d+}/next')
+async def review_next(request):
+    deck_id = int(request.match_info['deck_id'])
+    rows = await fetch_all(request, """
+        SELECT * FROM flashcards
+        WHERE user_id = %s AND deck_id = %s AND due_at <= NOW()
+        ORDER BY due_at
+        LIMIT %s
+    """, (request['user_id'], deck_id, REVIEW_BATCH_SIZE))
+    # Skip cards answered moments ago whose new due date is still in the review log buffer
+    log = request.app['review_log']
+    answered = log.not_due([row['id'] for row in rows])
+    for row in rows:
+        if row['id'] not in answered:
+            return web.json_response({"deck_id": deck_id, "card": CardState.from_row(log.overlay(row)).to_dict()})
+    return web.json_response({"deck_id": deck_id, "card": None})
+
+
+@routes.post('/api/async/cards/{card_id:\\d+}/grade')
+async def grade(request):
+    card_id = int(request.match_info['card_id'])
+    try:
+        payload = await request.json()
+    except ValueError:
+        payload = None
+    grade = payload.get('grade') if isinstance(payload, dict) else None
+    if grade is None:
+        return web.json_response({"message": "Expected {\"grade\": ...}."}, status=400)
+
+    log = request.app['review_log']
+    row = log.overlay(await fetch_one(request, "SELECT * FROM flashcards WHERE id = %s AND user_id = %s",
+                                      (card_id, request['user_id'])))
+    if row is None:
+        return web.json_response({"message": "Flashcard not found."}, status=404)
+
+    card = card_from_row(row)
+    try:
+        card.grade_answer(grade)
+    except ValueError as e:
+        return web.json_response({"message": str(e)}, status=400)
+
+    # The append fsyncs the spool file, so it runs off the event loop
+    await run_blocking(request, log.append, ReviewEvent.from_grade(row, card, grade))
+    return web.json_response({"card": card.to_dict()})
+
+
+# ---- Wikipedia deck jobs: wiki_api work on the executor, database writes on the loop ----
+
+@routes.post('/api/async/decks/wikipedia')
+async def add_deck_wikipedia(request):
+    payload = await request.post() if request.content_type != 'application/json' else await request.json()
+    deck_name = (payload.get('deck_name') or '').strip()
+    lang_code = payload.get('language') or 'es'
+    if not deck_name:
+        return web.json_response({"message": "Deck name is required."}, status=400)
+
+    job = Job(uuid.uuid4().hex, f"wikipedia:{lang_code}:{deck_name}", owner_id=request['user_id'])
+    evict_finished(request.app['jobs'], JOB_KEEP_FINISHED)
+    request.app['jobs'][job.id] = job
+    task = asyncio.create_task(run_job(job, build_wikipedia_deck(request, job, deck_name, lang_code)))
+    request.app['tasks'].add(task)
+    task.add_done_callback(request.app['tasks'].discard)
+    return web.json_response({"job_id": job.id, "status_url": f"/api/async/jobs/{job.id}"}, status=202)
+
+
+@routes.get('/api/async/jobs/{job_id}')
+async def job_status(request):
+    job = request.app['jobs'].get(request.match_info['job_id'])
+    if job is None or job.owner_id != request['user_id']:
+        return web.json_response({"message": "Job not found."}, status=404)
+    return web.json_response(job.to_dict())
+
+
+async def run_job(job, coroutine):
+    # Same life cycle as jobs.JobManager, for coroutines
+    job.status = 'running'
+    try:
+        job.result = await coroutine
+        job.status = 'done'
+        job.update(stage='done', progress=100)
+    except JobFailed as e:
+        job.status = 'failed'
+        job.update(message=str(e))
+    except Exception as e:
+        job.status = 'failed'
+        job.update(message=f"Unexpected error: {e}")
+    finally:
+        job.finished_at = time.time()
+
+
+async def build_wikipedia_deck(request, job, deck_name, lang_code):
+    user_id = request['user_id']
+    job.update(stage='fetching article', progress=5)
+    word_freq = await run_blocking(request, fetch_article_word_freq, deck_name, lang_code)
+    if not word_freq:
+        raise JobFailed("Failed to fetch Wikipedia article. Please try again.")
+
+    top_words = [word for word, _ in word_freq.most_common(100)]
+    job.update(stage=f'translating {len(top_words)} words', progress=20)
+    translations = await run_blocking(request, partial(
+        translate_words, top_words, source_lang=lang_code, target_lang='en', cache=request.app['translation_cache'],
+        progress=lambda done, total: job.update(progress=20 + 70 * done / total)
+    ))
+
+    job.update(stage='saving deck', progress=90)
+    async with request.app['shards'].pool_for(user_id).acquire() as connection:
+        await connection.begin()
+        try:
+            async with connection.cursor() as cursor:
+                await cursor.execute(
+                    "INSERT INTO decks (name, language_code, user_id, source_title) VALUES (%s, %s, %s, %s)",
+                    (deck_name, lang_code, user_id, deck_name))
+                deck_id = cursor.lastrowid
+                await cursor.executemany(
+                    "INSERT INTO flashcards (term, definition, deck_id, user_id) VALUES (%s, %s, %s, %s)",
+                    [(term, definition, deck_id, user_id) for term, definition in translations])
+                await cursor.execute(deck_stats.REFRESH_SQL.format(where="WHERE decks.id IN (%s)"), (deck_id,))
+            await connection.commit()
+        except BaseException:
+            await connection.rollback()
+            raise
+    return {"deck_id": deck_id}
+
+
+# ---- App ----
+
+async def start_resources(app):
+    app['shards'] = await create_shard_router()
+    app['sync_shards'] = create_sync_router()
+    app['executor'] = ThreadPoolExecutor(max_workers=ASYNC_EXECUTOR_WORKERS, thread_name_prefix='async-api')
+    app['review_log'] = ReviewLogWriter(
+        app['sync_shards'].pool_for, REVIEW_LOG_SPOOL_DIR, MySQLRepository, batch_size=REVIEW_LOG_BATCH_SIZE,
+        flush_interval=REVIEW_LOG_FLUSH_INTERVAL, fsync=REVIEW_LOG_FSYNC
+    )
+    app['translation_cache'] = TranslationCache(
+        translator=default_translator(), store=MySQLTranslationStore(app['sync_shards'].directory.acquire)
+    )
+    app['jobs'] = {}
+    app['tasks'] = set()
+
+
+async def close_resources(app):
+    for task in app['tasks']:
+        task.cancel()
+    app['review_log'].close()
+    app['executor'].shutdown(wait=True)
+    for pool in app['shards'].pools:
+        pool.close()
+        await pool.wait_closed()
+    for pool in app['sync_shards'].pools:
+        pool.close_all()
+
+
+def create_app():
+    app = web.Application(middlewares=[login_required])
+    app.add_routes(routes)
+    app.on_startup.append(start_resources)
+    app.on_cleanup.append(close_resources)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Async JSON API for review clients.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    args = parser.parse_args(argv)
+    web.run_app(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
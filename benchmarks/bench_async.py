@@ -0,0 +1,138 @@
+"""Many concurrent review clients against the Flask routes and the async API.
+
+    python async_api.py --port 8081 &     # and the Flask app (gunicorn/python app.py) on :5000
+    python benchmarks/bench_async.py [--clients 1000] [--requests 5000] [--target both|sync|async]
+        [--sync-url http://127.0.0.1:5000] [--async-url http://127.0.0.1:8081] [--out results.json]
+
+Every virtual client is a coroutine with the session cookie of one bench_user_* account
+(seed the database with benchmarks/seed.py). Each scenario sends the same operation to
+both servers:
+
+    decks        GET /                              GET /api/async/decks
+    cards        GET /deck/<id>                     GET /api/async/decks/<id>/cards
+    review_next  GET /api/review/<id>/cards?limit=1 GET /api/async/review/<id>/next
+    grade        POST /api/review/grades            POST /api/async/cards/<id>/grade
+
+Results are keyed "<target>:<scenario>" and saved like bench_routes.py output, so
+compare.py works on them too.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import report  # noqa: E402
+from bench_routes import GRADES, load_users  # noqa: E402
+from dotenv import load_dotenv  # noqa: E402
+from seed import PASSWORD  # noqa: E402
+
+SCENARIOS = ['decks', 'cards', 'review_next', 'grade']
+
+
+def next_request(target, scenario, user, rng):
+    """(method, path, params, json body) for one request."""
+    deck_id = rng.choice(user['deck_ids'])
+    card_id = rng.choice(user['card_ids'])
+    grade = rng.choice(GRADES)
+    if target == 'sync':
+        return {
+            'decks': ('GET', '/', None, None),
+            'cards': ('GET', f"/deck/{deck_id}", None, None),
+            'review_next': ('GET', f"/api/review/{deck_id}/cards", {'limit': '1'}, None),
+            'grade': ('POST', '/api/review/grades', None, {'grades': [{'card_id': card_id, 'grade': grade}]}),
+        }[scenario]
+    return {
+        'decks': ('GET', '/api/async/decks', None, None),
+        'cards': ('GET', f"/api/async/decks/{deck_id}/cards", None, None),
+        'review_next': ('GET', f"/api/async/review/{deck_id}/next", None, None),
+        'grade': ('POST', f"/api/async/cards/{card_id}/grade", None, {'grade': grade}),
+    }[scenario]
+
+
+async def log_in(http, sync_url, user):
+    # The Flask app issues the cookie; the async API accepts the same one
+    async with http.post(sync_url + '/login', data={'username': user['username'], 'password': PASSWORD},
+                         allow_redirects=False) as response:
+        cookie = response.cookies.get('session')
+        if response.status != 302 or cookie is None:
+            raise SystemExit(f"Login as {user['username']} failed ({response.status})")
+        return cookie.value
+
+
+async def run_scenario(http, base_url, target, scenario, clients, total, seed):
+    latencies, errors = [], 0
+    remaining = total
+
+    async def client(index, user, cookie):
+        nonlocal remaining, errors
+        rng = random.Random(seed * 100000 + index)
+        headers = {'Cookie': f"session={cookie}"}
+        while remaining > 0:
+            remaining -= 1
+            method, path, params, body = next_request(target, scenario, user, rng)
+            started = time.perf_counter()
+            try:
+                async with http.request(method, base_url + path, params=params, json=body, headers=headers,
+                                        allow_redirects=False) as response:
+                    await response.read()
+                    status = response.status
+            except aiohttp.ClientError:
+                status = None
+            latencies.append(time.perf_counter() - started)
+            if status is None or status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(index, user, cookie) for index, (user, cookie) in enumerate(clients)))
+    return report.summarize(latencies, time.perf_counter() - started, errors)
+
+
+async def run(args, users):
+    # One connection per virtual client; cookies are sent per request, not kept in a jar
+    connector = aiohttp.TCPConnector(limit=args.clients)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                     cookie_jar=aiohttp.DummyCookieJar()) as http:
+        cookies = {user['id']: await log_in(http, args.sync_url, user) for user in users}
+        clients = [(users[i % len(users)], cookies[users[i % len(users)]['id']]) for i in range(args.clients)]
+        targets = ['sync', 'async'] if args.target == 'both' else [args.target]
+        results = {}
+        for scenario in args.scenarios:
+            for target in targets:
+                base_url = args.sync_url if target == 'sync' else args.async_url
+                results[f"{target}:{scenario}"] = await run_scenario(
+                    http, base_url.rstrip('/'), target, scenario, clients, args.requests, args.seed)
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the Flask routes with the async API under many clients.")
+    parser.add_argument('--sync-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--async-url', default='http://127.0.0.1:8081')
+    parser.add_argument('--target', choices=['both', 'sync', 'async'], default='both')
+    parser.add_argument('--clients', type=int, default=1000, help="concurrent virtual clients")
+    parser.add_argument('--users', type=int, default=100, help="bench users the clients log in as")
+    parser.add_argument('--requests', type=int, default=5000, help="requests per scenario and target")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="result file (default benchmarks/results/async-<commit>-<time>.json)")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    users = load_users(args.users)
+    results = asyncio.run(run(args, users))
+
+    report.print_table(results, columns=('requests', 'errors', 'p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps'))
+    settings = {key: value for key, value in vars(args).items() if key != 'out'}
+    print(f"Saved {report.save_results('async', settings, results, args.out)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Cost of turning flashcards rows into card objects, from 1k to 1M rows.
+
+    python benchmarks/bench_hydration.py [--sizes 1000 10000 100000 1000000] [--json out.json]
+
+Rows are synthetic dicts with the types pymysql returns (datetime, float, int, str).
+Compares the NewCard path (Card constructor, timedelta, per row) with CardState
+(__slots__, native values), both for hydration alone and for building the JSON dicts
+that /api/review/<deck_id>/cards sends.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from card_state import CardState, card_from_row  # noqa: E402
+
+
+def make_rows(n, seed=0):
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    rows = []
+    for i in range(n):
+        reviewed = rng.random() < 0.8
+        interval = rng.choice([60.0, 360.0, 600.0, 86400.0, 345600.0, rng.uniform(86400, 86400 * 200)])
+        last_reviewed = now - timedelta(seconds=rng.randint(0, 86400 * 30)) if reviewed else None
+        rows.append({
+            'id': i + 1,
+            'term': f"palabra{i}",
+            'definition': f"word{i}",
+            'deck_id': 1 + i % 50,
+            'user_id': 1,
+            'status': rng.choice(['learning', 'reviewing', 'relearning']) if reviewed else 'learning',
+            'spaced_interval': round(interval, 6) if reviewed else None,
+            'ease': round(rng.uniform(1.3, 3.0), 2),
+            'step': rng.randint(0, 1),
+            'last_reviewed': last_reviewed,
+            'due_at': (last_reviewed or now) + timedelta(seconds=interval if reviewed else 0),
+        })
+    return rows
+
+
+CASES = {
+    'NewCard hydrate': lambda rows: [card_from_row(row) for row in rows],
+    'CardState hydrate': lambda rows: [CardState.from_row(row) for row in rows],
+    'NewCard to_dict': lambda rows: [card_from_row(row).to_dict() for row in rows],
+    'CardState to_dict': lambda rows: [CardState.from_row(row).to_dict() for row in rows],
+}
+
+
+def measure(fn, rows, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn(rows)
+        best = min(best, time.perf_counter() - start)
+        del result
+
+    gc.collect()
+    tracemalloc.start()
+    result = fn(rows)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return best, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3, help="best of N timings per case")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'rows':>9}  {'case':<18} {'total s':>9} {'us/row':>8} {'peak MB':>8}")
+    for n in args.sizes:
+        rows = make_rows(n)
+        # Big sizes are slow on the NewCard path; one timed run is enough there
+        repeat = args.repeat if n <= 100000 else 1
+        for name, fn in CASES.items():
+            seconds, peak = measure(fn, rows, repeat)
+            results.append({"rows": n, "case": name, "seconds": seconds, "us_per_row": seconds / n * 1e6,
+                            "peak_bytes": peak})
+            print(f"{n:>9}  {name:<18} {seconds:>9.3f} {seconds / n * 1e6:>8.2f} {peak / 2**20:>8.1f}")
+        del rows
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
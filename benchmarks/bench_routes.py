@@ -0,0 +1,238 @@
+"""Latency, throughput and queries per request for the main app.py routes.
+
+    python benchmarks/bench_routes.py [--mode client|http] [--url http://127.0.0.1:5000]
+        [--requests 500] [--concurrency 8] [--scenarios index print_deck review grade search merge_decks]
+        [--out results.json]
+
+Seed the database first (benchmarks/seed.py); every worker logs in as one of the
+bench_user_* accounts and only touches that user's decks and cards.
+
+--mode client runs the app in this process through the Flask test client (no network,
+no server to start) and also counts the SQL statements each request sends.
+--mode http drives a running server (python app.py, gunicorn, ...) with one
+requests.Session per worker thread; queries per request are not visible from outside.
+
+Results are printed and saved as JSON (benchmarks/results/ by default); compare two runs
+with benchmarks/compare.py.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pymysql  # noqa: E402
+import requests  # noqa: E402
+import report  # noqa: E402
+from dotenv import load_dotenv  # noqa: E402
+from seed import PASSWORD, SYLLABLES, USER_PREFIX, open_connections, sql  # noqa: E402
+from shard_router import shard_index  # noqa: E402
+from sqlite_repository import SQLiteCursor  # noqa: E402
+
+SCENARIOS = ['index', 'print_deck', 'review', 'grade', 'search', 'merge_decks']
+GRADES = ['again', 'hard', 'good', 'easy']
+MERGED_DECK_NAME = 'bench merge'
+CARDS_PER_USER = 200
+
+
+# ---- Counting SQL statements per request (client mode) ----
+
+_query_counts = threading.local()
+
+
+def counting(method):
+    def counted(self, *args):
+        _query_counts.value = getattr(_query_counts, 'value', 0) + 1
+        return method(self, *args)
+    return counted
+
+
+def install_query_counter():
+    # pymysql's executemany() goes through execute(), so this counts round trips either way;
+    # sqlite3 runs executemany() as one call. The review log's flush thread has its own
+    # thread-local count and is not attributed to requests.
+    pymysql.cursors.Cursor.execute = counting(pymysql.cursors.Cursor.execute)
+    for name in ('execute', 'executemany'):
+        setattr(SQLiteCursor, name, counting(getattr(SQLiteCursor, name)))
+
+
+def take_query_count():
+    count = getattr(_query_counts, 'value', 0)
+    _query_counts.value = 0
+    return count
+
+
+# ---- Who the workers log in as and what they request ----
+
+def load_users(limit):
+    """Bench users with their deck ids and some card ids, read from each user's shard."""
+    connections = open_connections()
+    try:
+        directory = connections[0].cursor()
+        directory.execute(sql(connections[0], "SELECT id, username FROM users WHERE username LIKE %s "
+                                              "ORDER BY id LIMIT %s"), (USER_PREFIX + '%', limit))
+        users = []
+        for row in directory.fetchall():
+            connection = connections[shard_index(row['id'], len(connections))]
+            cursor = connection.cursor()
+            cursor.execute(sql(connection, "SELECT id FROM decks WHERE user_id = %s AND name <> %s ORDER BY id"),
+                           (row['id'], MERGED_DECK_NAME))
+            deck_ids = [deck['id'] for deck in cursor.fetchall()]
+            cursor.execute(sql(connection, "SELECT id FROM flashcards WHERE user_id = %s ORDER BY id LIMIT %s"),
+                           (row['id'], CARDS_PER_USER))
+            card_ids = [card['id'] for card in cursor.fetchall()]
+            if deck_ids and card_ids:
+                users.append({'id': row['id'], 'username': row['username'], 'deck_ids': deck_ids,
+                              'card_ids': card_ids})
+    finally:
+        for connection in connections:
+            connection.close()
+    if not users:
+        raise SystemExit("No benchmark users found; run python benchmarks/seed.py first")
+    return users
+
+
+def remove_merged_decks(users):
+    connections = open_connections()
+    try:
+        for user in users:
+            connection = connections[shard_index(user['id'], len(connections))]
+            connection.cursor().execute(sql(connection, "DELETE FROM decks WHERE user_id = %s AND name = %s"),
+                                        (user['id'], MERGED_DECK_NAME))
+            connection.commit()
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def next_request(scenario, user, rng):
+    """(method, path, params) for one request of a scenario."""
+    if scenario == 'index':
+        return 'GET', '/', None
+    if scenario == 'print_deck':
+        return 'GET', f"/deck/{rng.choice(user['deck_ids'])}", None
+    if scenario == 'review':
+        return 'GET', f"/review/{rng.choice(user['deck_ids'])}", None
+    if scenario == 'grade':
+        return 'POST', f"/grade/{rng.choice(user['card_ids'])}", {'grade': rng.choice(GRADES)}
+    if scenario == 'search':
+        return 'GET', '/search', {'query': ''.join(rng.sample(SYLLABLES, 2))}
+    if scenario == 'merge_decks':
+        return 'POST', '/merge_decks', {'deck_ids': rng.sample(user['deck_ids'], 2), 'new_deck_name': MERGED_DECK_NAME}
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+# ---- Clients: same interface over the Flask test client and over HTTP ----
+
+class FlaskClient:
+    counts_queries = True
+
+    def __init__(self, flask_app, user):
+        self.client = flask_app.test_client()
+        # Log in by setting the session directly: password hashing is not what is measured
+        with self.client.session_transaction() as flask_session:
+            flask_session['user_id'] = user['id']
+
+    def send(self, method, path, params):
+        if method == 'GET':
+            return self.client.get(path, query_string=params).status_code
+        return self.client.post(path, data=params).status_code
+
+
+class HttpClient:
+    counts_queries = False
+
+    def __init__(self, base_url, user):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        response = self.session.post(self.base_url + '/login', allow_redirects=False,
+                                     data={'username': user['username'], 'password': PASSWORD})
+        if response.status_code != 302:
+            raise SystemExit(f"Login as {user['username']} failed ({response.status_code})")
+
+    def send(self, method, path, params):
+        response = self.session.request(method, self.base_url + path, allow_redirects=False,
+                                        params=params if method == 'GET' else None,
+                                        data=params if method == 'POST' else None)
+        return response.status_code
+
+
+def run_scenario(scenario, clients, users, total, warmup, seed):
+    """Splits `total` requests over one thread per client; returns the summary dict."""
+    latencies, queries, errors = [], [], [0]
+    lock = threading.Lock()
+
+    def worker(index, measure):
+        client, user = clients[index], users[index % len(users)]
+        rng = random.Random(seed * 1000 + index + (0 if measure else 500))
+        count = total // len(clients) + (1 if index < total % len(clients) else 0) if measure else warmup
+        local_latencies, local_queries, local_errors = [], [], 0
+        for _ in range(count):
+            method, path, params = next_request(scenario, user, rng)
+            take_query_count()
+            started = time.perf_counter()
+            try:
+                status = client.send(method, path, params)
+            except Exception:
+                status = None
+            local_latencies.append(time.perf_counter() - started)
+            if client.counts_queries:
+                local_queries.append(take_query_count())
+            if status is None or status >= 400:
+                local_errors += 1
+        if measure:
+            with lock:
+                latencies.extend(local_latencies)
+                queries.extend(local_queries)
+                errors[0] += local_errors
+
+    with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+        # Unmeasured warm-up first (pools, template and fragment caches), then the timed run
+        list(executor.map(worker, range(len(clients)), [False] * len(clients)))
+        started = time.perf_counter()
+        list(executor.map(worker, range(len(clients)), [True] * len(clients)))
+        elapsed = time.perf_counter() - started
+    return report.summarize(latencies, elapsed, errors[0], queries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app.py routes.")
+    parser.add_argument('--mode', choices=['client', 'http'], default='client')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="server for --mode http")
+    parser.add_argument('--requests', type=int, default=500, help="measured requests per scenario")
+    parser.add_argument('--warmup', type=int, default=5, help="unmeasured requests per worker first")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="result file (default benchmarks/results/routes-<commit>-<time>.json)")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    users = load_users(args.concurrency)
+    if args.mode == 'client':
+        install_query_counter()
+        from app import app as flask_app
+        clients = [FlaskClient(flask_app, users[i % len(users)]) for i in range(args.concurrency)]
+    else:
+        clients = [HttpClient(args.url, users[i % len(users)]) for i in range(args.concurrency)]
+
+    results = {}
+    try:
+        for scenario in args.scenarios:
+            results[scenario] = run_scenario(scenario, clients, users, args.requests, args.warmup, args.seed)
+    finally:
+        if 'merge_decks' in args.scenarios:
+            remove_merged_decks(users)
+
+    report.print_table(results)
+    settings = {key: value for key, value in vars(args).items() if key != 'out'}
+    settings['users'] = len(users)
+    print(f"Saved {report.save_results('routes', settings, results, args.out)}")
+
+
+if __name__ == '__main__':
+    main()
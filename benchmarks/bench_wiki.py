@@ -0,0 +1,247 @@
+"""Offline benchmark of the wiki_api stages: HTML -> word counts -> translations.
+
+    python benchmarks/bench_wiki.py [--repeat 5] [--top 100] [--translate-delay 0.05] [--out results.json]
+    python benchmarks/bench_wiki.py --record Perro Gato Madrid --lang es
+
+Articles come from recorded fixtures in benchmarks/fixtures/wiki/ (gzipped JSON with the
+extract HTML exactly as the MediaWiki API returned it). --record fetches and saves them
+once, with network access; later runs never touch the network. With no fixtures the
+benchmark generates seeded synthetic articles with the same markup (paragraphs, headings,
+<sup> references, accented words) and says so in the results.
+
+Fetching is timed through the local fixture server (wiki_fixture_server.py), once with
+an empty article cache and once with a warm one.
+
+Translation uses StubTranslator with an in-memory TranslationCache, so it measures the
+batching and caching around the translator; --translate-delay adds a sleep per batch to
+stand in for the round trip to Google.
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import report  # noqa: E402
+import wiki_api  # noqa: E402
+from article_cache import ArticleCache  # noqa: E402
+from translation_cache import StubTranslator, TranslationCache  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'wiki')
+
+SPANISH_WORDS = (
+    "el la de que y en un una los las por con para es su al lo como más pero sus le ya o este sí porque "
+    "esta entre cuando muy sin sobre también me hasta hay donde quien desde todo nos durante todos uno "
+    "ciudad país historia río montaña población siglo gobierno guerra rey iglesia arte música idioma "
+    "español región norte sur provincia capital pueblo territorio economía agricultura comercio puerto "
+    "años época cultura tradición fiesta lengua escritura literatura poeta pintor obra museo catedral "
+    "castillo puente camino mar costa isla clima invierno verano lluvia bosque árbol animal perro gato "
+    "caballo pájaro pez flor fruta agua tierra fuego aire sol luna estrella cielo noche día mañana tarde "
+    "niño niña mujer hombre familia padre madre hermano amigo trabajo escuela universidad ciencia física "
+    "química biología matemáticas medicina hospital ferrocarril estación avenida plaza mercado fábrica"
+).split()
+
+
+class SlowStubTranslator(StubTranslator):
+    """StubTranslator that waits `delay` seconds per batch, like a remote API would."""
+
+    def __init__(self, delay=0.0):
+        super().__init__()
+        self.delay = delay
+
+    def translate_batch(self, words, source_lang, target_lang):
+        if self.delay:
+            time.sleep(self.delay)
+        return super().translate_batch(words, source_lang, target_lang)
+
+
+# ---- Fixtures ----
+
+def fixture_path(title, lang_code):
+    slug = re.sub(r'[^\w-]+', '_', title, flags=re.UNICODE).strip('_')
+    return os.path.join(FIXTURES_DIR, f"{lang_code}-{slug}.json.gz")
+
+
+def record_fixtures(titles, lang_code):
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    articles = wiki_api.fetch_wikipedia_articles(titles, lang_code)
+    for title, extract in articles.items():
+        with gzip.open(fixture_path(title, lang_code), 'wt', encoding='utf-8') as f:
+            json.dump({'title': title, 'lang': lang_code, 'extract': extract}, f, ensure_ascii=False)
+        print(f"Recorded {title} ({len(extract)} chars)")
+    missing = set(titles) - set(articles)
+    if missing:
+        print(f"Not found (or redirected): {', '.join(sorted(missing))}")
+
+
+def load_fixtures(lang_code):
+    articles = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, f"{lang_code}-*.json.gz"))):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            fixture = json.load(f)
+        articles[fixture['title']] = fixture['extract']
+    return articles
+
+
+def synthetic_article(rng, paragraphs=40):
+    # Zipf-like choice so the top words look like a real article's
+    weights = [1 / (rank + 1) for rank in range(len(SPANISH_WORDS))]
+    parts = []
+    for p in range(paragraphs):
+        if p % 8 == 0:
+            parts.append(f"<h2><span id=\"s{p}\">{' '.join(rng.choices(SPANISH_WORDS, weights, k=3)).title()}</span></h2>")
+        sentences = []
+        for _ in range(rng.randint(3, 7)):
+            words = rng.choices(SPANISH_WORDS, weights, k=rng.randint(8, 25))
+            if rng.random() < 0.3:
+                words[rng.randrange(len(words))] = f"<b>{rng.choice(SPANISH_WORDS)}</b>"
+            sentence = ' '.join(words).capitalize() + f", {rng.randint(1500, 2024)}."
+            if rng.random() < 0.4:
+                sentence += f"<sup class=\"reference\">[{rng.randint(1, 90)}]</sup>"
+            sentences.append(sentence)
+        parts.append(f"<p>{' '.join(sentences)}</p>")
+    return '\n'.join(parts)
+
+
+def synthetic_articles(count, seed=0):
+    rng = random.Random(seed)
+    return {f"Sintético {i}": synthetic_article(rng, rng.randint(20, 80)) for i in range(count)}
+
+
+# ---- Stages ----
+
+def time_calls(fn, items, repeat):
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            call_started = time.perf_counter()
+            fn(item)
+            latencies.append(time.perf_counter() - call_started)
+    return latencies, time.perf_counter() - started
+
+
+# The pre-streaming path (BeautifulSoup twice, regex clean-up), kept here for comparison only:
+# wiki_api.process_text drops <ref>/<sup> and tokenizes in one streaming pass
+
+def legacy_remove_references(text):
+    soup = BeautifulSoup(text, "html.parser")
+    for ref_tag in soup.find_all(['ref', 'sup']):
+        ref_tag.decompose()
+    return str(soup)
+
+
+def legacy_clean_text(text):
+    text = BeautifulSoup(text, "html.parser").get_text()
+    text = re.sub(r'[^a-zA-Záéíóúüñ\s]', '', text.lower())
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def legacy_process_text(text):
+    return legacy_clean_text(legacy_remove_references(text)).split()
+
+
+def run_stages(articles, lang_code, repeat, top, translate_delay):
+    texts = list(articles.values())
+    megabytes = sum(len(text.encode('utf-8')) for text in texts) / 1e6
+    results = {}
+
+    def stage(name, latencies, elapsed, per_item_mb=None):
+        summary = report.summarize(latencies, elapsed)
+        if per_item_mb:
+            summary['mb_per_s'] = round(per_item_mb * repeat / elapsed, 2)
+        results[name] = summary
+
+    wiki_api.get_stopwords(wiki_api.LANG_MAP.get(lang_code, 'english'))  # load outside the timings
+    stage('legacy_clean', *time_calls(legacy_process_text, texts, repeat), megabytes)
+    stage('process_text', *time_calls(lambda text: wiki_api.process_text(text, lang_code), texts, repeat), megabytes)
+
+    # One pool.map over the whole set; the first call also pays for spawning the workers
+    wiki_api.process_corpus(texts[:1], lang_code)
+    stage('process_corpus', *time_calls(lambda _: wiki_api.process_corpus(texts, lang_code), [None], repeat),
+          megabytes)
+
+    top_words = [word for word, _ in wiki_api.process_corpus(texts, lang_code).most_common(top)]
+
+    def translate_cold(_):
+        cache = TranslationCache(translator=SlowStubTranslator(translate_delay), store=None)
+        wiki_api.translate_words(top_words, source_lang=lang_code, cache=cache)
+
+    warm_cache = TranslationCache(translator=SlowStubTranslator(translate_delay), store=None)
+    wiki_api.translate_words(top_words, source_lang=lang_code, cache=warm_cache)
+    stage('translate_cold', *time_calls(translate_cold, [None], repeat))
+    stage('translate_warm', *time_calls(lambda _: wiki_api.translate_words(top_words, source_lang=lang_code,
+                                                                           cache=warm_cache), [None], repeat))
+
+    # What one "add deck from Wikipedia" job does after the fetch, with a cold translation cache
+    def pipeline(text):
+        cache = TranslationCache(translator=SlowStubTranslator(translate_delay), store=None)
+        words = [word for word, _ in wiki_api.process_text(text, lang_code).most_common(top)]
+        wiki_api.translate_words(words, source_lang=lang_code, cache=cache)
+
+    stage('article_pipeline', *time_calls(pipeline, texts, repeat), megabytes)
+
+    # Download + word counts through the local fixture server: an empty article cache, then a warm one
+    import wiki_fixture_server
+    server = wiki_fixture_server.start({lang_code: articles})
+    api_url, wiki_api.WIKIPEDIA_API_URL = wiki_api.WIKIPEDIA_API_URL, server.api_url
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            def fetch_cold(title):
+                shutil.rmtree(directory, ignore_errors=True)
+                wiki_api.fetch_article_word_freq(title, lang_code, cache=ArticleCache(directory))
+
+            stage('fetch_cold', *time_calls(fetch_cold, list(articles), repeat), megabytes)
+            article_cache = ArticleCache(directory)
+            for title in articles:
+                wiki_api.fetch_article_word_freq(title, lang_code, cache=article_cache)
+            stage('fetch_cached', *time_calls(lambda title: wiki_api.fetch_article_word_freq(
+                title, lang_code, cache=article_cache), list(articles), repeat), megabytes)
+    finally:
+        wiki_api.WIKIPEDIA_API_URL = api_url
+        server.shutdown()
+    return results, megabytes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark wiki_api text processing and translation offline.")
+    parser.add_argument('--record', nargs='+', metavar='TITLE', help="fetch and save these articles as fixtures")
+    parser.add_argument('--lang', default='es')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=100, help="words translated per article")
+    parser.add_argument('--translate-delay', type=float, default=0.0, help="seconds of fake latency per batch")
+    parser.add_argument('--synthetic', type=int, default=20, help="articles to generate when there are no fixtures")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="result file (default benchmarks/results/wiki-<commit>-<time>.json)")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        record_fixtures(args.record, args.lang)
+        return
+
+    articles = load_fixtures(args.lang)
+    source = 'fixtures'
+    if not articles:
+        articles = synthetic_articles(args.synthetic, args.seed)
+        source = 'synthetic'
+    results, megabytes = run_stages(articles, args.lang, args.repeat, args.top, args.translate_delay)
+
+    report.print_table(results, columns=('requests', 'p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'mb_per_s'))
+    settings = {key: value for key, value in vars(args).items() if key not in ('out', 'record')}
+    settings.update(articles=len(articles), source=source, megabytes=round(megabytes, 3))
+    print(f"{len(articles)} {source} articles, {megabytes:.2f} MB")
+    print(f"Saved {report.save_results('wiki', settings, results, args.out)}")
+
+
+if __name__ == '__main__':
+    main()
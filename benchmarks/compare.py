@@ -0,0 +1,63 @@
+"""Compares two benchmark result files (bench_routes.py or bench_wiki.py output).
+
+    python benchmarks/compare.py benchmarks/results/routes-abc123-....json benchmarks/results/routes-def456-....json
+
+Prints every shared scenario with the before/after value and the change in percent.
+Latency and query counts going up, or throughput going down, by more than --threshold
+percent are marked, and --fail makes that an exit status of 1 (for CI).
+"""
+import argparse
+import json
+import sys
+
+# Metrics where a bigger number is worse
+LOWER_IS_BETTER = {'p50_ms', 'p95_ms', 'p99_ms', 'mean_ms', 'max_ms', 'queries_per_request', 'max_queries', 'errors'}
+HIGHER_IS_BETTER = {'throughput_rps', 'mb_per_s'}
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(before, after, threshold):
+    """[(scenario, metric, before, after, percent change, regressed)] for numeric metrics in both runs."""
+    rows = []
+    for scenario, old in before['scenarios'].items():
+        new = after['scenarios'].get(scenario)
+        if new is None:
+            continue
+        for metric in old:
+            if metric not in LOWER_IS_BETTER | HIGHER_IS_BETTER or old[metric] is None or new.get(metric) is None:
+                continue
+            change = (new[metric] - old[metric]) / old[metric] * 100 if old[metric] else 0.0
+            worse = change if metric in LOWER_IS_BETTER else -change
+            rows.append((scenario, metric, old[metric], new[metric], change, worse > threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=10.0, help="percent change counted as a regression")
+    parser.add_argument('--fail', action='store_true', help="exit with status 1 on any regression")
+    args = parser.parse_args(argv)
+
+    before, after = load(args.before), load(args.after)
+    print(f"before: {before['meta'].get('commit')} {before['meta'].get('timestamp')}")
+    print(f"after:  {after['meta'].get('commit')} {after['meta'].get('timestamp')}")
+    if before['meta'].get('settings') != after['meta'].get('settings'):
+        print("note: the runs used different settings")
+
+    rows = compare(before, after, args.threshold)
+    print(f"{'scenario':<18}{'metric':<22}{'before':>12}{'after':>12}{'change':>10}")
+    for scenario, metric, old, new, change, regressed in rows:
+        print(f"{scenario:<18}{metric:<22}{old:>12}{new:>12}{change:>+9.1f}%{'  <-- worse' if regressed else ''}")
+
+    if args.fail and any(row[-1] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Shared helpers for the benchmark scripts: latency summaries and result files.
+
+Result files are JSON with a "meta" block (commit, time, settings) and one entry per
+scenario, so two runs can be compared with benchmarks/compare.py.
+"""
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+
+def percentile(sorted_values, q):
+    # Nearest rank, so p99 of 100 samples is the slowest but one
+    if not sorted_values:
+        return None
+    rank = max(0, math.ceil(q / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+def summarize(latencies, elapsed, errors=0, queries=None):
+    """Latencies in seconds -> milliseconds percentiles, throughput and queries per request."""
+    values = sorted(latencies)
+    ms = lambda v: None if v is None else round(v * 1000, 3)  # noqa: E731
+    summary = {
+        'requests': len(values),
+        'errors': errors,
+        'p50_ms': ms(percentile(values, 50)),
+        'p95_ms': ms(percentile(values, 95)),
+        'p99_ms': ms(percentile(values, 99)),
+        'mean_ms': ms(sum(values) / len(values)) if values else None,
+        'max_ms': ms(values[-1]) if values else None,
+        'throughput_rps': round(len(values) / elapsed, 2) if elapsed > 0 else None,
+    }
+    if queries:
+        summary['queries_per_request'] = round(sum(queries) / len(queries), 2)
+        summary['max_queries'] = max(queries)
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(settings):
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'settings': settings,
+    }
+
+
+def save_results(kind, settings, scenarios, path=None):
+    """Writes {"meta": ..., "scenarios": ...}; the default name carries the commit and time."""
+    results = {'meta': metadata(settings), 'scenarios': scenarios}
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        name = f"{kind}-{results['meta']['commit'] or 'nogit'}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        path = os.path.join(RESULTS_DIR, name)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def print_table(scenarios, columns=('requests', 'errors', 'p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps',
+                                    'queries_per_request')):
+    width = max([16, *(len(name) + 2 for name in scenarios)])
+    print(f"{'scenario':<{width}}" + ''.join(f"{column:>20}" for column in columns))
+    for name, summary in scenarios.items():
+        cells = ''.join(f"{'-' if summary.get(column) is None else summary[column]!s:>20}" for column in columns)
+        print(f"{name:<{width}}{cells}")
@@ -0,0 +1,165 @@
+"""Fills a local database with benchmark users, decks and cards.
+
+    python benchmarks/seed.py [--users 100] [--decks-per-user 10] [--cards 1000000] [--reset]
+
+Run python migrate.py first. Users are called bench_user_<n> with the password "bench"
+(bench_routes.py logs in as them) and are placed on their MYSQL_SHARDS shard like real
+signups. With STORAGE_BACKEND=sqlite everything goes to the SQLITE_PATH file instead
+(created on first use, no migrations or server needed). Card terms are made of a few Spanish syllables, so many terms repeat across
+decks (which merge_decks has to resolve) and search queries find matches. Rows are
+random but seeded: the same arguments give the same tables.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import deck_stats  # noqa: E402
+from deck_io import connect  # noqa: E402
+from dotenv import load_dotenv  # noqa: E402
+from shard_router import shard_databases, shard_index  # noqa: E402
+from sqlite_repository import DEFAULT_PATH, SQLiteRepository, connect_sqlite  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+USER_PREFIX = 'bench_user_'
+PASSWORD = 'bench'
+SYLLABLES = ['ca', 'sa', 'la', 'mo', 'ri', 'to', 'pe', 'ne', 'lu', 'ba', 'go', 'fi', 'dor', 'ten', 'mar', 'sol']
+CHUNK_SIZE = 5000
+
+INSERT_CARD = (
+    "INSERT INTO flashcards (term, definition, deck_id, user_id, status, spaced_interval, ease, step, "
+    "last_reviewed, due_at) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
+)
+
+
+def open_connections():
+    """One connection per MYSQL_SHARDS shard, or the single SQLite database."""
+    if os.getenv('STORAGE_BACKEND', 'mysql') == 'sqlite':
+        return [connect_sqlite(os.getenv('SQLITE_PATH', DEFAULT_PATH))]
+    return [connect(host=host, db=db) for host, db in shard_databases()]
+
+
+def sql(connection, statement):
+    # Statements here are written for pymysql; sqlite3 wants ? placeholders and OR IGNORE
+    if isinstance(connection, sqlite3.Connection):
+        return statement.replace('%s', '?').replace('INSERT IGNORE', 'INSERT OR IGNORE')
+    return statement
+
+
+def make_term(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def card_row(rng, deck_id, user_id, now):
+    term = make_term(rng)
+    if rng.random() < 0.3:
+        return (term, f"{term} (en)", deck_id, user_id, 'learning', None, 2.5, 0, None, now)
+    interval = rng.choice([600.0, 86400.0, 345600.0, rng.uniform(86400, 86400 * 120)])
+    last_reviewed = now - timedelta(seconds=rng.randint(0, 86400 * 60))
+    status = rng.choice(['learning', 'reviewing', 'reviewing', 'reviewing', 'relearning'])
+    return (term, f"{term} (en)", deck_id, user_id, status, round(interval, 6), round(rng.uniform(1.3, 3.0), 2),
+            rng.randint(0, 1), last_reviewed, last_reviewed + timedelta(seconds=interval))
+
+
+def reset(connections):
+    # Decks cascade to their cards and deck_stats (migration 0007)
+    directory = connections[0].cursor()
+    directory.execute(sql(connections[0], "SELECT id FROM users WHERE username LIKE %s"), (USER_PREFIX + '%',))
+    user_ids = [row['id'] for row in directory.fetchall()]
+    for user_id in user_ids:
+        connection = connections[shard_index(user_id, len(connections))]
+        cursor = connection.cursor()
+        cursor.execute(sql(connection, "DELETE FROM decks WHERE user_id = %s"), (user_id,))
+        cursor.execute(sql(connection, "DELETE FROM review_log WHERE user_id = %s"), (user_id,))
+    directory.execute(sql(connections[0], "DELETE FROM users WHERE username LIKE %s"), (USER_PREFIX + '%',))
+    for connection in connections:
+        connection.commit()
+    return len(user_ids)
+
+
+def create_users(connection, count):
+    password_hash = generate_password_hash(PASSWORD)
+    cursor = connection.cursor()
+    cursor.executemany(
+        sql(connection, "INSERT IGNORE INTO users (username, email, password_hash) VALUES (%s, %s, %s)"),
+        [(f"{USER_PREFIX}{i}", f"{USER_PREFIX}{i}@example.com", password_hash) for i in range(count)]
+    )
+    cursor.execute(sql(connection, "SELECT id FROM users WHERE username LIKE %s ORDER BY id"),
+                   (USER_PREFIX + '%',))
+    connection.commit()
+    return [row['id'] for row in cursor.fetchall()][:count]
+
+
+def seed(connections, users=100, decks_per_user=10, cards=1_000_000, seed=0, progress=print):
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    user_ids = create_users(connections[0], users)
+
+    decks = []
+    for user_id in user_ids:
+        connection = connections[shard_index(user_id, len(connections))]
+        cursor = connection.cursor()
+        for d in range(decks_per_user):
+            cursor.execute(sql(connection, "INSERT INTO decks (name, language_code, user_id) "
+                                           "VALUES (%s, 'es', %s)"), (f"bench deck {d}", user_id))
+            decks.append((connection, cursor.lastrowid, user_id))
+        connection.commit()
+
+    # Cards are spread evenly; each chunk goes to one deck's shard in one executemany
+    per_deck, extra = divmod(cards, len(decks))
+    inserted = 0
+    for i, (connection, deck_id, user_id) in enumerate(decks):
+        count = per_deck + (1 if i < extra else 0)
+        cursor = connection.cursor()
+        for start in range(0, count, CHUNK_SIZE):
+            cursor.executemany(sql(connection, INSERT_CARD), [card_row(rng, deck_id, user_id, now)
+                                             for _ in range(min(CHUNK_SIZE, count - start))])
+        connection.commit()
+        inserted += count
+        if progress and (i + 1) % 50 == 0:
+            progress(f"  {i + 1}/{len(decks)} decks, {inserted} cards")
+
+    for connection in connections:
+        cursor = connection.cursor()
+        if isinstance(connection, sqlite3.Connection):
+            SQLiteRepository(connection).refresh_deck_stats([deck_id for _, deck_id, _ in decks])
+            cursor.execute("ANALYZE")
+        else:
+            deck_stats.reconcile(connection)
+            for table in ('users', 'decks', 'flashcards'):
+                cursor.execute(f"ANALYZE TABLE {table}")
+                cursor.fetchall()
+        connection.commit()
+    return len(user_ids), len(decks), inserted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed benchmark users, decks and cards.")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--decks-per-user', type=int, default=10)
+    parser.add_argument('--cards', type=int, default=1_000_000, help="total cards over all decks")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--reset', action='store_true', help="delete earlier bench_user_* data first")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    connections = open_connections()
+    try:
+        if args.reset:
+            print(f"Removed {reset(connections)} benchmark users")
+        started = time.perf_counter()
+        users, decks, cards = seed(connections, args.users, args.decks_per_user, args.cards, args.seed)
+        print(f"Seeded {users} users, {decks} decks, {cards} cards on {len(connections)} shard(s) "
+              f"in {time.perf_counter() - started:.1f}s")
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Local stand-in for the MediaWiki API, serving recorded article fixtures.
+
+    python benchmarks/wiki_fixture_server.py [--port 8765] [--synthetic]
+    WIKIPEDIA_API_URL=http://127.0.0.1:8765/{lang}/w/api.php python app.py
+
+Answers the queries wiki_api.py sends (prop=extracts|revisions|info, list=categorymembers)
+from benchmarks/fixtures/wiki/ (see bench_wiki.py --record). Revision ids are derived
+from the extract text, and every response carries an ETag and honours If-None-Match,
+so the article cache's revalidation paths can be exercised. --synthetic makes up a
+seeded article for any title that has no fixture. Category "Category:Fixtures" lists
+every article.
+
+From Python, start(articles) runs it on a free port in a background thread and returns
+the server; server.api_url is the WIKIPEDIA_API_URL value and server.requests counts hits.
+"""
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+import random
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from bench_wiki import FIXTURES_DIR, synthetic_article
+
+
+def load_all_fixtures():
+    """{lang: {title: extract}} for every recorded fixture."""
+    articles = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.json.gz'))):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            fixture = json.load(f)
+        articles.setdefault(fixture['lang'], {})[fixture['title']] = fixture['extract']
+    return articles
+
+
+def revision_id(extract):
+    return zlib.crc32(extract.encode('utf-8')) or 1
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        if len(parts) != 3 or parts[1:] != ['w', 'api.php']:
+            return self.reply(404, {"error": {"code": "notfound", "info": url.path}})
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if params.get('action') != 'query':
+            return self.reply(200, {"error": {"code": "badvalue", "info": "only action=query is served"}})
+        self.server.count_request()
+        self.reply(200, {"batchcomplete": "", "query": self.server.answer(parts[0], params)})
+
+    def reply(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, articles, synthetic=False):
+        super().__init__(address, FixtureHandler)
+        self.articles = articles
+        self.synthetic = synthetic
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def api_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/{{lang}}/w/api.php"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def extract_for(self, lang_code, title):
+        extract = self.articles.get(lang_code, {}).get(title)
+        if extract is None and self.synthetic:
+            seed = zlib.crc32(f"{lang_code}:{title}".encode('utf-8'))
+            extract = synthetic_article(random.Random(seed))
+        return extract
+
+    def answer(self, lang_code, params):
+        if params.get('list') == 'categorymembers':
+            titles = sorted(self.articles.get(lang_code, {})) if params.get('cmtitle') == 'Category:Fixtures' else []
+            limit = int(params.get('cmlimit', 500))
+            return {"categorymembers": [{"ns": 0, "title": title} for title in titles[:limit]]}
+
+        props = set(params.get('prop', '').split('|'))
+        pages = {}
+        for index, title in enumerate(params.get('titles', '').split('|')):
+            extract = self.extract_for(lang_code, title)
+            if extract is None:
+                pages[str(-1 - index)] = {"ns": 0, "title": title, "missing": ""}
+                continue
+            page_id = revision_id(title)
+            page = {"pageid": page_id, "ns": 0, "title": title}
+            if 'extracts' in props:
+                page['extract'] = extract
+            if 'revisions' in props:
+                page['revisions'] = [{"revid": revision_id(extract), "parentid": 0}]
+            if 'info' in props:
+                page.update(lastrevid=revision_id(extract), length=len(extract))
+            pages[str(page_id)] = page
+        return {"pages": pages}
+
+
+def start(articles=None, synthetic=False, host='127.0.0.1', port=0):
+    server = FixtureServer((host, port), load_all_fixtures() if articles is None else articles, synthetic)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve recorded Wikipedia fixtures over a MediaWiki-like API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--synthetic', action='store_true', help="generate articles for unknown titles")
+    args = parser.parse_args(argv)
+
+    server = FixtureServer((args.host, args.port), load_all_fixtures(), args.synthetic)
+    count = sum(len(titles) for titles in server.articles.values())
+    print(f"Serving {count} fixture articles; WIKIPEDIA_API_URL={server.api_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
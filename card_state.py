@@ -0,0 +1,108 @@
+from datetime import datetime
+from datetime import timedelta as td
+
+from simple_spaced_repetition import Card
+
+from spaced_repetition import MIN_EASE
+
+
+class NewCard(Card):
+    def __init__(self, id, front, back, last_reviewed=None, interval=None, ease=2.5, step=0, status='learning'):
+        
+        interval_td = td(seconds=interval) if isinstance(interval, (int, float)) else interval
+        super().__init__(status=status, interval=interval_td, ease=ease, step=step)
+
+        self.id = id
+        self.front = front
+        self.back = back
+
+        if isinstance(last_reviewed, str):
+            self.last_reviewed = datetime.strptime(last_reviewed, "%Y-%m-%d %H:%M:%S")
+        elif isinstance(last_reviewed, float):
+            self.last_reviewed = datetime.fromtimestamp(last_reviewed)
+        else:
+            self.last_reviewed = last_reviewed or datetime.now()
+    def grade_answer(self, response, reviewed_at=None):
+        option_dict = dict(self.options())
+        if response not in option_dict:
+            raise ValueError(f"Invalid response: {response}")
+        
+        next_state = option_dict[response]
+
+        self.status = next_state.status
+        self.interval = next_state.interval
+        self.ease = next_state.ease
+        self.step = next_state.step
+        self.last_reviewed = reviewed_at or datetime.now()
+
+    @property
+    def due_at(self):
+        return self.last_reviewed + self.interval if self.interval else self.last_reviewed
+
+    def to_dict(self):
+        return {
+            "id": int(self.id),
+            "term": self.front,
+            "definition": self.back,
+            "status": self.status,
+            "interval": self.interval.total_seconds() if self.interval else None,
+            "ease": self.ease,
+            "step": self.step,
+            "last_reviewed": self.last_reviewed.isoformat(),
+            "due_at": self.due_at.isoformat()
+        }
+
+def card_from_row(row):
+    return NewCard(
+        id=str(row['id']),
+        front=row['term'],
+        back=row['definition'],
+        last_reviewed=row['last_reviewed'],
+        interval=row['spaced_interval'],
+        ease=row['ease'],
+        step=row['step'],
+        status=row['status']
+    )
+
+
+class CardState:
+    """A flashcards row as plain attributes: what routes need to list or send cards.
+
+    Built straight from the driver's native types (DATETIME -> datetime, DOUBLE ->
+    float), so there is no string parsing, no timedelta and no Card constructor per
+    row. Grading still builds a NewCard for the one card being answered, with card_from_row().
+    """
+
+    __slots__ = ('id', 'term', 'definition', 'deck_id', 'status', 'interval', 'ease', 'step', 'last_reviewed')
+
+    def __init__(self, id, term, definition, deck_id, status, interval, ease, step, last_reviewed):
+        self.id = id
+        self.term = term
+        self.definition = definition
+        self.deck_id = deck_id
+        self.status = status
+        self.interval = interval  # seconds, None before the first review
+        self.ease = ease
+        self.step = step
+        self.last_reviewed = last_reviewed
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row['id'], row['term'], row['definition'], row['deck_id'], row['status'],
+                   row['spaced_interval'], row['ease'], row['step'], row['last_reviewed'])
+
+    def to_dict(self, now=None):
+        # Same output as NewCard.to_dict(): an unreviewed card counts as reviewed now
+        last_reviewed = self.last_reviewed or now or datetime.now()
+        due_at = last_reviewed + td(seconds=self.interval) if self.interval else last_reviewed
+        return {
+            "id": int(self.id),
+            "term": self.term,
+            "definition": self.definition,
+            "status": self.status,
+            "interval": float(self.interval) if self.interval else None,
+            "ease": max(self.ease, MIN_EASE),
+            "step": self.step,
+            "last_reviewed": last_reviewed.isoformat(),
+            "due_at": due_at.isoformat()
+        }
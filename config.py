@@ -6,3 +6,11 @@ class Config:
     MYSQL_USER = os.getenv('MYSQL_USER', 'root')
     MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD', 'your_password')
     MYSQL_DB = os.getenv('MYSQL_DB', 'books_db')
+
+    # Connection pool sizing for app.py
+    MYSQL_POOL_MIN_SIZE = int(os.getenv('MYSQL_POOL_MIN_SIZE', 2))
+    MYSQL_POOL_MAX_SIZE = int(os.getenv('MYSQL_POOL_MAX_SIZE', 10))
+    MYSQL_POOL_TIMEOUT = float(os.getenv('MYSQL_POOL_TIMEOUT', 5))
+
+    # Optional user sharding: "db0,db1" or "host0/db0,host1/db1" (see shard_router.py)
+    MYSQL_SHARDS = os.getenv('MYSQL_SHARDS', '')
@@ -0,0 +1,207 @@
+import threading
+import time
+from collections import deque
+
+from pymysql.constants import SERVER_STATUS
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no connection could be checked out before the timeout."""
+
+
+def in_transaction(raw):
+    # sqlite3 connections (sqlite_repository.py) say so directly; pymysql keeps it in the server status
+    if hasattr(raw, 'in_transaction'):
+        return raw.in_transaction
+    return bool(raw.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS)
+
+
+class PooledConnection:
+    """Thin proxy around a pymysql (or sqlite3) connection that hands it back to the pool on close()."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self.released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        # Routes still call connection.close(); for a pooled connection that means "return it"
+        if not self.released:
+            self.released = True
+            self._pool.release(self._raw)
+
+
+class ConnectionPool:
+    """Bounded pool of database connections (pymysql, or sqlite3 via sqlite_repository.connect_sqlite).
+
+    Connections are opened lazily up to max_size, the first checkout fills the
+    pool up to min_size, and every checkout pings the connection so a dropped
+    socket is replaced instead of handed to a route.
+    """
+
+    def __init__(self, connect, min_size=2, max_size=10, timeout=5.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool sizes: min={min_size} max={max_size}")
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+
+        self._idle = deque()
+        self._size = 0
+        self._filled = False
+        self._cond = threading.Condition()
+
+        # Counters exposed through stats()
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._exhausted = 0
+        self._created = 0
+        self._discarded = 0
+
+    def _fill(self):
+        # Open min_size connections up front so the first requests don't all pay the handshake
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    self._filled = True
+                    return
+                self._size += 1
+            try:
+                raw = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._filled = True
+                raise
+            with self._cond:
+                self._idle.append(raw)
+                self._cond.notify()
+
+    def _open(self):
+        raw = self._connect()
+        with self._cond:
+            self._created += 1
+        return raw
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    @staticmethod
+    def _is_healthy(raw):
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        if not self._filled:
+            self._fill()
+
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+
+        while True:
+            raw = None
+            with self._cond:
+                while True:
+                    if self._idle:
+                        raw = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._exhausted += 1
+                        raise PoolExhaustedError(
+                            f"No database connection available after {self.timeout:.1f}s "
+                            f"(max_size={self.max_size})"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+
+            if raw is None:
+                try:
+                    raw = self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(raw):
+                # Stale connection (server restart, wait_timeout): drop it and try again
+                self._discard(raw)
+                continue
+            break
+
+        elapsed = time.monotonic() - start
+        with self._cond:
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+                self._wait_time += elapsed
+                self._max_wait_time = max(self._max_wait_time, elapsed)
+
+        return PooledConnection(self, raw)
+
+    def release(self, raw):
+        if not raw.open:
+            self._discard(raw)
+            return
+
+        # Don't leak an open transaction (or a stale REPEATABLE READ snapshot) to the next request
+        if in_transaction(raw):
+            try:
+                raw.rollback()
+            except Exception:
+                self._discard(raw)
+                return
+
+        with self._cond:
+            self._idle.append(raw)
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._filled = False
+        for raw in idle:
+            try:
+                raw.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._cond:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_total": round(self._wait_time, 6),
+                "wait_time_max": round(self._max_wait_time, 6),
+                "exhausted": self._exhausted,
+                "created": self._created,
+                "discarded": self._discarded,
+            }
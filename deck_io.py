@@ -0,0 +1,244 @@
+import argparse
+import csv
+import io
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import zipfile
+
+import pymysql
+from dotenv import load_dotenv
+
+from shard_router import shard_databases, shard_index
+
+# Rows per executemany batch; pymysql turns each batch into a few multi-row INSERTs
+IMPORT_CHUNK_SIZE = 5000
+EXPORT_CHUNK_SIZE = 5000
+
+# flashcards.term and .definition are VARCHAR(255)
+MAX_FIELD_LENGTH = 255
+
+# First rows that are column names, compared case-insensitively: export_deck's own header
+# and the one flashcards.csv starts with
+HEADER_ROWS = {('term', 'definition'), ('spanish', 'english')}
+
+TAG_RE = re.compile(r"<[^>]+>")
+
+
+# ---- Readers: every reader yields (term, definition) pairs without loading the whole file ----
+
+def iter_delimited_rows(stream, delimiter=',', skip_header=None):
+    """CSV/TSV rows from a text stream. skip_header=None drops a first row that is one of HEADER_ROWS."""
+    reader = csv.reader(stream, delimiter=delimiter)
+    first = True
+    for row in reader:
+        if len(row) < 2 or not row[0].strip():
+            continue
+        if first:
+            first = False
+            header = (row[0].strip().lower(), row[1].strip().lower())
+            if skip_header or (skip_header is None and header in HEADER_ROWS):
+                continue
+        yield row[0].strip(), row[1].strip()
+
+
+def iter_anki_text_rows(stream):
+    """Anki "Notes in Plain Text" export: tab separated, '#key:value' header lines, HTML in fields."""
+    delimiter = '\t'
+    lines = iter(stream)
+    body = []
+    for line in lines:
+        if not line.startswith('#'):
+            body.append(line)
+            break
+        if line.startswith('#separator:'):
+            delimiter = {'tab': '\t', 'comma': ',', 'semicolon': ';', 'pipe': '|', 'space': ' '}.get(
+                line.split(':', 1)[1].strip().lower(), '\t')
+
+    def rest():
+        yield from body
+        yield from lines
+
+    for term, definition in iter_delimited_rows(rest(), delimiter, skip_header=False):
+        yield TAG_RE.sub('', term), TAG_RE.sub('', definition)
+
+
+def iter_apkg_rows(path):
+    """Notes from an Anki .apkg package: the first two fields of each note, read via SQLite."""
+    with zipfile.ZipFile(path) as package:
+        names = set(package.namelist())
+        collection = next((name for name in ('collection.anki21', 'collection.anki2') if name in names), None)
+        if collection is None:
+            raise ValueError("Not an Anki package: no collection.anki2 inside")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'collection.db')
+            with package.open(collection) as src, open(db_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+
+            db = sqlite3.connect(db_path)
+            try:
+                for (fields,) in db.execute("SELECT flds FROM notes ORDER BY id"):
+                    parts = fields.split('\x1f')
+                    if len(parts) >= 2 and parts[0].strip():
+                        yield TAG_RE.sub('', parts[0]).strip(), TAG_RE.sub('', parts[1]).strip()
+            finally:
+                db.close()
+
+
+def check_lengths(rows):
+    """Passes pairs through, raising ValueError at the first field too long for its column."""
+    for number, (term, definition) in enumerate(rows, 1):
+        for name, value in (('term', term), ('definition', definition)):
+            if len(value) > MAX_FIELD_LENGTH:
+                raise ValueError(f"card {number}: {name} is longer than {MAX_FIELD_LENGTH} characters")
+        yield term, definition
+
+
+def iter_file_rows(path_or_stream, filename):
+    """Picks a reader from the file extension. Binary streams are decoded as UTF-8."""
+    yield from check_lengths(iter_reader_rows(path_or_stream, filename))
+
+
+def iter_reader_rows(path_or_stream, filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.apkg':
+        yield from iter_apkg_rows(path_or_stream)
+        return
+
+    if isinstance(path_or_stream, str):
+        stream = open(path_or_stream, encoding='utf-8-sig', newline='')
+    else:
+        stream = io.TextIOWrapper(path_or_stream, encoding='utf-8-sig', newline='')
+    with stream:
+        if extension == '.txt':
+            yield from iter_anki_text_rows(stream)
+        elif extension == '.tsv':
+            yield from iter_delimited_rows(stream, '\t')
+        else:
+            yield from iter_delimited_rows(stream, ',')
+
+
+# ---- Bulk load against MySQL (imports and exports otherwise go through repository.py) ----
+
+def load_data_infile(connection, path, user_id, deck_id, delimiter=',', skip_header=True):
+    """Fastest path for a CSV/TSV on local disk; needs local_infile enabled on both ends."""
+    cursor = connection.cursor()
+    cursor.execute(f"""
+        LOAD DATA LOCAL INFILE %s INTO TABLE flashcards
+        CHARACTER SET utf8mb4
+        FIELDS TERMINATED BY %s OPTIONALLY ENCLOSED BY '"'
+        LINES TERMINATED BY '\\n'
+        {'IGNORE 1 LINES' if skip_header else ''}
+        (term, definition)
+        SET deck_id = %s, user_id = %s
+    """, (path, delimiter, deck_id, user_id))
+    connection.commit()
+    return cursor.rowcount
+
+
+# ---- Export formatting, shared by export_deck and the CLI ----
+
+def format_export_chunks(pages, export_format='csv'):
+    """One text chunk per page of card rows (dicts with term and definition), header first."""
+    buffer = io.StringIO()
+    if export_format == 'anki':
+        buffer.write("#separator:tab\n#html:false\n")
+        writer = csv.writer(buffer, delimiter='\t', lineterminator='\n')
+    else:
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(['term', 'definition'])
+
+    for rows in pages:
+        for row in rows:
+            writer.writerow([row['term'], row['definition']])
+        if buffer.tell():
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        # No pages at all: still send the header
+        yield buffer.getvalue()
+
+
+# ---- CLI: python deck_io.py import words.csv --user-id 1 --deck-name Spanish | export 1 3 -o deck.csv ----
+
+def connect(local_infile=False, host=None, db=None):
+    load_dotenv()
+    return pymysql.connect(
+        host=host or os.getenv('MYSQL_HOST'),
+        user=os.getenv('MYSQL_USER'),
+        password=os.getenv('MYSQL_PASSWORD'),
+        db=db or os.getenv('MYSQL_DB'),
+        charset='utf8mb4',
+        cursorclass=pymysql.cursors.DictCursor,
+        local_infile=local_infile
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import/export of flashcard decks.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help="import a CSV, TSV, Anki .txt or .apkg file")
+    import_parser.add_argument('path')
+    import_parser.add_argument('--user-id', type=int, required=True, help="owner of the deck")
+    target = import_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--deck-id', type=int, help="add cards to this deck")
+    target.add_argument('--deck-name', help="create a new deck with this name")
+    import_parser.add_argument('--language', help="language code stored on a new deck")
+    import_parser.add_argument('--load-data', action='store_true',
+                               help="use LOAD DATA LOCAL INFILE (CSV/TSV only, first row is a header)")
+
+    export_parser = commands.add_parser('export', help="export a deck")
+    export_parser.add_argument('user_id', type=int)
+    export_parser.add_argument('deck_id', type=int)
+    export_parser.add_argument('-o', '--output', required=True)
+    export_parser.add_argument('--format', choices=['csv', 'anki'], default='csv')
+
+    args = parser.parse_args(argv)
+    # repository.py reads the chunk sizes from this module, so it can only be imported here
+    from repository import MySQLRepository
+
+    load_dotenv()
+    databases = shard_databases()
+    host, db = databases[shard_index(args.user_id, len(databases))]
+    repository = MySQLRepository(connect(local_infile=getattr(args, 'load_data', False), host=host, db=db))
+    try:
+        if args.command == 'import':
+            deck_id = args.deck_id
+            if deck_id is None:
+                deck_id = repository.create_deck(args.user_id, args.deck_name, args.language)
+                repository.commit()
+            elif repository.owned_deck(deck_id, args.user_id) is None:
+                parser.error(f"user {args.user_id} has no deck {deck_id}")
+
+            try:
+                if args.load_data:
+                    delimiter = '\t' if args.path.lower().endswith('.tsv') else ','
+                    count = load_data_infile(repository.connection, os.path.abspath(args.path), args.user_id,
+                                             deck_id, delimiter)
+                else:
+                    count = repository.import_cards(args.user_id, deck_id, iter_file_rows(args.path, args.path))
+            finally:
+                # Rows are committed as they go, so recount the deck even after a partial import.
+                # New ETag for the deck page, and a miss in the app's page cache
+                repository.refresh_deck_stats([deck_id])
+                repository.bump_deck_version(deck_id)
+                repository.commit()
+            print(f"Imported {count} cards into deck {deck_id}")
+        else:
+            if repository.owned_deck(args.deck_id, args.user_id) is None:
+                parser.error(f"user {args.user_id} has no deck {args.deck_id}")
+            pages = repository.iter_deck_pages(args.deck_id, EXPORT_CHUNK_SIZE)
+            with open(args.output, 'w', encoding='utf-8', newline='') as file:
+                for chunk in format_export_chunks(pages, args.format):
+                    file.write(chunk)
+            print(f"Exported deck {args.deck_id} to {args.output}")
+    finally:
+        repository.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+import argparse
+from datetime import date, datetime, time, timedelta
+
+from dotenv import load_dotenv
+
+from shard_router import shard_databases
+
+# Counters kept per deck in the deck_stats table. ease_sum is stored instead of the
+# average so it can be maintained with plain additions; avg ease = ease_sum / card_count.
+COUNTERS = ('card_count', 'new_count', 'learning_count', 'review_count', 'due_today_count', 'ease_sum')
+
+
+def end_of_today():
+    return datetime.combine(date.today() + timedelta(days=1), time())
+
+
+def card_counts(last_reviewed, status, ease, due_at):
+    """What one card contributes to its deck's counters (same rules as REFRESH_SQL)."""
+    is_new = last_reviewed is None
+    return {
+        'card_count': 1,
+        'new_count': int(is_new),
+        'learning_count': int(not is_new and status in ('learning', 'relearning')),
+        'review_count': int(not is_new and status == 'reviewing'),
+        'due_today_count': int(due_at is not None and due_at < end_of_today()),
+        'ease_sum': ease or 0,
+    }
+
+
+def row_counts(row):
+    return card_counts(row['last_reviewed'], row['status'], row['ease'], row['due_at'])
+
+
+def new_card_counts():
+    # A freshly inserted card: never reviewed, due now, default ease
+    return card_counts(None, 'learning', 2.5, datetime.now())
+
+
+def diff_counts(before, after):
+    return {name: after[name] - before[name] for name in COUNTERS}
+
+
+def scale_counts(counts, factor):
+    return {name: counts[name] * factor for name in COUNTERS}
+
+
+def apply_delta(cursor, deck_id, delta):
+    """Adds delta to a deck's counters in place.
+
+    If the deck had no stats row yet, one is created with stats_date NULL so the
+    next refresh_stale() recomputes it instead of trusting the partial numbers.
+    """
+    if not any(delta.values()):
+        return
+    cursor.execute("""
+        INSERT INTO deck_stats (deck_id, card_count, new_count, learning_count, review_count,
+                                due_today_count, ease_sum, stats_date)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, NULL)
+        ON DUPLICATE KEY UPDATE
+            card_count = card_count + VALUES(card_count),
+            new_count = new_count + VALUES(new_count),
+            learning_count = learning_count + VALUES(learning_count),
+            review_count = review_count + VALUES(review_count),
+            due_today_count = due_today_count + VALUES(due_today_count),
+            ease_sum = ease_sum + VALUES(ease_sum)
+    """, (deck_id, *(delta[name] for name in COUNTERS)))
+
+
+REFRESH_SQL = """
+    INSERT INTO deck_stats (deck_id, card_count, new_count, learning_count, review_count,
+                            due_today_count, ease_sum, stats_date)
+    SELECT decks.id,
+           COUNT(flashcards.id),
+           COALESCE(SUM(flashcards.id IS NOT NULL AND flashcards.last_reviewed IS NULL), 0),
+           COALESCE(SUM(flashcards.last_reviewed IS NOT NULL AND flashcards.status IN ('learning', 'relearning')), 0),
+           COALESCE(SUM(flashcards.last_reviewed IS NOT NULL AND flashcards.status = 'reviewing'), 0),
+           COALESCE(SUM(flashcards.due_at < CURDATE() + INTERVAL 1 DAY), 0),
+           COALESCE(SUM(flashcards.ease), 0),
+           CURDATE()
+    FROM decks
+    LEFT JOIN flashcards ON flashcards.deck_id = decks.id
+    {where}
+    GROUP BY decks.id
+    ON DUPLICATE KEY UPDATE
+        card_count = VALUES(card_count),
+        new_count = VALUES(new_count),
+        learning_count = VALUES(learning_count),
+        review_count = VALUES(review_count),
+        due_today_count = VALUES(due_today_count),
+        ease_sum = VALUES(ease_sum),
+        stats_date = VALUES(stats_date)
+"""
+
+
+# A user's decks whose stats are from an earlier day (cards became due overnight) or unknown
+STALE_DECKS_SQL = """
+    SELECT decks.id FROM decks
+    LEFT JOIN deck_stats ON deck_stats.deck_id = decks.id
+    WHERE decks.user_id = %s AND (deck_stats.stats_date IS NULL OR deck_stats.stats_date < CURDATE())
+"""
+
+
+def refresh_decks(cursor, deck_ids):
+    """Recomputes the counters of the given decks from their cards (after bulk inserts and merges)."""
+    deck_ids = list(deck_ids)
+    if not deck_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(deck_ids))
+    cursor.execute(REFRESH_SQL.format(where=f"WHERE decks.id IN ({placeholders})"), deck_ids)
+
+
+def refresh_stale(cursor, user_id):
+    """Recomputes the user's decks whose stats are from an earlier day (cards became due overnight) or unknown."""
+    cursor.execute(STALE_DECKS_SQL, (user_id,))
+    stale = [row['id'] for row in cursor.fetchall()]
+    refresh_decks(cursor, stale)
+    return stale
+
+
+def reconcile(connection):
+    """Repairs drift: recomputes every deck and drops rows for decks that no longer exist."""
+    cursor = connection.cursor()
+    cursor.execute(REFRESH_SQL.format(where=""))
+    cursor.execute("DELETE FROM deck_stats WHERE deck_id NOT IN (SELECT id FROM decks)")
+    connection.commit()
+
+
+# Run nightly (e.g. from cron): python deck_stats.py reconcile
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the deck_stats table.")
+    parser.add_argument('command', choices=['reconcile'])
+    parser.parse_args(argv)
+
+    load_dotenv()
+    from deck_io import connect
+    for host, db in shard_databases():
+        connection = connect(host=host, db=db)
+        try:
+            reconcile(connection)
+            print(f"deck_stats reconciled in {db}")
+        finally:
+            connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+import threading
+from collections import OrderedDict
+
+
+class FragmentCache:
+    """Small in-process LRU of rendered HTML fragments.
+
+    Keys include a version number read from the database (e.g. decks.version), so a
+    stale entry is never served after a change; it just ages out of the LRU.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            fragment = self._entries.get(key)
+            if fragment is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return fragment
+
+    def put(self, key, fragment):
+        with self._lock:
+            self._entries[key] = fragment
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses}
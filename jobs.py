@@ -0,0 +1,99 @@
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    """State of one background job, updated by the worker and read by the status endpoint."""
+
+    def __init__(self, job_id, name, owner_id=None):
+        self.id = job_id
+        self.name = name
+        self.owner_id = owner_id  # user who started it; only they can read its status
+        self.status = 'queued'  # queued -> running -> done | failed
+        self.stage = 'queued'
+        self.progress = 0
+        self.message = None
+        self.result = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def update(self, stage=None, progress=None, message=None):
+        with self._lock:
+            if stage is not None:
+                self.stage = stage
+            if progress is not None:
+                self.progress = max(0, min(100, int(progress)))
+            if message is not None:
+                self.message = message
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "id": self.id,
+                "name": self.name,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": self.progress,
+                "message": self.message,
+                "result": self.result
+            }
+
+
+def evict_finished(jobs, keep_finished):
+    """Drops jobs from the id -> Job dict that finished more than keep_finished seconds ago."""
+    cutoff = time.time() - keep_finished
+    expired = [job_id for job_id, job in jobs.items() if job.finished_at and job.finished_at < cutoff]
+    for job_id in expired:
+        del jobs[job_id]
+
+
+class JobFailed(Exception):
+    """Raised inside a job to fail it with a message meant for the user."""
+
+
+class JobManager:
+    """Runs jobs on a small thread pool and keeps their state in memory.
+
+    Finished jobs are kept for `keep_finished` seconds so clients can read the
+    result. State is per process: with several gunicorn workers, route the status
+    polls to the worker that accepted the job (or run one worker for jobs).
+    """
+
+    def __init__(self, max_workers=2, keep_finished=3600):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.keep_finished = keep_finished
+
+    def submit(self, name, fn, *args, owner_id=None, **kwargs):
+        """Queues fn(job, *args, **kwargs); whatever it returns becomes job.result."""
+        job = Job(uuid.uuid4().hex, name, owner_id)
+        with self._lock:
+            evict_finished(self._jobs, self.keep_finished)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = 'running'
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status = 'done'
+            job.update(stage='done', progress=100)
+        except JobFailed as e:
+            job.status = 'failed'
+            job.update(message=str(e))
+        except Exception as e:
+            traceback.print_exc()
+            job.status = 'failed'
+            job.update(message=f"Unexpected error: {e}")
+        finally:
+            job.finished_at = time.time()
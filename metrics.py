@@ -0,0 +1,257 @@
+import contextvars
+import logging
+import re
+import threading
+import time
+from functools import wraps
+
+import pymysql
+
+# Prometheus' default buckets (seconds)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+slow_log = logging.getLogger('flashcards.slow')
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=()):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in (*zip(names, values), *extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, label_values)} {format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, *label_values, value):
+        with self._lock:
+            self._values[label_values] = value
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label combination."""
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = format_labels(self.labels, label_values, [('le', format_value(float(bound)))])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = format_labels(self.labels, label_values, [('le', '+Inf')])
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    'flashcards_http_requests_total', "HTTP requests by route and status.", ('route', 'method', 'status')))
+http_request_duration = registry.register(Histogram(
+    'flashcards_http_request_duration_seconds', "Time from request start to response.", ('route', 'method')))
+http_request_queries = registry.register(Histogram(
+    'flashcards_http_request_queries', "SQL statements sent while handling one request.", ('route',),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100)))
+db_query_duration = registry.register(Histogram(
+    'flashcards_db_query_duration_seconds', "SQL statement round trip, by statement type.", ('statement',)))
+slow_queries = registry.register(Counter(
+    'flashcards_slow_queries_total', "SQL statements slower than SLOW_QUERY_MS.", ('statement',)))
+slow_requests = registry.register(Counter(
+    'flashcards_slow_requests_total', "Requests slower than SLOW_REQUEST_MS.", ('route',)))
+db_pool_connections = registry.register(Gauge(
+    'flashcards_db_pool_connections', "Pooled MySQL connections per shard, read at scrape time.", ('shard', 'state')))
+stage_duration = registry.register(Histogram(
+    'flashcards_stage_duration_seconds', "Wikipedia deck pipeline stages.", ('stage',),
+    buckets=DEFAULT_BUCKETS + (30.0, 60.0)))
+
+# Thresholds in seconds; None turns that log off. app.py sets them from SLOW_QUERY_MS / SLOW_REQUEST_MS.
+slow_query_seconds = None
+slow_request_seconds = None
+
+
+# ---- SQL normalization: one line per query shape, no values ----
+
+_PARAM_RE = re.compile(r"%(?:\(\w+\))?s")
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROWS_RE = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """Placeholders and literals -> ?, IN lists and multi-row VALUES collapsed, whitespace squeezed."""
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode('utf-8', 'replace')
+    sql = _PARAM_RE.sub('?', sql)
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _SPACE_RE.sub(' ', sql).strip()
+    sql = _LIST_RE.sub('(...)', sql)
+    return _ROWS_RE.sub('(...), ...', sql)
+
+
+def statement_type(sql):
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode('utf-8', 'replace')
+    words = sql.split(None, 1)
+    return words[0].upper() if words else ''
+
+
+# ---- Per-request accounting ----
+
+class RequestStats:
+    __slots__ = ('queries', 'sql_seconds', 'slowest_seconds', 'slowest_sql')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_sql = None
+
+
+# A context variable, so concurrent asyncio tasks each get their own; threads that are not
+# serving a request (review log flush, background jobs) see None and only feed the global metrics
+current_request = contextvars.ContextVar('current_request', default=None)
+
+
+def begin_request():
+    return current_request.set(RequestStats())
+
+
+def end_request(token, route, method, status, seconds):
+    stats = current_request.get()
+    current_request.reset(token)
+    http_requests.inc(route, method, str(status))
+    http_request_duration.observe(seconds, route, method)
+    if stats is not None:
+        http_request_queries.observe(stats.queries, route)
+    if slow_request_seconds is not None and seconds >= slow_request_seconds:
+        slow_requests.inc(route)
+        if stats is not None and stats.slowest_sql is not None:
+            slow_log.warning("slow request %s %s %d: %.1f ms, %d queries (%.1f ms in SQL), slowest %.1f ms: %s",
+                             method, route, status, seconds * 1000, stats.queries, stats.sql_seconds * 1000,
+                             stats.slowest_seconds * 1000, normalize_sql(stats.slowest_sql))
+        else:
+            slow_log.warning("slow request %s %s %d: %.1f ms, no queries", method, route, status, seconds * 1000)
+    return stats
+
+
+def record_query(sql, seconds):
+    kind = statement_type(sql)
+    db_query_duration.observe(seconds, kind)
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_seconds += seconds
+        if seconds > stats.slowest_seconds:
+            stats.slowest_seconds = seconds
+            stats.slowest_sql = sql
+    if slow_query_seconds is not None and seconds >= slow_query_seconds:
+        slow_queries.inc(kind)
+        slow_log.warning("slow query %.1f ms: %s", seconds * 1000, normalize_sql(sql))
+
+
+class InstrumentedTupleCursor(pymysql.cursors.Cursor):
+    """Cursor that times every statement sent to the server; rows come back as tuples.
+
+    executemany() sends its rows through execute(), so a batched insert counts once per
+    round trip with the multi-row statement it actually sent.
+    """
+
+    def execute(self, query, args=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, args)
+        finally:
+            record_query(query, time.perf_counter() - started)
+
+
+class InstrumentedCursor(pymysql.cursors.DictCursorMixin, InstrumentedTupleCursor):
+    """The connections' default cursor: InstrumentedTupleCursor with rows as dicts, like DictCursor."""
+
+
+# ---- Pipeline stages ----
+
+def timed(stage):
+    """Decorator: records each call's duration under flashcards_stage_duration_seconds{stage=...}."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapped(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stage_duration.observe(time.perf_counter() - started, stage)
+        return wrapped
+    return decorator
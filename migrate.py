@@ -0,0 +1,345 @@
+import argparse
+import ast
+import os
+import random
+import re
+import sys
+
+import pymysql
+from dotenv import load_dotenv
+
+from deck_io import connect
+from shard_router import shard_databases
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE_RE = re.compile(r'^(\d{4})_(\w+)\.sql$')
+
+# Modules whose SQL is checked by `python migrate.py check`
+CHECKED_MODULES = ['repository.py', 'search.py', 'deck_stats.py', 'deck_io.py', 'translation_cache.py', 'review_log.py']
+
+# Full scans that are fine: tables that are small by nature, and whole-table jobs
+ALLOWED_FULL_SCAN_TABLES = {'schema_migrations'}
+ALLOWED_FULL_SCAN_FUNCTIONS = {
+    'reconcile': "nightly rebuild of deck_stats",
+}
+
+# Data a migration cannot cope with: each query returns the offending rows, and the
+# migration is not started while it returns any
+PRECHECKS = {
+    7: ("SELECT username, COUNT(*) AS copies FROM users GROUP BY username HAVING COUNT(*) > 1 LIMIT 20",
+        "0007 adds a unique index on users.username, but these usernames are taken more than "
+        "once. Rename or merge the duplicate accounts, then run the migration again."),
+}
+
+
+class MigrationBlocked(Exception):
+    pass
+
+
+# ---- Migrations ----
+
+def load_migrations():
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE_RE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return migrations
+
+
+def split_statements(sql):
+    # Migration files hold plain DDL/DML: statements end with ';' at the end of a line
+    sql = '\n'.join(line for line in sql.splitlines() if not line.strip().startswith('--'))
+    return [statement.strip() for statement in re.split(r';\s*$', sql, flags=re.MULTILINE) if statement.strip()]
+
+
+def ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT NOT NULL PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cursor):
+    ensure_migrations_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row['version'] for row in cursor.fetchall()}
+
+
+def pending_migrations(cursor, target=None):
+    done = applied_versions(cursor)
+    return [(version, name, path) for version, name, path in load_migrations()
+            if version not in done and (target is None or version <= target)]
+
+
+def precheck(cursor, version):
+    if version not in PRECHECKS:
+        return
+    sql, message = PRECHECKS[version]
+    cursor.execute(sql)
+    rows = cursor.fetchall()
+    if rows:
+        found = '\n'.join('    ' + ', '.join(f"{key}={value}" for key, value in row.items()) for row in rows)
+        raise MigrationBlocked(f"{message}\n{found}")
+
+
+def migrate(connection, target=None):
+    """Applies pending migrations in order. MySQL DDL commits implicitly, so each
+    migration is recorded right after it finishes; a failure stops the run there."""
+    cursor = connection.cursor()
+    for version, name, path in pending_migrations(cursor, target):
+        precheck(cursor, version)
+        print(f"Applying {version:04d}_{name}")
+        with open(path, encoding='utf-8') as file:
+            for statement in split_statements(file.read()):
+                cursor.execute(statement)
+        cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        connection.commit()
+
+
+def baseline(connection, version):
+    """Marks migrations up to `version` as applied, for databases whose schema already has them."""
+    cursor = connection.cursor()
+    done = applied_versions(cursor)
+    for number, name, _ in load_migrations():
+        if number <= version and number not in done:
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (number, name))
+    connection.commit()
+
+
+def status(connection):
+    cursor = connection.cursor()
+    done = applied_versions(cursor)
+    for version, name, _ in load_migrations():
+        print(f"[{'x' if version in done else ' '}] {version:04d}_{name}")
+
+
+# ---- Seeding a scratch database for the plan check ----
+
+def seed(connection, decks=50, cards_per_deck=400, users=200):
+    """Fills the tables with synthetic rows so the optimizer sees realistic cardinalities."""
+    cursor = connection.cursor()
+    cursor.executemany(
+        "INSERT INTO users (username, email, password_hash) VALUES (%s, %s, %s)",
+        [(f"seed_user_{i}_{random.getrandbits(32)}", f"seed{i}@example.com", "x") for i in range(users)]
+    )
+    cursor.execute("SELECT id FROM users")
+    user_ids = [row['id'] for row in cursor.fetchall()]
+    statuses = ['learning', 'reviewing', 'relearning']
+    for d in range(decks):
+        user_id = random.choice(user_ids)
+        cursor.execute("INSERT INTO decks (name, language_code, user_id) VALUES (%s, 'es', %s)",
+                       (f"seed deck {d}", user_id))
+        deck_id = cursor.lastrowid
+        cursor.executemany(
+            "INSERT INTO flashcards (term, definition, deck_id, user_id, status, ease, step, spaced_interval) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+            [(f"palabra{d}_{i}", f"word{d}_{i}", deck_id, user_id, random.choice(statuses),
+              round(random.uniform(1.3, 3.0), 2), random.randint(0, 1), random.randint(60, 86400 * 30))
+             for i in range(cards_per_deck)]
+        )
+    for table in ('users', 'decks', 'flashcards'):
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+    connection.commit()
+
+
+# ---- Query plan check ----
+
+def module_string_constants(tree):
+    constants = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    constants[target.id] = node.value.value
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Dict):
+            # e.g. MERGE_POLICIES: use the first value as a representative
+            values = [v.value for v in node.value.values if isinstance(v, ast.Constant) and isinstance(v.value, str)]
+            for target in node.targets:
+                if isinstance(target, ast.Name) and values:
+                    constants[target.id] = values[0]
+    return constants
+
+
+def local_string_constants(function, constants):
+    """Strings assigned to local names in a function: the first assignment, plus any `+=` of a literal."""
+    # IN-list placeholders are always built as ', '.join(['%s'] * n)
+    local = dict(constants, placeholders='%s, %s')
+    seen = set()
+    nodes = list(ast.walk(function))
+    for node in nodes:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            name = node.targets[0].id
+            if name not in seen:
+                value = render_sql(node.value, local)
+                if value is not None:
+                    local[name] = value
+            seen.add(name)
+    for node in sorted((node for node in nodes if isinstance(node, ast.AugAssign)), key=lambda node: node.lineno):
+        if isinstance(node.target, ast.Name) and node.target.id in local \
+                and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+            local[node.target.id] += node.value.value
+    return local
+
+
+def render_sql(node, constants):
+    """Best-effort static rendering of the SQL argument of an execute() call; None if too dynamic."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.Name) and node.id in constants:
+        return constants[node.id]
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'format':
+        base = render_sql(node.func.value, constants)
+        if base is None:
+            return None
+        fields = {keyword.arg: render_sql(keyword.value, constants) or '' for keyword in node.keywords}
+        return re.sub(r'\{(\w+)\}', lambda match: fields.get(match.group(1), ''), base)
+    if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id in constants:
+        return constants[node.value.id]
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant):
+                parts.append(value.value)
+                continue
+            rendered = render_sql(value.value, constants)
+            if rendered is None:
+                return None
+            parts.append(rendered)
+        return ''.join(parts)
+    return None
+
+
+def is_cursor_call(node):
+    # cursor.execute(...) on a DB-API cursor; sqlite3 reads in deck_io (db.execute) are not MySQL queries
+    return isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+        and node.func.attr in ('execute', 'executemany') and node.args \
+        and isinstance(node.func.value, ast.Name) and 'cursor' in node.func.value.id
+
+
+def extract_queries(path):
+    """(function name, line, sql) for every cursor.execute/executemany call in a module."""
+    with open(path, encoding='utf-8') as file:
+        tree = ast.parse(file.read(), path)
+    module_constants = module_string_constants(tree)
+    queries = []
+
+    def visit(node, function, constants):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                visit(child, child.name, local_string_constants(child, module_constants))
+                continue
+            if is_cursor_call(child):
+                queries.append((function, child.lineno, render_sql(child.args[0], constants)))
+            visit(child, function, constants)
+
+    visit(tree, '<module>', module_constants)
+    return queries
+
+
+def explainable(sql):
+    statement = sql.strip().upper()
+    if statement.startswith('INSERT') and 'SELECT' not in statement:
+        return False
+    return statement.startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT'))
+
+
+def sample_sql(sql):
+    # Stand-in parameter values: numbers for LIMIT/IN lists, '1' elsewhere (MySQL casts as needed)
+    sql = re.sub(r'LIMIT\s+%s', 'LIMIT 20', sql, flags=re.IGNORECASE)
+    return sql.replace('%s', "'1'")
+
+
+def check(connection, root):
+    """EXPLAINs every static query and fails if a hot one falls back to a full table scan."""
+    cursor = connection.cursor()
+    failures = 0
+    for module in CHECKED_MODULES:
+        for function, line, sql in extract_queries(os.path.join(root, module)):
+            where = f"{module}:{line} ({function})"
+            if sql is None:
+                print(f"SKIP {where}: dynamic SQL")
+                continue
+            if not explainable(sql):
+                continue
+            try:
+                cursor.execute("EXPLAIN " + sample_sql(sql))
+                plan = cursor.fetchall()
+            except pymysql.MySQLError as e:
+                print(f"ERROR {where}: {e}")
+                failures += 1
+                continue
+
+            scans = [row['table'] for row in plan
+                     if row.get('type') == 'ALL' and row.get('table')
+                     and not row['table'].startswith('<')
+                     and row['table'] not in ALLOWED_FULL_SCAN_TABLES]
+            if scans and function not in ALLOWED_FULL_SCAN_FUNCTIONS:
+                print(f"FULL SCAN {where}: {', '.join(scans)}")
+                print("    " + " ".join(sql.split()))
+                failures += 1
+            else:
+                print(f"ok {where}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Schema migrations and query plan checks for flashcards_db.")
+    commands = parser.add_subparsers(dest='command')
+    up = commands.add_parser('up', help="apply pending migrations (default)")
+    up.add_argument('--target', type=int, help="stop after this version")
+    commands.add_parser('status', help="list migrations and whether they are applied")
+    base = commands.add_parser('baseline', help="mark migrations as applied without running them")
+    base.add_argument('version', type=int)
+    plan = commands.add_parser('check', help="EXPLAIN the app's queries and fail on full scans")
+    plan.add_argument('--seed', action='store_true', help="insert synthetic rows first (scratch databases only!)")
+    plan.add_argument('--apply', action='store_true', help="apply pending migrations first instead of refusing")
+    args = parser.parse_args(argv)
+
+    # With MYSQL_SHARDS set every shard gets the same schema; the plan check runs on the first
+    load_dotenv()
+    databases = shard_databases()
+    if args.command == 'check':
+        databases = databases[:1]
+
+    failures = 0
+    for host, db in databases:
+        if len(databases) > 1:
+            print(f"== {db} on {host}")
+        connection = connect(host=host, db=db)
+        try:
+            if args.command == 'status':
+                status(connection)
+            elif args.command == 'baseline':
+                baseline(connection, args.version)
+            elif args.command == 'check':
+                # The check only reads, unless asked to bring the schema up to date first
+                pending = pending_migrations(connection.cursor())
+                if pending and not args.apply:
+                    names = ', '.join(f"{version:04d}_{name}" for version, name, _ in pending)
+                    print(f"{db} has pending migrations ({names}): run `python migrate.py up` "
+                          f"or pass --apply")
+                    sys.exit(1)
+                migrate(connection)
+                if args.seed:
+                    seed(connection)
+                failures = check(connection, os.path.dirname(os.path.abspath(__file__)))
+            else:
+                migrate(connection, getattr(args, 'target', None))
+        except MigrationBlocked as e:
+            print(e)
+            sys.exit(1)
+        finally:
+            connection.close()
+
+    if failures:
+        print(f"{failures} query plan problem(s)")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
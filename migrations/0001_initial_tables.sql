@@ -0,0 +1,26 @@
+-- Tables as the app used them before migrations existed. IF NOT EXISTS so databases
+-- that were created by hand pick up from here (or use: python migrate.py baseline 1).
+CREATE TABLE IF NOT EXISTS users (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    username VARCHAR(50) NOT NULL,
+    email VARCHAR(255) NOT NULL,
+    password_hash VARCHAR(255) NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS decks (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    language_code VARCHAR(8) NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS flashcards (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    term VARCHAR(255) NOT NULL,
+    definition VARCHAR(255) NOT NULL,
+    deck_id INT NOT NULL,
+    last_reviewed DATETIME NULL,
+    spaced_interval DOUBLE NULL,
+    ease DOUBLE NOT NULL DEFAULT 2.5,
+    step INT NOT NULL DEFAULT 0,
+    status VARCHAR(16) NOT NULL DEFAULT 'learning'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
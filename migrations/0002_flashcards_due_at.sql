@@ -0,0 +1,10 @@
+-- Due-card queue: due_at is the moment a card should next be shown and is kept
+-- current by grade(). The (deck_id, due_at) index lets /review read only the next
+-- few due cards of a deck instead of the whole deck.
+ALTER TABLE flashcards
+    ADD COLUMN due_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP;
+
+UPDATE flashcards
+SET due_at = COALESCE(last_reviewed + INTERVAL spaced_interval SECOND, NOW());
+
+CREATE INDEX idx_flashcards_deck_due ON flashcards (deck_id, due_at);
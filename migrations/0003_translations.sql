@@ -0,0 +1,8 @@
+-- Translation memo used by wiki_api.translate_words: each word is translated once per language pair.
+CREATE TABLE IF NOT EXISTS translations (
+    source_lang VARCHAR(8) NOT NULL,
+    target_lang VARCHAR(8) NOT NULL,
+    word VARCHAR(255) NOT NULL,
+    translation VARCHAR(255) NOT NULL,
+    PRIMARY KEY (source_lang, target_lang, word)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
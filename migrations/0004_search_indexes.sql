@@ -0,0 +1,14 @@
+-- Search: FULLTEXT indexes rank /search results by relevance instead of LIKE '%q%' scans.
+-- The utf8mb4_0900_ai_ci collation makes matching accent- and case-insensitive
+-- (e.g. "nino" finds "niño"). InnoDB keeps FULLTEXT indexes current on every
+-- insert/update/delete, so add/update/delete_flashcard need no extra work.
+-- idx_flashcards_term serves prefix lookups for queries shorter than 3 letters.
+ALTER TABLE flashcards
+    MODIFY term VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+    MODIFY definition VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL;
+ALTER TABLE decks
+    MODIFY name VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL;
+
+CREATE FULLTEXT INDEX ft_flashcards_term_definition ON flashcards (term, definition);
+CREATE FULLTEXT INDEX ft_decks_name ON decks (name);
+CREATE INDEX idx_flashcards_term ON flashcards (term);
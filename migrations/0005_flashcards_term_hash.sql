@@ -0,0 +1,6 @@
+-- Deck merge: duplicates are detected on a hash of the normalized (trimmed, lowercased) term,
+-- computed by MySQL so merges can deduplicate with INSERT ... SELECT alone.
+ALTER TABLE flashcards
+    ADD COLUMN term_hash BINARY(16) AS (UNHEX(MD5(LOWER(TRIM(term))))) STORED;
+
+CREATE INDEX idx_flashcards_deck_term_hash ON flashcards (deck_id, term_hash);
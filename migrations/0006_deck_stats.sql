@@ -0,0 +1,14 @@
+-- Materialized per-deck counters for the home page, kept current by the routes that change
+-- cards (deck_stats.py). stats_date is the day the due count was computed; older (or NULL)
+-- rows are recomputed on the next home page view, and `python deck_stats.py reconcile`
+-- repairs any drift.
+CREATE TABLE IF NOT EXISTS deck_stats (
+    deck_id INT NOT NULL PRIMARY KEY,
+    card_count INT NOT NULL DEFAULT 0,
+    new_count INT NOT NULL DEFAULT 0,
+    learning_count INT NOT NULL DEFAULT 0,
+    review_count INT NOT NULL DEFAULT 0,
+    due_today_count INT NOT NULL DEFAULT 0,
+    ease_sum DOUBLE NOT NULL DEFAULT 0,
+    stats_date DATE NULL
+) ENGINE=InnoDB;
@@ -0,0 +1,14 @@
+-- login() looks users up by username: make it unique and indexed. This needs the existing
+-- usernames to be unique already; migrate.py checks for duplicates before starting and
+-- lists them instead of failing half way.
+CREATE UNIQUE INDEX idx_users_username ON users (username);
+
+-- Deleting a deck removes its cards and stats in the same statement. Cards or stats
+-- left behind by earlier deletes would block the foreign keys, so clear them first.
+DELETE FROM flashcards WHERE deck_id NOT IN (SELECT id FROM decks);
+DELETE FROM deck_stats WHERE deck_id NOT IN (SELECT id FROM decks);
+
+ALTER TABLE flashcards
+    ADD CONSTRAINT fk_flashcards_deck FOREIGN KEY (deck_id) REFERENCES decks (id) ON DELETE CASCADE;
+ALTER TABLE deck_stats
+    ADD CONSTRAINT fk_deck_stats_deck FOREIGN KEY (deck_id) REFERENCES decks (id) ON DELETE CASCADE;
@@ -0,0 +1,15 @@
+-- Decks and cards belong to a user. flashcards.user_id is a copy of the deck owner's id so
+-- review, search and forecast queries filter on an index prefix instead of joining decks.
+ALTER TABLE decks ADD COLUMN user_id INT NULL;
+ALTER TABLE flashcards ADD COLUMN user_id INT NULL;
+
+-- Decks created before they had owners go to the first account
+UPDATE decks SET user_id = (SELECT MIN(id) FROM users) WHERE user_id IS NULL;
+UPDATE flashcards JOIN decks ON decks.id = flashcards.deck_id SET flashcards.user_id = decks.user_id;
+
+-- Home page (user's decks by name), review queue (user's due cards in a deck, or in all
+-- their decks for the forecast) and short search prefixes, all within one user's rows
+CREATE INDEX idx_decks_user_name ON decks (user_id, name);
+CREATE INDEX idx_flashcards_user_deck_due ON flashcards (user_id, deck_id, due_at);
+CREATE INDEX idx_flashcards_user_term ON flashcards (user_id, term);
+DROP INDEX idx_flashcards_term ON flashcards;
@@ -0,0 +1,23 @@
+-- Append-only history of every answer (review_log.py). Rows are never updated; event_id
+-- comes from the app so replaying a spool file after a crash can't insert a review twice.
+CREATE TABLE IF NOT EXISTS review_log (
+    id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    event_id CHAR(32) NOT NULL,
+    card_id INT NOT NULL,
+    deck_id INT NOT NULL,
+    user_id INT NOT NULL,
+    grade VARCHAR(8) NOT NULL,
+    reviewed_at DATETIME(6) NOT NULL,
+    prev_status VARCHAR(16) NOT NULL,
+    prev_interval DOUBLE NULL,
+    prev_ease DOUBLE NOT NULL,
+    prev_step INT NOT NULL,
+    next_status VARCHAR(16) NOT NULL,
+    next_interval DOUBLE NULL,
+    next_ease DOUBLE NOT NULL,
+    next_step INT NOT NULL,
+    next_due_at DATETIME NOT NULL,
+    UNIQUE KEY idx_review_log_event (event_id),
+    KEY idx_review_log_user_time (user_id, reviewed_at),
+    KEY idx_review_log_card_time (card_id, reviewed_at)
+) ENGINE=InnoDB;
@@ -0,0 +1,7 @@
+-- decks.version is bumped by every route that adds, edits or removes a deck's cards.
+-- The deck page uses it as its ETag and as the key of its rendered-page cache.
+ALTER TABLE decks ADD COLUMN version INT NOT NULL DEFAULT 0;
+
+-- Deck pages are read in id order (WHERE deck_id = ? AND id > ? ORDER BY id); a
+-- secondary index on deck_id alone is (deck_id, id) in InnoDB.
+CREATE INDEX idx_flashcards_deck_id ON flashcards (deck_id);
@@ -0,0 +1,4 @@
+-- The Wikipedia article a deck was built from, so the deck can be refreshed from it later.
+-- NULL for hand-made and multi-article decks; single-article decks created before this
+-- column existed are named after their article, and the refresh falls back to the name.
+ALTER TABLE decks ADD COLUMN source_title VARCHAR(255) NULL;
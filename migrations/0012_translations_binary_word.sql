@@ -0,0 +1,6 @@
+-- Compare translated words exactly: under the default accent- and case-insensitive collation
+-- año/ano or más/mas shared one primary key, so one word's lookup returned the other's row
+-- and re-translating it overwrote that translation. The memo may already hold such
+-- overwritten rows and can't tell which, so it is emptied; words are translated again on use.
+DELETE FROM translations;
+ALTER TABLE translations MODIFY word VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL;
@@ -0,0 +1,13 @@
+-- Search within one user's cards. A FULLTEXT index can't start with user_id, so MATCH used to
+-- collect every user's matching cards and the user_id filter dropped the others afterwards,
+-- one row lookup each. Each card now carries its owner as a word (search.owner_token),
+-- indexed with the text; /search requires that word, so InnoDB intersects the posting lists
+-- and only the user's own matches reach the rows. Adding the stored column rebuilds
+-- flashcards: run this at a quiet time on a large table. The columns of a FULLTEXT index
+-- share one collation, hence the one from 0004 on the token.
+ALTER TABLE flashcards
+    ADD COLUMN owner_token VARCHAR(32) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci
+        AS (CONCAT('zqxu', user_id)) STORED;
+
+CREATE FULLTEXT INDEX ft_flashcards_owner_term_definition ON flashcards (owner_token, term, definition);
+DROP INDEX ft_flashcards_term_definition ON flashcards;
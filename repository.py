@@ -0,0 +1,507 @@
+from abc import ABC, abstractmethod
+
+import deck_stats
+import metrics
+from deck_io import IMPORT_CHUNK_SIZE
+from review_log import APPLY_STATE, INSERT_EVENT, retention_by_day
+from search import search_decks, search_flashcards
+
+# Which copy of a duplicated term survives a merge, as a window ORDER BY over the candidates
+MERGE_POLICIES = {
+    'newest': "last_reviewed IS NULL, last_reviewed DESC, id",
+    'highest_ease': "ease DESC, id",
+    'reset': "id"
+}
+
+
+class Repository(ABC):
+    """Data access for users, decks, cards and reviews over one database connection.
+
+    Routes and jobs call these methods instead of writing SQL, so the same code runs
+    on MySQL (MySQLRepository, one pool per shard) or on an embedded SQLite file
+    (sqlite_repository.SQLiteRepository). A repository wraps one connection checked
+    out for a request or job: writes stay in its transaction until commit(), and
+    close() gives the connection back to its pool.
+
+    Subclasses implement the single statements (the abstract methods; a backend missing
+    one can't be instantiated); the operations built from several of them are written
+    once, here.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        self.connection.close()
+
+    # ---- Users (directory shard) ----
+
+    @abstractmethod
+    def create_user(self, username, email, password_hash):
+        raise NotImplementedError
+
+    @abstractmethod
+    def user_by_username(self, username):
+        raise NotImplementedError
+
+    # ---- Decks ----
+
+    @abstractmethod
+    def deck_list(self, user_id):
+        """The user's decks by name with their deck_stats counters (home page)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def owned_deck(self, deck_id, user_id):
+        """id, name, language_code, version and source_title of the deck, or None if it isn't the user's."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def lock_deck(self, deck_id, user_id):
+        """owned_deck(), holding the deck's write lock until commit or rollback."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def owns_decks(self, user_id, deck_ids):
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_deck(self, user_id, name, language_code=None, source_title=None):
+        """Inserts a deck with an empty, current deck_stats row and returns its id."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_deck(self, deck_id, user_id):
+        # Cards and deck_stats go with it (ON DELETE CASCADE)
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_deck_source(self, deck_id, source_title, language_code):
+        raise NotImplementedError
+
+    @abstractmethod
+    def bump_deck_version(self, deck_id):
+        # Every change to a deck's cards bumps its version: new ETag, new page cache key
+        raise NotImplementedError
+
+    @abstractmethod
+    def merge_decks(self, user_id, deck_ids, name, policy='newest'):
+        """Copies one card per normalized term of deck_ids into a new deck; returns (deck_id, card_count)."""
+        raise NotImplementedError
+
+    # ---- deck_stats ----
+
+    @abstractmethod
+    def refresh_deck_stats(self, deck_ids):
+        raise NotImplementedError
+
+    @abstractmethod
+    def refresh_stale_deck_stats(self, user_id):
+        """Recomputes the user's decks whose stats are from an earlier day; returns their ids."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def apply_stats_delta(self, deck_id, delta):
+        raise NotImplementedError
+
+    # ---- Cards ----
+
+    @abstractmethod
+    def deck_page(self, deck_id, after, limit):
+        """id, term and definition of up to `limit` cards with id > after, in id order."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def card(self, card_id, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def cards(self, user_id, card_ids):
+        raise NotImplementedError
+
+    @abstractmethod
+    def card_text(self, card_id, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_card(self, user_id, deck_id, term, definition):
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_cards(self, user_id, deck_id, pairs):
+        """Inserts (term, definition) pairs as new cards in one batch."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_card(self, card_id, term, definition):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_card(self, card_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def deck_terms(self, user_id, deck_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def due_card_ids(self, user_id, deck_id, limit):
+        raise NotImplementedError
+
+    @abstractmethod
+    def due_cards(self, user_id, deck_id, limit):
+        raise NotImplementedError
+
+    @abstractmethod
+    def forecast_rows(self, user_id, deck_id=None):
+        """(status code, interval seconds or -1, ease, step, seconds until due) tuples for the forecast."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def search_flashcards(self, user_id, query, limit, after=None):
+        """One page of matching cards by relevance; returns (rows, next_cursor)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def search_decks(self, user_id, query, limit):
+        raise NotImplementedError
+
+    # ---- Review history ----
+
+    @abstractmethod
+    def insert_review_events(self, events):
+        """Appends events to review_log, skipping any whose event_id is already there."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def apply_card_states(self, events):
+        """Stores each event's resulting state on its card unless the card has a newer review."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def retention_by_day(self, user_id, days):
+        raise NotImplementedError
+
+    # ---- Built from the statements above ----
+
+    def delete_owned_card(self, card_id, user_id, overlay=None):
+        """Deletes a card and takes it out of its deck's counters; returns its deck id, or None.
+
+        overlay(row) returns the row as of its newest answer, for callers whose answers
+        reach the database later (the review log adds them to deck_stats when it does).
+        """
+        row = self.card(card_id, user_id)
+        if overlay is not None:
+            row = overlay(row)
+        if row is None:
+            return None
+        self.delete_card(card_id)
+        self.apply_stats_delta(row['deck_id'], deck_stats.scale_counts(deck_stats.row_counts(row), -1))
+        self.bump_deck_version(row['deck_id'])
+        return row['deck_id']
+
+    def import_cards(self, user_id, deck_id, pairs, chunk_size=IMPORT_CHUNK_SIZE):
+        """Inserts (term, definition) pairs chunk by chunk; memory stays at one chunk.
+
+        If reading fails part way (a bad row, undecodable text), the pairs read before it are
+        still inserted and the error is raised.
+        """
+        count = 0
+        batch = []
+        try:
+            for pair in pairs:
+                batch.append(pair)
+                if len(batch) >= chunk_size:
+                    self.insert_cards(user_id, deck_id, batch)
+                    self.commit()
+                    count += len(batch)
+                    batch = []
+        except (ValueError, UnicodeDecodeError):
+            if batch:
+                self.insert_cards(user_id, deck_id, batch)
+                self.commit()
+            raise
+        if batch:
+            self.insert_cards(user_id, deck_id, batch)
+            self.commit()
+            count += len(batch)
+        return count
+
+    def iter_deck_pages(self, deck_id, page_size):
+        """Every card of a deck as deck_page() lists, for streaming exports."""
+        after = 0
+        while True:
+            rows = self.deck_page(deck_id, after, page_size)
+            yield rows
+            if len(rows) < page_size:
+                return
+            after = rows[-1]['id']
+
+    def apply_review_events(self, events):
+        """Writes a batch of review events: history rows, the newest state of each card, and deck_stats.
+
+        If any event may already have been written, the decks' counters are recomputed
+        instead of adjusted, since applying the same delta twice would drift them.
+        """
+        latest = {}
+        for event in sorted(events, key=lambda event: event.reviewed_at):
+            latest[event.card_id] = event
+
+        self.insert_review_events(events)
+        self.apply_card_states(list(latest.values()))
+
+        if any(event.retried for event in events):
+            self.refresh_deck_stats(sorted({event.deck_id for event in events}))
+            return
+        deltas = {}
+        for event in events:
+            total = deltas.setdefault(event.deck_id, dict.fromkeys(deck_stats.COUNTERS, 0))
+            for name, value in event.stats_delta().items():
+                total[name] += value
+        for deck_id, delta in deltas.items():
+            self.apply_stats_delta(deck_id, delta)
+
+
+class MySQLRepository(Repository):
+    """The MySQL schema built by migrations/ (FULLTEXT search, term_hash merges)."""
+
+    def create_user(self, username, email, password_hash):
+        cursor = self.connection.cursor()
+        cursor.execute("INSERT INTO users (username, email, password_hash) VALUES (%s, %s, %s)",
+                       (username, email, password_hash))
+        return cursor.lastrowid
+
+    def user_by_username(self, username):
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
+        return cursor.fetchone()
+
+    def deck_list(self, user_id):
+        cursor = self.connection.cursor()
+        cursor.execute("""
+            SELECT decks.id, decks.name,
+                   COALESCE(deck_stats.card_count, 0) AS flashcard_count,
+                   COALESCE(deck_stats.due_today_count, 0) AS due_count,
+                   deck_stats.new_count, deck_stats.learning_count, deck_stats.review_count,
+                   deck_stats.ease_sum / NULLIF(deck_stats.card_count, 0) AS avg_ease
+            FROM decks
+            LEFT JOIN deck_stats ON deck_stats.deck_id = decks.id
+            WHERE decks.user_id = %s
+            ORDER BY decks.name
+        """, (user_id,))
+        return cursor.fetchall()
+
+    def owned_deck(self, deck_id, user_id):
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT id, name, language_code, version, source_title FROM decks WHERE id = %s AND user_id = %s",
+                       (deck_id, user_id))
+        return cursor.fetchone()
+
+    def lock_deck(self, deck_id, user_id):
+        cursor = self.connection.cursor()
+        cursor.execute("""
+            SELECT id, name, language_code, version, source_title FROM decks
+            WHERE id = %s AND user_id = %s FOR UPDATE
+        """, (deck_id, user_id))
+        return cursor.fetchone()
+
+    def owns_decks(self, user_id, deck_ids):
+        cursor = self.connection.cursor()
+        placeholders = ', '.join(['%s'] * len(deck_ids))
+        cursor.execute(f"SELECT COUNT(*) AS owned FROM decks WHERE user_id = %s AND id IN ({placeholders})",
+                       (user_id, *deck_ids))
+        return cursor.fetchone()['owned'] == len(set(deck_ids))
+
+    def create_deck(self, user_id, name, language_code=None, source_title=None):
+        cursor = self.connection.cursor()
+        cursor.execute("INSERT INTO decks (name, language_code, user_id, source_title) VALUES (%s, %s, %s, %s)",
+                       (name, language_code, user_id, source_title))
+        deck_id = cursor.lastrowid
+        cursor.execute("INSERT INTO deck_stats (deck_id, stats_date) VALUES (%s, CURDATE())", (deck_id,))
+        return deck_id
+
+    def delete_deck(self, deck_id, user_id):
+        cursor = self.connection.cursor()
+        cursor.execute("DELETE FROM decks WHERE id = %s AND user_id = %s", (deck_id, user_id))
+        return cursor.rowcount > 0
+
+    def set_deck_source(self, deck_id, source_title, language_code):
+        cursor = self.connection.cursor()
+        cursor.execute("UPDATE decks SET source_title = %s, language_code = %s WHERE id = %s",
+                       (source_title, language_code, deck_id))
+
+    def bump_deck_version(self, deck_id):
+        cursor = self.connection.cursor()
+        cursor.execute("UPDATE decks SET version = version + 1 WHERE id = %s", (deck_id,))
+
+    # The whole merge runs inside MySQL as INSERT ... SELECT: no card rows pass through the app
+    def merge_decks(self, user_id, deck_ids, name, policy='newest'):
+        cursor = self.connection.cursor()
+        order_by = MERGE_POLICIES[policy]
+        placeholders = ', '.join(['%s'] * len(deck_ids))
+
+        # New deck takes the language of the first source deck
+        cursor.execute(
+            "INSERT INTO decks (name, language_code, user_id) SELECT %s, language_code, user_id FROM decks WHERE id = %s",
+            (name, deck_ids[0])
+        )
+        cursor.execute("SELECT LAST_INSERT_ID() AS id")
+        new_deck_id = cursor.fetchone()['id']
+
+        if policy == 'reset':
+            columns = "term, definition, deck_id, user_id"
+            selected = "term, definition, %s, user_id"
+        else:
+            columns = "term, definition, deck_id, user_id, last_reviewed, spaced_interval, ease, step, status, due_at"
+            selected = "term, definition, %s, user_id, last_reviewed, spaced_interval, ease, step, status, due_at"
+
+        # One row per normalized term (term_hash), picked by the policy's ordering
+        cursor.execute(f"""
+            INSERT INTO flashcards ({columns})
+            SELECT {selected}
+            FROM (
+                SELECT flashcards.*,
+                       ROW_NUMBER() OVER (PARTITION BY term_hash ORDER BY {order_by}) AS copy_rank
+                FROM flashcards
+                WHERE user_id = %s AND deck_id IN ({placeholders})
+            ) candidates
+            WHERE copy_rank = 1
+        """, (new_deck_id, user_id, *deck_ids))
+
+        return new_deck_id, cursor.rowcount
+
+    def refresh_deck_stats(self, deck_ids):
+        deck_stats.refresh_decks(self.connection.cursor(), deck_ids)
+
+    def refresh_stale_deck_stats(self, user_id):
+        return deck_stats.refresh_stale(self.connection.cursor(), user_id)
+
+    def apply_stats_delta(self, deck_id, delta):
+        deck_stats.apply_delta(self.connection.cursor(), deck_id, delta)
+
+    def deck_page(self, deck_id, after, limit):
+        cursor = self.connection.cursor()
+        cursor.execute("""
+            SELECT id, term, definition FROM flashcards
+            WHERE deck_id = %s AND id > %s
+            ORDER BY id
+            LIMIT %s
+        """, (deck_id, after, limit))
+        return cursor.fetchall()
+
+    def card(self, card_id, user_id):
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT * FROM flashcards WHERE id = %s AND user_id = %s", (card_id, user_id))
+        return cursor.fetchone()
+
+    def cards(self, user_id, card_ids):
+        if not card_ids:
+            return []
+        cursor = self.connection.cursor()
+        placeholders = ', '.join(['%s'] * len(card_ids))
+        cursor.execute(f"SELECT * FROM flashcards WHERE user_id = %s AND id IN ({placeholders})",
+                       (user_id, *card_ids))
+        return cursor.fetchall()
+
+    def card_text(self, card_id, user_id):
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT id, term, definition FROM flashcards WHERE id = %s AND user_id = %s",
+                       (card_id, user_id))
+        return cursor.fetchone()
+
+    def add_card(self, user_id, deck_id, term, definition):
+        cursor = self.connection.cursor()
+        cursor.execute("""
+            INSERT INTO flashcards (term, definition, deck_id, user_id)
+            VALUES (%s, %s, %s, %s)
+        """, (term, definition, deck_id, user_id))
+        return cursor.lastrowid
+
+    # pymysql sends executemany() of an INSERT ... VALUES as one multi-row INSERT (split only
+    # past max_allowed_packet), so a 1000-word deck is one round trip
+    def insert_cards(self, user_id, deck_id, pairs):
+        cursor = self.connection.cursor()
+        cursor.executemany(
+            "INSERT INTO flashcards (term, definition, deck_id, user_id) VALUES (%s, %s, %s, %s)",
+            [(term, definition, deck_id, user_id) for term, definition in pairs]
+        )
+
+    def update_card(self, card_id, term, definition):
+        cursor = self.connection.cursor()
+        cursor.execute("""
+            UPDATE flashcards
+            SET term = %s, definition = %s
+            WHERE id = %s
+        """, (term, definition, card_id))
+
+    def delete_card(self, card_id):
+        cursor = self.connection.cursor()
+        cursor.execute("DELETE FROM flashcards WHERE id = %s", (card_id,))
+
+    # Compared case-insensitively, like the words process_text returns
+    def deck_terms(self, user_id, deck_id):
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT term FROM flashcards WHERE user_id = %s AND deck_id = %s", (user_id, deck_id))
+        return {row['term'].casefold() for row in cursor.fetchall()}
+
+    # Served by the (user_id, deck_id, due_at) index: only the next `limit` due cards are read
+    def due_card_ids(self, user_id, deck_id, limit):
+        cursor = self.connection.cursor()
+        cursor.execute("""
+            SELECT id FROM flashcards
+            WHERE user_id = %s AND deck_id = %s AND due_at <= NOW()
+            ORDER BY due_at
+            LIMIT %s
+        """, (user_id, deck_id, limit))
+        return [row['id'] for row in cursor.fetchall()]
+
+    def due_cards(self, user_id, deck_id, limit):
+        cursor = self.connection.cursor()
+        cursor.execute("""
+            SELECT * FROM flashcards
+            WHERE user_id = %s AND deck_id = %s AND due_at <= NOW()
+            ORDER BY due_at
+            LIMIT %s
+        """, (user_id, deck_id, limit))
+        return cursor.fetchall()
+
+    # Tuple cursor and numeric columns only, so a million rows go straight into one array
+    def forecast_rows(self, user_id, deck_id=None):
+        query = """
+            SELECT CASE status WHEN 'learning' THEN 0 WHEN 'reviewing' THEN 1 WHEN 'relearning' THEN 2 ELSE -1 END,
+                   IFNULL(spaced_interval, -1), IFNULL(ease, 2.5), IFNULL(step, 0),
+                   TIMESTAMPDIFF(SECOND, NOW(), due_at)
+            FROM flashcards
+            WHERE user_id = %s
+        """
+        params = (user_id,)
+        if deck_id is not None:
+            query += " AND deck_id = %s"
+            params += (deck_id,)
+        cursor = self.connection.cursor(metrics.InstrumentedTupleCursor)
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+    def search_flashcards(self, user_id, query, limit, after=None):
+        return search_flashcards(self.connection.cursor(), user_id, query, limit, after)
+
+    def search_decks(self, user_id, query, limit):
+        return search_decks(self.connection.cursor(), user_id, query, limit)
+
+    def insert_review_events(self, events):
+        cursor = self.connection.cursor()
+        cursor.executemany(INSERT_EVENT, [event.insert_params() for event in events])
+
+    def apply_card_states(self, events):
+        cursor = self.connection.cursor()
+        cursor.executemany(APPLY_STATE, [event.state_params() for event in events])
+
+    def retention_by_day(self, user_id, days):
+        return retention_by_day(self.connection.cursor(), user_id, days)
+
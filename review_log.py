@@ -0,0 +1,455 @@
+import argparse
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+import deck_stats
+from spaced_repetition import GRADES, STATUS_CODES, STATUS_NAMES, interval_us, next_state
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+INSERT_EVENT = """
+    INSERT IGNORE INTO review_log (event_id, card_id, deck_id, user_id, grade, reviewed_at,
+                                   prev_status, prev_interval, prev_ease, prev_step,
+                                   next_status, next_interval, next_ease, next_step, next_due_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+# The last_reviewed guard keeps an old event (e.g. replayed from a spool) from rolling a card back
+APPLY_STATE = """
+    UPDATE flashcards
+    SET spaced_interval = %s, ease = %s, step = %s, status = %s, last_reviewed = %s, due_at = %s
+    WHERE id = %s AND (last_reviewed IS NULL OR last_reviewed <= %s)
+"""
+
+
+def parse_time(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+class ReviewEvent:
+    """One answer: the card's state before and after it was graded."""
+
+    FIELDS = ('event_id', 'card_id', 'deck_id', 'user_id', 'grade', 'reviewed_at',
+              'prev_status', 'prev_interval', 'prev_ease', 'prev_step', 'prev_last_reviewed', 'prev_due_at',
+              'next_status', 'next_interval', 'next_ease', 'next_step', 'next_due_at')
+    TIMES = ('reviewed_at', 'prev_last_reviewed', 'prev_due_at', 'next_due_at')
+
+    def __init__(self, **fields):
+        for name in self.FIELDS:
+            setattr(self, name, fields.get(name))
+        # Set when a write may already have reached the database (failed flush, crash recovery)
+        self.retried = False
+
+    @classmethod
+    def from_grade(cls, row, card, grade):
+        """row is the flashcards row before grading, card the graded NewCard."""
+        return cls(
+            event_id=uuid.uuid4().hex,
+            card_id=int(card.id),
+            deck_id=row['deck_id'],
+            user_id=row['user_id'],
+            grade=grade,
+            reviewed_at=card.last_reviewed,
+            prev_status=row['status'],
+            prev_interval=row['spaced_interval'],
+            prev_ease=row['ease'],
+            prev_step=row['step'],
+            prev_last_reviewed=row['last_reviewed'],
+            prev_due_at=row['due_at'],
+            next_status=card.status,
+            next_interval=card.interval.total_seconds() if card.interval else None,
+            next_ease=card.ease,
+            next_step=card.step,
+            next_due_at=card.due_at
+        )
+
+    def apply_to(self, row):
+        """Copy of a flashcards row with this event's resulting state."""
+        row = dict(row)
+        row.update(
+            spaced_interval=self.next_interval, ease=self.next_ease, step=self.next_step,
+            status=self.next_status, last_reviewed=self.reviewed_at, due_at=self.next_due_at
+        )
+        return row
+
+    def stats_delta(self):
+        before = deck_stats.card_counts(self.prev_last_reviewed, self.prev_status, self.prev_ease, self.prev_due_at)
+        after = deck_stats.card_counts(self.reviewed_at, self.next_status, self.next_ease, self.next_due_at)
+        return deck_stats.diff_counts(before, after)
+
+    def insert_params(self):
+        return (self.event_id, self.card_id, self.deck_id, self.user_id, self.grade, self.reviewed_at,
+                self.prev_status, self.prev_interval, self.prev_ease, self.prev_step,
+                self.next_status, self.next_interval, self.next_ease, self.next_step,
+                self.next_due_at.strftime(TIME_FORMAT))
+
+    def state_params(self):
+        reviewed_at = self.reviewed_at.strftime(TIME_FORMAT)
+        return (self.next_interval, self.next_ease, self.next_step, self.next_status,
+                reviewed_at, self.next_due_at.strftime(TIME_FORMAT), self.card_id, reviewed_at)
+
+    def to_json(self):
+        data = {name: getattr(self, name) for name in self.FIELDS}
+        for name in self.TIMES:
+            if data[name] is not None:
+                data[name] = data[name].isoformat()
+        return json.dumps(data)
+
+    @classmethod
+    def from_json(cls, line):
+        data = json.loads(line)
+        for name in cls.TIMES:
+            data[name] = parse_time(data[name])
+        return cls(**data)
+
+
+def write_events(pool_for, events, repository_class):
+    """Writes a batch with Repository.apply_review_events, one transaction per shard."""
+    groups = {}
+    for event in events:
+        pool = pool_for(event.user_id)
+        groups.setdefault(id(pool), (pool, []))[1].append(event)
+
+    for pool, group in groups.values():
+        repository = repository_class(pool.acquire())
+        try:
+            repository.apply_review_events(group)
+            repository.commit()
+        finally:
+            repository.close()
+
+
+class ReviewLogWriter:
+    """Write-behind buffer for review events.
+
+    append() makes an event durable in a local spool file and returns; a background
+    thread writes buffered events to the database (through repository_class, see
+    repository.py) every `flush_interval` seconds or as soon
+    as `batch_size` are waiting. Each flush renames the spool to a batch file and
+    deletes it after the commit, so a crash leaves every unwritten event on disk.
+
+    Every writer owns the files in `spool_dir` that start with its owner id and holds
+    a flock on its `<owner>.lock` file. On start, files whose lock is free belong to a
+    process that died; their events are taken over and written again (event_id is
+    unique in review_log, so nothing is logged twice).
+    """
+
+    def __init__(self, pool_for, spool_dir, repository_class, batch_size=200, flush_interval=1.0, fsync=True):
+        self.pool_for = pool_for
+        self.repository_class = repository_class
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        # Spool files are named after this instance, not just the pid, since pids get reused
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        # _lock guards the in-memory state only and is never held during file I/O, so
+        # overlay() and not_due() don't wait on an fsync. _spool_lock orders spool writes
+        # and rotation; when both are needed it is taken first.
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._spool_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer = []
+        self._latest = {}  # card_id -> newest event not yet in MySQL
+        self._unwritten_files = []  # batch files whose events failed to write
+        self._seq = 0
+        self._closed = False
+
+        # Counters exposed through stats()
+        self.appended = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+
+        os.makedirs(spool_dir, exist_ok=True)
+        recovered, claimed_files = self._take_over_dead_spools()
+        self._lock_file = open(self._path('lock'), 'w')
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        self._spool = open(self._path('spool'), 'a', encoding='utf-8')
+        # The recovered events are in our own spool before the dead process's files go
+        self._append_to_spool(recovered)
+        for event in recovered:
+            event.retried = True
+            self._remember(event)
+        self._delete_files(claimed_files)
+
+        self._thread = threading.Thread(target=self._run, name='review-log', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _path(self, suffix):
+        return os.path.join(self.spool_dir, f"{self.owner}.{suffix}")
+
+    def _take_over_dead_spools(self):
+        events = {}
+        claimed_files = []
+        for name in sorted(os.listdir(self.spool_dir)):
+            if not name.endswith('.lock'):
+                continue
+            owner = name[:-len('.lock')]
+            lock_path = os.path.join(self.spool_dir, name)
+            with open(lock_path, 'a') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # owner is alive
+
+                for other in sorted(os.listdir(self.spool_dir)):
+                    if other.startswith(owner + '.') and other != name:
+                        path = os.path.join(self.spool_dir, other)
+                        with open(path, encoding='utf-8') as file:
+                            for line in file:
+                                # A torn last line was never acknowledged
+                                try:
+                                    event = ReviewEvent.from_json(line)
+                                except ValueError:
+                                    continue
+                                events[event.event_id] = event
+                        claimed_files.append(path)
+                claimed_files.append(lock_path)
+        if events:
+            print(f"Review log: recovered {len(events)} unwritten reviews from {self.spool_dir}")
+        return sorted(events.values(), key=lambda event: event.reviewed_at), claimed_files
+
+    def _append_to_spool(self, events):
+        if not events:
+            return
+        self._spool.write(''.join(event.to_json() + '\n' for event in events))
+        self._spool.flush()
+        if self.fsync:
+            os.fsync(self._spool.fileno())
+
+    def _remember(self, event):
+        self._buffer.append(event)
+        self._latest[event.card_id] = event
+
+    @staticmethod
+    def _delete_files(paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def append(self, event):
+        """Records an event; once this returns the review survives a crash."""
+        self.extend([event])
+
+    def extend(self, events):
+        # One spool write and fsync for the whole list. The events join the buffer while
+        # _spool_lock is still held, so a flush never takes a spool file without them.
+        with self._spool_lock:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("Review log is closed")
+            self._append_to_spool(events)
+            with self._lock:
+                for event in events:
+                    self._remember(event)
+                self.appended += len(events)
+                if len(self._buffer) >= self.batch_size:
+                    self._wake.notify()
+
+    def overlay(self, row):
+        """The row with the newest not-yet-written review applied, so grading sees current state."""
+        if row is None:
+            return None
+        with self._lock:
+            event = self._latest.get(row['id'])
+        return event.apply_to(row) if event is not None else row
+
+    def not_due(self, card_ids, now=None):
+        """Ids whose buffered answer moved them past `now`, though MySQL still shows them due."""
+        now = now or datetime.now()
+        with self._lock:
+            return {card_id for card_id in card_ids
+                    if card_id in self._latest and self._latest[card_id].next_due_at > now}
+
+    def flush(self):
+        """Writes everything buffered so far; returns the number of events written."""
+        with self._flush_lock:
+            with self._spool_lock:
+                with self._lock:
+                    if not self._buffer:
+                        return 0
+                    events, self._buffer = self._buffer, []
+                # The events being written get a file of their own; new appends go to a fresh spool
+                self._spool.close()
+                self._seq += 1
+                batch_path = self._path(f"{self._seq}.batch")
+                os.replace(self._path('spool'), batch_path)
+                self._spool = open(self._path('spool'), 'a', encoding='utf-8')
+
+            try:
+                write_events(self.pool_for, events, self.repository_class)
+            except Exception:
+                with self._lock:
+                    for event in events:
+                        event.retried = True
+                    self._buffer[:0] = events
+                    self._unwritten_files.append(batch_path)
+                    self.failures += 1
+                raise
+
+            with self._lock:
+                self._delete_files([batch_path] + self._unwritten_files)
+                self._unwritten_files = []
+                for event in events:
+                    if self._latest.get(event.card_id) is event:
+                        del self._latest[event.card_id]
+                self.flushed += len(events)
+                self.flushes += 1
+            return len(events)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._wake.wait_for(lambda: self._closed or len(self._buffer) >= self.batch_size,
+                                    timeout=self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Review log flush failed, will retry: {e}")
+                time.sleep(self.flush_interval)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wake.notify()
+        self._thread.join()
+        try:
+            self.flush()
+        except Exception as e:
+            # Still in the spool; the next process to start takes it over
+            print(f"Review log: final flush failed, {len(self._buffer)} reviews left in {self.spool_dir}: {e}")
+        with self._spool_lock:
+            self._spool.close()
+        self._lock_file.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "buffered": len(self._buffer),
+                "appended": self.appended,
+                "flushed": self.flushed,
+                "flushes": self.flushes,
+                "failures": self.failures,
+            }
+
+
+# ---- Analytics over the history ----
+
+def retention_by_day(cursor, user_id, days=30):
+    """Share of mature-card reviews (status 'reviewing' before the answer) not graded 'again', per day."""
+    cursor.execute("""
+        SELECT DATE(reviewed_at) AS day, COUNT(*) AS reviews, AVG(grade <> 'again') AS retention
+        FROM review_log
+        WHERE user_id = %s AND reviewed_at >= CURDATE() - INTERVAL %s DAY AND prev_status = 'reviewing'
+        GROUP BY DATE(reviewed_at)
+        ORDER BY day
+    """, (user_id, days))
+    return cursor.fetchall()
+
+
+def replay(events):
+    """Re-runs the scheduler over a history and returns {card_id: (status, interval_seconds, ease, step)}.
+
+    events are rows ordered by (card_id, reviewed_at). Each card starts from the state
+    before its first logged review; round k grades every card's k-th review in one
+    vectorized next_state() call, so a long history costs max(reviews per card) passes.
+    """
+    histories = {}
+    for event in events:
+        histories.setdefault(event['card_id'], []).append(event)
+    if not histories:
+        return {}
+
+    card_ids = np.array(list(histories))
+    firsts = [history[0] for history in histories.values()]
+    status = np.array([STATUS_CODES.get(event['prev_status'], -1) for event in firsts], dtype=np.int8)
+    interval = interval_us([np.nan if event['prev_interval'] is None else event['prev_interval'] for event in firsts])
+    ease = np.array([event['prev_ease'] for event in firsts], dtype=np.float64)
+    step = np.array([event['prev_step'] for event in firsts], dtype=np.int64)
+
+    lengths = np.array([len(history) for history in histories.values()])
+    for k in range(lengths.max()):
+        active = np.flatnonzero(lengths > k)
+        grades = [GRADES.index(histories[card_ids[i]][k]['grade']) for i in active]
+        new_status, new_interval, new_ease, new_step = next_state(
+            status[active], interval[active], ease[active], step[active], grades)
+        status[active], interval[active], ease[active], step[active] = new_status, new_interval, new_ease, new_step
+
+    return {
+        int(card_id): (STATUS_NAMES.get(int(status[i])), None if interval[i] < 0 else interval[i] / 1e6,
+                       float(ease[i]), int(step[i]))
+        for i, card_id in enumerate(card_ids)
+    }
+
+
+def same_value(a, b):
+    if isinstance(a, float) and isinstance(b, float):
+        return abs(a - b) < 1e-3
+    return a == b
+
+
+# python review_log.py retention 1 --days 30 | replay 1
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Review history analytics.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    retention = commands.add_parser('retention', help="daily retention of mature cards")
+    retention.add_argument('user_id', type=int)
+    retention.add_argument('--days', type=int, default=30)
+    replay_parser = commands.add_parser('replay', help="re-run the scheduler over the history and compare")
+    replay_parser.add_argument('user_id', type=int)
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from deck_io import connect
+    from shard_router import shard_databases, shard_index
+    load_dotenv()
+    databases = shard_databases()
+    host, db = databases[shard_index(args.user_id, len(databases))]
+    connection = connect(host=host, db=db)
+    try:
+        cursor = connection.cursor()
+        if args.command == 'retention':
+            for row in retention_by_day(cursor, args.user_id, args.days):
+                print(f"{row['day']}  {row['reviews']:6d} reviews  {float(row['retention']):.1%}")
+        else:
+            cursor.execute("""
+                SELECT card_id, grade, prev_status, prev_interval, prev_ease, prev_step
+                FROM review_log WHERE user_id = %s ORDER BY card_id, reviewed_at, id
+            """, (args.user_id,))
+            states = replay(cursor.fetchall())
+            cursor.execute("SELECT id, status, spaced_interval, ease, step FROM flashcards WHERE user_id = %s",
+                           (args.user_id,))
+            differ = 0
+            for row in cursor.fetchall():
+                state = states.get(row['id'])
+                if state is None:
+                    continue
+                stored = (row['status'], row['spaced_interval'], row['ease'], row['step'])
+                if any(not same_value(a, b) for a, b in zip(state, stored)):
+                    differ += 1
+                    print(f"card {row['id']}: stored {stored}, replayed {state}")
+            print(f"Replayed {len(states)} cards, {differ} differ from flashcards")
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class ReviewSession:
+    """Queue of card ids for one review run plus the position of the card being shown."""
+
+    def __init__(self, token, deck_id, queue=None, cursor=0):
+        self.token = token
+        self.deck_id = deck_id
+        self.queue = list(queue or [])
+        self.cursor = cursor
+
+    @property
+    def current_card_id(self):
+        if self.cursor < len(self.queue):
+            return self.queue[self.cursor]
+        return None
+
+    @property
+    def exhausted(self):
+        return self.cursor >= len(self.queue)
+
+    def to_dict(self):
+        return {"deck_id": self.deck_id, "queue": self.queue, "cursor": self.cursor}
+
+    @classmethod
+    def from_dict(cls, token, data):
+        return cls(token, data["deck_id"], data["queue"], data["cursor"])
+
+
+def new_session_token():
+    return secrets.token_urlsafe(12)
+
+
+class MemoryReviewSessionStore:
+    """In-process store. Only correct when the app runs as a single worker process."""
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._sessions = OrderedDict()  # token -> (expires_at, data), oldest touch first
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now):
+        # Entries are kept in touch order, so expired ones are always at the front
+        while self._sessions:
+            token, (expires_at, _) = next(iter(self._sessions.items()))
+            if expires_at > now:
+                break
+            del self._sessions[token]
+
+    def get(self, token):
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._sessions.get(token)
+            if entry is None:
+                return None
+            return ReviewSession.from_dict(token, entry[1])
+
+    def save(self, review_session):
+        now = time.monotonic()
+        with self._lock:
+            self._sessions.pop(review_session.token, None)
+            self._sessions[review_session.token] = (now + self.ttl, review_session.to_dict())
+            self._evict_expired(now)
+
+    def delete(self, token):
+        with self._lock:
+            self._sessions.pop(token, None)
+
+    def __len__(self):
+        with self._lock:
+            self._evict_expired(time.monotonic())
+            return len(self._sessions)
+
+
+class RedisReviewSessionStore:
+    """Shared store so every gunicorn worker sees the same review sessions."""
+
+    key_prefix = "review_session:"
+
+    def __init__(self, client, ttl=3600):
+        self.client = client
+        self.ttl = ttl
+
+    def get(self, token):
+        raw = self.client.get(self.key_prefix + token)
+        if raw is None:
+            return None
+        return ReviewSession.from_dict(token, json.loads(raw))
+
+    def save(self, review_session):
+        # SETEX refreshes the TTL on every save, so active sessions never expire mid-review
+        self.client.setex(
+            self.key_prefix + review_session.token,
+            self.ttl,
+            json.dumps(review_session.to_dict())
+        )
+
+    def delete(self, token):
+        self.client.delete(self.key_prefix + token)
+
+
+def create_review_session_store(backend='memory', ttl=3600, redis_url=None):
+    if backend == 'memory':
+        return MemoryReviewSessionStore(ttl=ttl)
+    if backend == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("REVIEW_SESSION_BACKEND=redis requires the redis package (pip install redis)")
+        return RedisReviewSessionStore(redis.Redis.from_url(redis_url or 'redis://localhost:6379/0'), ttl=ttl)
+    raise ValueError(f"Unknown review session backend: {backend}")
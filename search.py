@@ -0,0 +1,114 @@
+import base64
+import json
+import re
+
+# InnoDB FULLTEXT ignores words shorter than innodb_ft_min_token_size (3 by default)
+FT_MIN_TOKEN_SIZE = 3
+
+WORD_RE = re.compile(r"[^\W_]+")
+
+# flashcards.owner_token (migrations/0013) is this prefix plus user_id. No word starts with
+# these letters, so a user's prefix search can't match the token by accident.
+OWNER_TOKEN_PREFIX = 'zqxu'
+
+
+def boolean_query(query):
+    """Turns free text into an InnoDB BOOLEAN MODE query: every word required, prefix-matched.
+
+    Operator characters are dropped so user input can't change the query's meaning.
+    Returns None when no word is long enough for the FULLTEXT index.
+    """
+    words = [word for word in WORD_RE.findall(query.lower()) if len(word) >= FT_MIN_TOKEN_SIZE]
+    if not words:
+        return None
+    return ' '.join(f'+{word}*' for word in words)
+
+
+def owner_token(user_id):
+    """The FULLTEXT word that marks a user's cards; '+' makes every match carry it."""
+    return f'+{OWNER_TOKEN_PREFIX}{user_id}'
+
+
+def like_prefix(query):
+    escaped = query.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped + '%'
+
+
+def encode_cursor(score, row_id):
+    raw = json.dumps([score, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        score, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return float(score), int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def search_flashcards(cursor, user_id, query, limit=20, after=None):
+    """One page of the user's flashcards ranked by FULLTEXT relevance.
+
+    Pages are keyed on (score, id) rather than OFFSET, so page N costs the same as
+    page 1. Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    position = decode_cursor(after) if after else None
+    ft_query = boolean_query(query)
+
+    if ft_query is None:
+        # Too short for the FULLTEXT index: prefix match on term, served by idx_flashcards_user_term
+        sql = """
+            SELECT id, term, definition, deck_id, 0 AS score
+            FROM flashcards
+            WHERE user_id = %s AND term LIKE %s
+        """
+        params = [user_id, like_prefix(query)]
+        if position:
+            sql += " AND id < %s"
+            params.append(position[1])
+    else:
+        # FULLTEXT indexes can't have a user_id prefix, so the owner is a required word instead:
+        # the index only returns this user's matches. Every card has the token once, so it adds
+        # the same weight to each score and leaves the ranking alone.
+        ft_query = f"{owner_token(user_id)} {ft_query}"
+        sql = """
+            SELECT id, term, definition, deck_id,
+                   MATCH (owner_token, term, definition) AGAINST (%s IN BOOLEAN MODE) AS score
+            FROM flashcards
+            WHERE MATCH (owner_token, term, definition) AGAINST (%s IN BOOLEAN MODE) AND user_id = %s
+        """
+        params = [ft_query, ft_query, user_id]
+        if position:
+            sql = f"SELECT * FROM ({sql}) ranked WHERE score < %s OR (score = %s AND id < %s)"
+            params += [position[0], position[0], position[1]]
+
+    sql += " ORDER BY score DESC, id DESC LIMIT %s"
+    params.append(limit + 1)
+
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(float(rows[-1]['score']), rows[-1]['id'])
+    return rows, next_cursor
+
+
+def search_decks(cursor, user_id, query, limit=20):
+    """The user's top decks by name relevance (a user has few decks, so no pagination)."""
+    ft_query = boolean_query(query)
+    if ft_query is None:
+        cursor.execute("SELECT id, name FROM decks WHERE user_id = %s AND name LIKE %s ORDER BY name LIMIT %s",
+                       (user_id, like_prefix(query), limit))
+    else:
+        cursor.execute("""
+            SELECT id, name, MATCH (name) AGAINST (%s IN BOOLEAN MODE) AS score
+            FROM decks
+            WHERE MATCH (name) AGAINST (%s IN BOOLEAN MODE) AND user_id = %s
+            ORDER BY score DESC, id DESC
+            LIMIT %s
+        """, (ft_query, ft_query, user_id, limit))
+    return cursor.fetchall()
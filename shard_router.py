@@ -0,0 +1,59 @@
+import os
+import zlib
+
+
+def shard_databases(shards=None, default_host=None, default_db=None):
+    """(host, database) for every shard, from MYSQL_SHARDS.
+
+    MYSQL_SHARDS is a comma-separated list of `database` or `host/database` entries,
+    e.g. "flashcards_0,flashcards_1" or "db1.internal/flashcards,db2.internal/flashcards".
+    Unset or empty means a single shard: MYSQL_HOST / MYSQL_DB.
+    """
+    shards = os.getenv('MYSQL_SHARDS', '') if shards is None else shards
+    default_host = default_host or os.getenv('MYSQL_HOST')
+    default_db = default_db or os.getenv('MYSQL_DB')
+
+    databases = []
+    for entry in shards.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        host, _, db = entry.rpartition('/')
+        databases.append((host or default_host, db))
+    return databases or [(default_host, default_db)]
+
+
+def shard_index(user_id, shard_count):
+    # crc32 rather than hash(): it is the same in every process and Python version
+    if user_id is None or shard_count == 1:
+        return 0
+    return zlib.crc32(str(int(user_id)).encode()) % shard_count
+
+
+class ShardRouter:
+    """Picks the connection pool holding a user's decks and cards.
+
+    Each shard is a full flashcards_db schema. Shard 0 is also the directory: the
+    users table (login looks a user up by name before the id is known) and shared
+    tables such as translations live there, and requests without a user go to it.
+    Users are placed by a hash of their id, so changing the number of shards moves
+    users and needs a data migration.
+    """
+
+    def __init__(self, pools):
+        if not pools:
+            raise ValueError("ShardRouter needs at least one pool")
+        self.pools = list(pools)
+
+    @property
+    def directory(self):
+        return self.pools[0]
+
+    def shard_for(self, user_id):
+        return shard_index(user_id, len(self.pools))
+
+    def pool_for(self, user_id):
+        return self.pools[self.shard_for(user_id)]
+
+    def stats(self):
+        return [pool.stats() for pool in self.pools]
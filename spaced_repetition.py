@@ -1,6 +1,194 @@
-from simple_spaced_repetition import review
+from datetime import timedelta as td
+
+import numpy as np
+from simple_spaced_repetition import Card
+
+# Integer codes for Card.status in the columnar engine; -1 marks an unknown status
+LEARNING, REVIEWING, RELEARNING = 0, 1, 2
+STATUS_CODES = {"learning": LEARNING, "reviewing": REVIEWING, "relearning": RELEARNING}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+# Row order of the arrays returned by next_states(), same order as Card.options()
+GRADES = ("again", "hard", "good", "easy")
+
+MINUTE_US = 60 * 10**6
+DAY_US = 24 * 60 * MINUTE_US
+MIN_EASE = 1.3
+
+# Per-grade constants from Card.options(), indexed like GRADES
+_LEARNING_STEPS_US = np.array([MINUTE_US, 6 * MINUTE_US, 10 * MINUTE_US, 4 * DAY_US])
+_RELEARNING_STEPS_US = np.array([MINUTE_US, 6 * MINUTE_US, DAY_US, 4 * DAY_US])
+_REVIEW_EASE_DELTA = np.array([-0.2, -0.15, 0.0, 0.15])
+
 
 def update_review_schedule(current_interval, performance):
-    """Uses SSR library to calculate the next review interval."""
-    new_interval = review(current_interval, performance)
-    return new_interval
\ No newline at end of file
+    """Uses SSR library to calculate the next review interval for a card in review."""
+    options = dict(Card("reviewing", current_interval).options())
+    return options[performance].interval
+
+
+def status_codes(statuses):
+    """Maps an iterable of status strings to the engine's integer codes."""
+    return np.array([STATUS_CODES.get(status, -1) for status in statuses], dtype=np.int8)
+
+
+def interval_us(seconds):
+    """Converts spaced_interval values (seconds, NaN for none) to int64 microseconds, -1 for none."""
+    seconds = np.asarray(seconds, dtype=np.float64)
+    us = np.full(seconds.shape, -1, dtype=np.int64)
+    known = ~np.isnan(seconds)
+    us[known] = np.rint(seconds[known] * 1e6).astype(np.int64)
+    return us
+
+
+def _round_half_even(numerator, denominator):
+    # Same rounding as timedelta.__mul__ (datetime._divide_and_round)
+    q, r = divmod(numerator, denominator)
+    r *= 2
+    if r > denominator or (r == denominator and q % 2 == 1):
+        q += 1
+    return q
+
+
+def _split(x):
+    # Veltkamp split of a float64 into two 26-bit halves
+    c = 134217729.0 * x
+    hi = c - (c - x)
+    return hi, x - hi
+
+
+def _scale_us(us, factor):
+    """Vectorized timedelta * float on microsecond counts, bit-for-bit equal to the scalar result."""
+    factor = np.broadcast_to(np.asarray(factor, dtype=np.float64), us.shape)
+    x = us.astype(np.float64)
+    product = x * factor
+    result = np.rint(product).astype(np.int64)
+
+    # Dekker's TwoProduct: x * factor == product + error exactly. The float product can only
+    # round to the wrong integer when it lands exactly on a .5 tie, and then the sign of the
+    # error says which way the exact product leans.
+    x_hi, x_lo = _split(x)
+    f_hi, f_lo = _split(factor)
+    error = ((x_hi * f_hi - product) + x_hi * f_lo + x_lo * f_hi) + x_lo * f_lo
+    tie = (product - np.floor(product)) == 0.5
+    result += (tie & (error > 0) & (result < product)).astype(np.int64)
+    result -= (tie & (error < 0) & (result > product)).astype(np.int64)
+
+    # Beyond 2**52 float64 has no fractional bits left; do those (centuries-long) intervals exactly
+    for i in np.flatnonzero(np.abs(product) >= 2.0**52):
+        a, b = float(factor[i]).as_integer_ratio()
+        result[i] = _round_half_even(int(us[i]) * a, b)
+    return result
+
+
+def next_state(status, interval, ease, step, grade):
+    """Applies one grade to a whole batch of cards in one pass.
+
+    Inputs are equal-length arrays: status codes, intervals in microseconds
+    (-1 for none), ease and step. grade is an index into GRADES, either one
+    value for every card or one per card. Returns (status, interval, ease, step)
+    arrays matching what Card.options() gives card by card; cards the scalar
+    path can't schedule come back with status -1.
+    """
+    status = np.asarray(status, dtype=np.int8)
+    interval = np.asarray(interval, dtype=np.int64)
+    ease = np.maximum(np.asarray(ease, dtype=np.float64), MIN_EASE)
+    step = np.asarray(step, dtype=np.int64)
+    grade = np.broadcast_to(np.asarray(grade, dtype=np.int64), status.shape)
+
+    out_status = np.full(status.shape, -1, dtype=np.int8)
+    out_interval = np.full(status.shape, -1, dtype=np.int64)
+    out_ease = np.full(status.shape, np.nan, dtype=np.float64)
+    out_step = np.zeros(status.shape, dtype=np.int64)
+
+    # learning: fixed steps, "good" on a later step or "easy" graduates; ease resets to the Card default
+    learning = status == LEARNING
+    g = grade[learning]
+    graduate = (g == 3) | ((g == 2) & (step[learning] != 0))
+    out_status[learning] = np.where(graduate, REVIEWING, LEARNING)
+    out_interval[learning] = np.where(graduate, np.where(g == 3, 4 * DAY_US, DAY_US), _LEARNING_STEPS_US[g])
+    out_step[learning] = np.where(graduate | (g == 0), 0, 1)
+    out_ease[learning] = 2.5
+
+    # reviewing: interval grows by ease, ease adjusted per grade.
+    # Card.options() fails for a reviewing card without an interval, so those stay at -1.
+    reviewing = (status == REVIEWING) & (interval >= 0)
+    g = grade[reviewing]
+    e = ease[reviewing]
+    scaled = _scale_us(interval[reviewing], np.where(g == 1, 1.2, e))
+    easy = g == 3
+    scaled[easy] = _scale_us(scaled[easy], 1.5)
+    out_status[reviewing] = np.where(g == 0, RELEARNING, REVIEWING)
+    out_interval[reviewing] = np.where(g == 0, 10 * MINUTE_US, scaled)
+    out_ease[reviewing] = np.maximum(e + _REVIEW_EASE_DELTA[g], MIN_EASE)
+
+    # relearning: fixed steps back into review, ease kept
+    relearning = status == RELEARNING
+    g = grade[relearning]
+    out_status[relearning] = np.where(g >= 2, REVIEWING, RELEARNING)
+    out_interval[relearning] = _RELEARNING_STEPS_US[g]
+    out_ease[relearning] = ease[relearning]
+
+    return out_status, out_interval, out_ease, out_step
+
+
+def next_states(status, interval, ease, step):
+    """Every grade option at once: each returned array is shaped (4, n), rows in GRADES order."""
+    options = [next_state(status, interval, ease, step, g) for g in range(len(GRADES))]
+    return tuple(np.stack(column) for column in zip(*options))
+
+
+def forecast_due_per_day(status, interval, ease, step, due_in, days=365, max_rounds=64):
+    """Reviews due on each of the next `days` days, assuming every review is answered "good".
+
+    due_in is seconds from now until each card is due (negative when overdue;
+    overdue cards count toward day 0). Cards are simulated in rounds: each round
+    buckets the cards still inside the horizon, answers all of them "good" at once
+    and drops those whose next review falls outside. Learning and relearning cards
+    go through next_state(); once in review a "good" answer only multiplies the
+    interval by the ease, so those take a cheaper float path.
+    """
+    good = GRADES.index("good")
+    horizon_us = days * DAY_US
+    counts = np.zeros(days, dtype=np.int64)
+
+    status = np.asarray(status, dtype=np.int8)
+    interval = np.asarray(interval, dtype=np.int64)
+    ease = np.maximum(np.asarray(ease, dtype=np.float64), MIN_EASE)
+    step = np.asarray(step, dtype=np.int64)
+    due = np.maximum(np.rint(np.asarray(due_in, dtype=np.float64) * 1e6), 0).astype(np.int64)
+
+    # Cards already in review are tracked in float days, the rest in exact microseconds
+    in_review = (status == REVIEWING) & (interval >= 0)
+    review_due = due[in_review] / DAY_US
+    review_interval = np.maximum(interval[in_review], MINUTE_US) / DAY_US
+    review_ease = ease[in_review]
+    other = ~in_review & (status >= 0)
+    status, interval, ease, step, due = (a[other] for a in (status, interval, ease, step, due))
+
+    for _ in range(max_rounds):
+        keep = review_due < days
+        if not keep.all():
+            review_due, review_interval, review_ease = review_due[keep], review_interval[keep], review_ease[keep]
+        keep = due < horizon_us
+        if not keep.all():
+            status, interval, ease, step, due = (a[keep] for a in (status, interval, ease, step, due))
+        if due.size == 0 and review_due.size == 0:
+            break
+
+        counts += np.bincount(review_due.astype(np.int64), minlength=days)
+        review_interval *= review_ease
+        review_due += review_interval
+
+        if due.size:
+            counts += np.bincount(due // DAY_US, minlength=days)
+            status, interval, ease, step = next_state(status, interval, ease, step, good)
+            due = due + interval
+            graduated = status == REVIEWING
+            review_due = np.concatenate([review_due, due[graduated] / DAY_US])
+            review_interval = np.concatenate([review_interval, interval[graduated] / DAY_US])
+            review_ease = np.concatenate([review_ease, ease[graduated]])
+            learning = ~graduated
+            status, interval, ease, step, due = (a[learning] for a in (status, interval, ease, step, due))
+
+    return counts
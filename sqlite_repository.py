@@ -0,0 +1,595 @@
+import json
+import os
+import sqlite3
+import time
+from datetime import date, datetime
+
+import metrics
+from deck_stats import COUNTERS
+from repository import MERGE_POLICIES, Repository
+from search import WORD_RE, decode_cursor, encode_cursor, like_prefix
+
+# Used when SQLITE_PATH is not set (app.py, benchmarks/seed.py)
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flashcards.sqlite3')
+
+# Tuning for the embedded database (see .env.example). WAL lets readers run alongside the
+# one writer; synchronous=NORMAL in WAL mode only syncs at checkpoints, so a power cut
+# can lose the last commits but never corrupts the file.
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_CACHE_MB = int(os.getenv('SQLITE_CACHE_MB', 64))
+SQLITE_MMAP_MB = int(os.getenv('SQLITE_MMAP_MB', 256))
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', 5))
+
+# Compiled statements kept per connection, keyed by SQL text. Every query below is a fixed
+# string (IN lists are passed as one JSON array), so after warm-up nothing is re-parsed.
+SQLITE_STATEMENT_CACHE = 256
+
+# PRAGMA user_version of a database with SCHEMA; matches the last MySQL migration
+SCHEMA_VERSION = 13
+
+# The MySQL schema after migrations/0013, in SQLite terms. 0013's search owner token has no
+# counterpart: a single-node database holds few users, and each FTS5 match is checked
+# against flashcards.user_id by rowid. AUTOINCREMENT keeps deleted ids from coming back
+# (the deck page cache is keyed by deck id and version). The FTS5 tables index flashcards
+# and decks for /search and are kept current by the triggers;
+# remove_diacritics makes matching accent- and case-insensitive like utf8mb4_0900_ai_ci.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    email TEXT NOT NULL,
+    password_hash TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS decks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    language_code TEXT NULL,
+    user_id INTEGER NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    source_title TEXT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_decks_user_name ON decks (user_id, name);
+
+CREATE TABLE IF NOT EXISTS flashcards (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    term TEXT NOT NULL,
+    definition TEXT NOT NULL,
+    deck_id INTEGER NOT NULL REFERENCES decks (id) ON DELETE CASCADE,
+    user_id INTEGER NULL,
+    last_reviewed DATETIME NULL,
+    spaced_interval REAL NULL,
+    ease REAL NOT NULL DEFAULT 2.5,
+    step INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'learning',
+    due_at DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS idx_flashcards_user_deck_due ON flashcards (user_id, deck_id, due_at);
+CREATE INDEX IF NOT EXISTS idx_flashcards_user_term ON flashcards (user_id, term);
+CREATE INDEX IF NOT EXISTS idx_flashcards_deck_id ON flashcards (deck_id);
+
+CREATE TABLE IF NOT EXISTS deck_stats (
+    deck_id INTEGER NOT NULL PRIMARY KEY REFERENCES decks (id) ON DELETE CASCADE,
+    card_count INTEGER NOT NULL DEFAULT 0,
+    new_count INTEGER NOT NULL DEFAULT 0,
+    learning_count INTEGER NOT NULL DEFAULT 0,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    due_today_count INTEGER NOT NULL DEFAULT 0,
+    ease_sum REAL NOT NULL DEFAULT 0,
+    stats_date DATE NULL
+);
+
+CREATE TABLE IF NOT EXISTS review_log (
+    id INTEGER PRIMARY KEY,
+    event_id TEXT NOT NULL UNIQUE,
+    card_id INTEGER NOT NULL,
+    deck_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    grade TEXT NOT NULL,
+    reviewed_at DATETIME NOT NULL,
+    prev_status TEXT NOT NULL,
+    prev_interval REAL NULL,
+    prev_ease REAL NOT NULL,
+    prev_step INTEGER NOT NULL,
+    next_status TEXT NOT NULL,
+    next_interval REAL NULL,
+    next_ease REAL NOT NULL,
+    next_step INTEGER NOT NULL,
+    next_due_at DATETIME NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_review_log_user_time ON review_log (user_id, reviewed_at);
+CREATE INDEX IF NOT EXISTS idx_review_log_card_time ON review_log (card_id, reviewed_at);
+
+CREATE TABLE IF NOT EXISTS translations (
+    source_lang TEXT NOT NULL,
+    target_lang TEXT NOT NULL,
+    word TEXT NOT NULL,
+    translation TEXT NOT NULL,
+    PRIMARY KEY (source_lang, target_lang, word)
+) WITHOUT ROWID;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS flashcards_fts USING fts5(
+    term, definition, content='flashcards', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS flashcards_fts_insert AFTER INSERT ON flashcards BEGIN
+    INSERT INTO flashcards_fts (rowid, term, definition) VALUES (new.id, new.term, new.definition);
+END;
+CREATE TRIGGER IF NOT EXISTS flashcards_fts_delete AFTER DELETE ON flashcards BEGIN
+    INSERT INTO flashcards_fts (flashcards_fts, rowid, term, definition) VALUES ('delete', old.id, old.term, old.definition);
+END;
+CREATE TRIGGER IF NOT EXISTS flashcards_fts_update AFTER UPDATE OF term, definition ON flashcards BEGIN
+    INSERT INTO flashcards_fts (flashcards_fts, rowid, term, definition) VALUES ('delete', old.id, old.term, old.definition);
+    INSERT INTO flashcards_fts (rowid, term, definition) VALUES (new.id, new.term, new.definition);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS decks_fts USING fts5(
+    name, content='decks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS decks_fts_insert AFTER INSERT ON decks BEGIN
+    INSERT INTO decks_fts (rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS decks_fts_delete AFTER DELETE ON decks BEGIN
+    INSERT INTO decks_fts (decks_fts, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+CREATE TRIGGER IF NOT EXISTS decks_fts_update AFTER UPDATE OF name ON decks BEGIN
+    INSERT INTO decks_fts (decks_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    INSERT INTO decks_fts (rowid, name) VALUES (new.id, new.name);
+END;
+"""
+
+# Times are stored as ISO text in server-local time, like MySQL's NOW(); columns declared
+# DATETIME/DATE come back as datetime/date objects
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter('DATETIME', lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()))
+
+
+def dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def normalized_term(term):
+    # Duplicate key for merges, the SQLite side of MySQL's term_hash (LOWER(TRIM(term))).
+    # TRIM() only removes spaces, so tabs and newlines stay part of the term here too.
+    return term.strip(' ').lower() if term is not None else None
+
+
+class SQLiteCursor(sqlite3.Cursor):
+    """Cursor that times every statement for /metrics and the slow-query log.
+
+    A SELECT is timed up to its first row; the rest is read by fetchall().
+    """
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.record_query(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            metrics.record_query(sql, time.perf_counter() - started)
+
+
+class SQLiteConnection(sqlite3.Connection):
+    """sqlite3 connection with the parts of the pymysql API that ConnectionPool uses."""
+
+    open = True
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or SQLiteCursor)
+
+    def ping(self, reconnect=False):
+        # No socket to go stale: only a closed connection is unhealthy
+        if not self.open:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+
+    def close(self):
+        if self.open:
+            self.open = False
+            try:
+                # Refreshes planner statistics that changed while this connection was open
+                self.execute("PRAGMA optimize")
+            except sqlite3.Error:
+                pass
+        super().close()
+
+
+def connect_sqlite(path):
+    """Opens the database file (creating the schema if needed) with WAL and the tuned pragmas."""
+    connection = sqlite3.connect(
+        path,
+        timeout=SQLITE_BUSY_TIMEOUT,  # wait this long for the write lock instead of failing
+        detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+        check_same_thread=False,  # pooled: used by one request at a time, on any thread
+        cached_statements=SQLITE_STATEMENT_CACHE,
+        factory=SQLiteConnection
+    )
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.execute(f"PRAGMA cache_size = {-SQLITE_CACHE_MB * 1024}")
+    connection.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_MB * 1024 * 1024}")
+    connection.execute("PRAGMA temp_store = MEMORY")
+    connection.create_function('normalized_term', 1, normalized_term, deterministic=True)
+
+    if connection.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        # IF NOT EXISTS throughout, so two processes creating it at once is harmless
+        connection.executescript(f"BEGIN IMMEDIATE; {SCHEMA} PRAGMA user_version = {SCHEMA_VERSION}; COMMIT;")
+    connection.row_factory = dict_row
+    return connection
+
+
+def fts_query(query):
+    """Free text as an FTS5 query: every word required, prefix-matched, quoted so input can't add operators."""
+    words = WORD_RE.findall(query.lower())
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+# ---- Statements ----
+
+DECK_COLUMNS = "id, name, language_code, version, source_title"
+
+REFRESH_STATS = """
+    INSERT INTO deck_stats (deck_id, card_count, new_count, learning_count, review_count,
+                            due_today_count, ease_sum, stats_date)
+    SELECT decks.id,
+           COUNT(flashcards.id),
+           COALESCE(SUM(flashcards.id IS NOT NULL AND flashcards.last_reviewed IS NULL), 0),
+           COALESCE(SUM(flashcards.last_reviewed IS NOT NULL AND flashcards.status IN ('learning', 'relearning')), 0),
+           COALESCE(SUM(flashcards.last_reviewed IS NOT NULL AND flashcards.status = 'reviewing'), 0),
+           COALESCE(SUM(flashcards.due_at < date('now', 'localtime', '+1 day')), 0),
+           COALESCE(SUM(flashcards.ease), 0),
+           date('now', 'localtime')
+    FROM decks
+    LEFT JOIN flashcards ON flashcards.deck_id = decks.id
+    WHERE decks.id IN (SELECT value FROM json_each(?))
+    GROUP BY decks.id
+    ON CONFLICT (deck_id) DO UPDATE SET
+        card_count = excluded.card_count,
+        new_count = excluded.new_count,
+        learning_count = excluded.learning_count,
+        review_count = excluded.review_count,
+        due_today_count = excluded.due_today_count,
+        ease_sum = excluded.ease_sum,
+        stats_date = excluded.stats_date
+"""
+
+APPLY_STATS_DELTA = """
+    INSERT INTO deck_stats (deck_id, card_count, new_count, learning_count, review_count,
+                            due_today_count, ease_sum, stats_date)
+    VALUES (?, ?, ?, ?, ?, ?, ?, NULL)
+    ON CONFLICT (deck_id) DO UPDATE SET
+        card_count = card_count + excluded.card_count,
+        new_count = new_count + excluded.new_count,
+        learning_count = learning_count + excluded.learning_count,
+        review_count = review_count + excluded.review_count,
+        due_today_count = due_today_count + excluded.due_today_count,
+        ease_sum = ease_sum + excluded.ease_sum
+"""
+
+INSERT_CARD = "INSERT INTO flashcards (term, definition, deck_id, user_id) VALUES (?, ?, ?, ?)"
+
+INSERT_EVENT = """
+    INSERT OR IGNORE INTO review_log (event_id, card_id, deck_id, user_id, grade, reviewed_at,
+                                      prev_status, prev_interval, prev_ease, prev_step,
+                                      next_status, next_interval, next_ease, next_step, next_due_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+APPLY_STATE = """
+    UPDATE flashcards
+    SET spaced_interval = ?, ease = ?, step = ?, status = ?, last_reviewed = ?, due_at = ?
+    WHERE id = ? AND (last_reviewed IS NULL OR last_reviewed <= ?)
+"""
+
+FORECAST = """
+    SELECT CASE status WHEN 'learning' THEN 0 WHEN 'reviewing' THEN 1 WHEN 'relearning' THEN 2 ELSE -1 END,
+           IFNULL(spaced_interval, -1), IFNULL(ease, 2.5), IFNULL(step, 0),
+           CAST(strftime('%s', due_at) AS INTEGER) - CAST(strftime('%s', 'now', 'localtime') AS INTEGER)
+    FROM flashcards
+    WHERE user_id = ?
+"""
+
+
+class SQLiteRepository(Repository):
+    """The same data in one embedded SQLite file (connect_sqlite), for single-node deployments.
+
+    Transactions start at the first write and hold the database's single write lock
+    until commit; readers keep going meanwhile (WAL). lock_deck() takes the write lock
+    up front, as SELECT ... FOR UPDATE would take the deck's row lock in MySQL.
+    """
+
+    def create_user(self, username, email, password_hash):
+        cursor = self.connection.cursor()
+        cursor.execute("INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
+                       (username, email, password_hash))
+        return cursor.lastrowid
+
+    def user_by_username(self, username):
+        return self.connection.cursor().execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+
+    def deck_list(self, user_id):
+        return self.connection.cursor().execute("""
+            SELECT decks.id, decks.name,
+                   COALESCE(deck_stats.card_count, 0) AS flashcard_count,
+                   COALESCE(deck_stats.due_today_count, 0) AS due_count,
+                   deck_stats.new_count, deck_stats.learning_count, deck_stats.review_count,
+                   deck_stats.ease_sum / NULLIF(deck_stats.card_count, 0) AS avg_ease
+            FROM decks
+            LEFT JOIN deck_stats ON deck_stats.deck_id = decks.id
+            WHERE decks.user_id = ?
+            ORDER BY decks.name
+        """, (user_id,)).fetchall()
+
+    def owned_deck(self, deck_id, user_id):
+        return self.connection.cursor().execute(f"SELECT {DECK_COLUMNS} FROM decks WHERE id = ? AND user_id = ?",
+                                                (deck_id, user_id)).fetchone()
+
+    def lock_deck(self, deck_id, user_id):
+        if not self.connection.in_transaction:
+            self.connection.cursor().execute("BEGIN IMMEDIATE")
+        return self.owned_deck(deck_id, user_id)
+
+    def owns_decks(self, user_id, deck_ids):
+        row = self.connection.cursor().execute("""
+            SELECT COUNT(*) AS owned FROM decks
+            WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))
+        """, (user_id, json.dumps(list(deck_ids)))).fetchone()
+        return row['owned'] == len(set(deck_ids))
+
+    def create_deck(self, user_id, name, language_code=None, source_title=None):
+        cursor = self.connection.cursor()
+        cursor.execute("INSERT INTO decks (name, language_code, user_id, source_title) VALUES (?, ?, ?, ?)",
+                       (name, language_code, user_id, source_title))
+        deck_id = cursor.lastrowid
+        cursor.execute("INSERT INTO deck_stats (deck_id, stats_date) VALUES (?, date('now', 'localtime'))",
+                       (deck_id,))
+        return deck_id
+
+    def delete_deck(self, deck_id, user_id):
+        cursor = self.connection.cursor()
+        cursor.execute("DELETE FROM decks WHERE id = ? AND user_id = ?", (deck_id, user_id))
+        return cursor.rowcount > 0
+
+    def set_deck_source(self, deck_id, source_title, language_code):
+        self.connection.cursor().execute("UPDATE decks SET source_title = ?, language_code = ? WHERE id = ?",
+                                         (source_title, language_code, deck_id))
+
+    def bump_deck_version(self, deck_id):
+        self.connection.cursor().execute("UPDATE decks SET version = version + 1 WHERE id = ?", (deck_id,))
+
+    # INSERT ... SELECT with a window function, as on MySQL; the duplicate key is computed per row
+    def merge_decks(self, user_id, deck_ids, name, policy='newest'):
+        cursor = self.connection.cursor()
+        order_by = MERGE_POLICIES[policy]
+
+        # New deck takes the language of the first source deck
+        cursor.execute(
+            "INSERT INTO decks (name, language_code, user_id) SELECT ?, language_code, user_id FROM decks WHERE id = ?",
+            (name, deck_ids[0])
+        )
+        new_deck_id = cursor.lastrowid
+
+        if policy == 'reset':
+            columns = "term, definition, deck_id, user_id"
+            selected = "term, definition, ?, user_id"
+        else:
+            columns = "term, definition, deck_id, user_id, last_reviewed, spaced_interval, ease, step, status, due_at"
+            selected = "term, definition, ?, user_id, last_reviewed, spaced_interval, ease, step, status, due_at"
+
+        cursor.execute(f"""
+            INSERT INTO flashcards ({columns})
+            SELECT {selected}
+            FROM (
+                SELECT flashcards.*,
+                       ROW_NUMBER() OVER (PARTITION BY normalized_term(term) ORDER BY {order_by}) AS copy_rank
+                FROM flashcards
+                WHERE user_id = ? AND deck_id IN (SELECT value FROM json_each(?))
+            ) candidates
+            WHERE copy_rank = 1
+        """, (new_deck_id, user_id, json.dumps(list(deck_ids))))
+
+        return new_deck_id, cursor.rowcount
+
+    def refresh_deck_stats(self, deck_ids):
+        deck_ids = list(deck_ids)
+        if deck_ids:
+            self.connection.cursor().execute(REFRESH_STATS, (json.dumps(deck_ids),))
+
+    def refresh_stale_deck_stats(self, user_id):
+        rows = self.connection.cursor().execute("""
+            SELECT decks.id FROM decks
+            LEFT JOIN deck_stats ON deck_stats.deck_id = decks.id
+            WHERE decks.user_id = ? AND (deck_stats.stats_date IS NULL OR deck_stats.stats_date < date('now', 'localtime'))
+        """, (user_id,)).fetchall()
+        stale = [row['id'] for row in rows]
+        self.refresh_deck_stats(stale)
+        return stale
+
+    def apply_stats_delta(self, deck_id, delta):
+        if any(delta.values()):
+            self.connection.cursor().execute(APPLY_STATS_DELTA, (deck_id, *(delta[name] for name in COUNTERS)))
+
+    def deck_page(self, deck_id, after, limit):
+        return self.connection.cursor().execute("""
+            SELECT id, term, definition FROM flashcards
+            WHERE deck_id = ? AND id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (deck_id, after, limit)).fetchall()
+
+    def card(self, card_id, user_id):
+        return self.connection.cursor().execute("SELECT * FROM flashcards WHERE id = ? AND user_id = ?",
+                                                (card_id, user_id)).fetchone()
+
+    def cards(self, user_id, card_ids):
+        if not card_ids:
+            return []
+        return self.connection.cursor().execute("""
+            SELECT * FROM flashcards
+            WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))
+        """, (user_id, json.dumps(list(card_ids)))).fetchall()
+
+    def card_text(self, card_id, user_id):
+        return self.connection.cursor().execute("SELECT id, term, definition FROM flashcards WHERE id = ? AND user_id = ?",
+                                                (card_id, user_id)).fetchone()
+
+    def add_card(self, user_id, deck_id, term, definition):
+        cursor = self.connection.cursor()
+        cursor.execute(INSERT_CARD, (term, definition, deck_id, user_id))
+        return cursor.lastrowid
+
+    # One prepared INSERT stepped once per row inside the open transaction: no round trips to save
+    def insert_cards(self, user_id, deck_id, pairs):
+        self.connection.cursor().executemany(
+            INSERT_CARD, [(term, definition, deck_id, user_id) for term, definition in pairs]
+        )
+
+    def update_card(self, card_id, term, definition):
+        self.connection.cursor().execute("UPDATE flashcards SET term = ?, definition = ? WHERE id = ?",
+                                         (term, definition, card_id))
+
+    def delete_card(self, card_id):
+        self.connection.cursor().execute("DELETE FROM flashcards WHERE id = ?", (card_id,))
+
+    def deck_terms(self, user_id, deck_id):
+        rows = self.connection.cursor().execute("SELECT term FROM flashcards WHERE user_id = ? AND deck_id = ?",
+                                                (user_id, deck_id)).fetchall()
+        return {row['term'].casefold() for row in rows}
+
+    def due_card_ids(self, user_id, deck_id, limit):
+        rows = self.connection.cursor().execute("""
+            SELECT id FROM flashcards
+            WHERE user_id = ? AND deck_id = ? AND due_at <= datetime('now', 'localtime')
+            ORDER BY due_at
+            LIMIT ?
+        """, (user_id, deck_id, limit)).fetchall()
+        return [row['id'] for row in rows]
+
+    def due_cards(self, user_id, deck_id, limit):
+        return self.connection.cursor().execute("""
+            SELECT * FROM flashcards
+            WHERE user_id = ? AND deck_id = ? AND due_at <= datetime('now', 'localtime')
+            ORDER BY due_at
+            LIMIT ?
+        """, (user_id, deck_id, limit)).fetchall()
+
+    def forecast_rows(self, user_id, deck_id=None):
+        cursor = self.connection.cursor()
+        cursor.row_factory = None  # plain tuples, straight into the numpy array
+        if deck_id is None:
+            return cursor.execute(FORECAST, (user_id,)).fetchall()
+        return cursor.execute(FORECAST + " AND deck_id = ?", (user_id, deck_id)).fetchall()
+
+    def search_flashcards(self, user_id, query, limit, after=None):
+        position = decode_cursor(after) if after else None
+        match = fts_query(query)
+
+        if match is None:
+            # No word characters to index: prefix match on term within the user's cards
+            sql = """
+                SELECT id, term, definition, deck_id, 0 AS score
+                FROM flashcards
+                WHERE user_id = ? AND term LIKE ? ESCAPE '\\'
+            """
+            params = [user_id, like_prefix(query)]
+            if position:
+                sql += " AND id < ?"
+                params.append(position[1])
+        else:
+            # bm25() is lower for better matches; negated so pages go by score DESC as on MySQL
+            sql = """
+                SELECT flashcards.id, flashcards.term, flashcards.definition, flashcards.deck_id,
+                       -bm25(flashcards_fts) AS score
+                FROM flashcards_fts
+                JOIN flashcards ON flashcards.id = flashcards_fts.rowid
+                WHERE flashcards_fts MATCH ? AND flashcards.user_id = ?
+            """
+            params = [match, user_id]
+            if position:
+                sql = f"SELECT * FROM ({sql}) ranked WHERE score < ? OR (score = ? AND id < ?)"
+                params += [position[0], position[0], position[1]]
+
+        sql += " ORDER BY score DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+        rows = self.connection.cursor().execute(sql, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(float(rows[-1]['score']), rows[-1]['id'])
+        return rows, next_cursor
+
+    def search_decks(self, user_id, query, limit):
+        match = fts_query(query)
+        cursor = self.connection.cursor()
+        if match is None:
+            return cursor.execute("""
+                SELECT id, name FROM decks WHERE user_id = ? AND name LIKE ? ESCAPE '\\' ORDER BY name LIMIT ?
+            """, (user_id, like_prefix(query), limit)).fetchall()
+        return cursor.execute("""
+            SELECT decks.id, decks.name, -bm25(decks_fts) AS score
+            FROM decks_fts
+            JOIN decks ON decks.id = decks_fts.rowid
+            WHERE decks_fts MATCH ? AND decks.user_id = ?
+            ORDER BY score DESC, decks.id DESC
+            LIMIT ?
+        """, (match, user_id, limit)).fetchall()
+
+    def insert_review_events(self, events):
+        self.connection.cursor().executemany(INSERT_EVENT, [event.insert_params() for event in events])
+
+    def apply_card_states(self, events):
+        self.connection.cursor().executemany(APPLY_STATE, [event.state_params() for event in events])
+
+    def retention_by_day(self, user_id, days):
+        return self.connection.cursor().execute("""
+            SELECT date(reviewed_at) AS "day [DATE]", COUNT(*) AS reviews, AVG(grade <> 'again') AS retention
+            FROM review_log
+            WHERE user_id = ? AND reviewed_at >= date('now', 'localtime', ?) AND prev_status = 'reviewing'
+            GROUP BY date(reviewed_at)
+            ORDER BY 1
+        """, (user_id, f"-{int(days)} days")).fetchall()
+
+
+class SQLiteTranslationStore:
+    """SQLite version of translation_cache.MySQLTranslationStore."""
+
+    def __init__(self, connect):
+        # connect() returns a connect_sqlite connection; close() gives it back
+        self.connect = connect
+
+    def get_many(self, source_lang, target_lang, words):
+        if not words:
+            return {}
+        connection = self.connect()
+        try:
+            rows = connection.cursor().execute("""
+                SELECT word, translation FROM translations
+                WHERE source_lang = ? AND target_lang = ? AND word IN (SELECT value FROM json_each(?))
+            """, (source_lang, target_lang, json.dumps(list(words)))).fetchall()
+            return {row['word']: row['translation'] for row in rows}
+        finally:
+            connection.close()
+
+    def put_many(self, source_lang, target_lang, translations):
+        if not translations:
+            return
+        connection = self.connect()
+        try:
+            connection.cursor().executemany("""
+                INSERT INTO translations (source_lang, target_lang, word, translation)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (source_lang, target_lang, word) DO UPDATE SET translation = excluded.translation
+            """, [(source_lang, target_lang, word, translated) for word, translated in translations.items()])
+            connection.commit()
+        finally:
+            connection.close()
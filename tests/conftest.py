@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+# The modules read their settings at import: run the Flask app on a throwaway SQLite
+# database, translate offline and keep spools and caches out of the checkout
+_scratch = tempfile.mkdtemp(prefix='flashcards-tests-')
+os.environ.update(
+    STORAGE_BACKEND='sqlite',
+    SQLITE_PATH=os.path.join(_scratch, 'flashcards.sqlite3'),
+    REVIEW_LOG_SPOOL_DIR=os.path.join(_scratch, 'review_spool'),
+    WIKI_CACHE_DIR='',
+    TRANSLATOR='stub',
+)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
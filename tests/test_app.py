@@ -0,0 +1,51 @@
+import itertools
+
+import pytest
+
+import app as flashcards
+
+_usernames = itertools.count(1)
+
+
+@pytest.fixture
+def client():
+    flashcards.app.config['TESTING'] = True
+    with flashcards.app.test_client() as client:
+        yield client
+
+
+def sign_up(client, username=None, password='secret'):
+    username = username or f"user{next(_usernames)}"
+    client.post('/signup', data={'username': username, 'email': f"{username}@example.com",
+                                 'password': password})
+    client.post('/login', data={'username': username, 'password': password})
+    with client.session_transaction() as session:
+        return session['user_id']
+
+
+def make_deck(client, user_id, cards):
+    client.post('/add_deck', data={'deck_name': 'Deck'})
+    repository = flashcards.get_repository()
+    deck_id = repository.deck_list(user_id)[-1]['id']
+    repository.close()
+    for term in range(cards):
+        client.post(f"/add_flashcard/{deck_id}", data={'term': f"term {term}", 'definition': 'definition'})
+    return deck_id
+
+
+def test_review_cards_limit_is_clamped(client, monkeypatch):
+    monkeypatch.setattr(flashcards, 'API_MAX_BATCH', 2)
+    deck_id = make_deck(client, sign_up(client), cards=3)
+
+    for limit, expected in (('-1', 1), ('0', 1), ('1', 1), ('100', 2)):
+        response = client.get(f"/api/review/{deck_id}/cards?limit={limit}")
+        assert response.status_code == 200
+        assert len(response.get_json()['cards']) == expected
+
+
+def test_duplicate_username_rerenders_signup(client):
+    sign_up(client, 'taken')
+    response = client.post('/signup', data={'username': 'taken', 'email': 'other@example.com',
+                                            'password': 'other'})
+    assert response.status_code == 409
+    assert b"already taken" in response.data
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import async_api
+from jobs import Job
+
+
+def make_app():
+    # The routes and login middleware without the MySQL pools; the tests below stop
+    # before any query
+    app = web.Application(middlewares=[async_api.login_required])
+    app.add_routes(async_api.routes)
+    app['jobs'] = {}
+    app['tasks'] = set()
+    app['executor'] = ThreadPoolExecutor(max_workers=1)
+    return app
+
+
+def session_cookie(user_id, signed_at=None):
+    serializer = async_api.session_serializer
+    if signed_at is not None:
+        signer = serializer.make_signer()
+        signer.get_timestamp = lambda: int(signed_at)
+        return signer.sign(serializer.dump_payload({'user_id': user_id})).decode()
+    return serializer.dumps({'user_id': user_id})
+
+
+def run(app, scenario):
+    async def main():
+        async with TestClient(TestServer(app)) as client:
+            return await scenario(client)
+    try:
+        return asyncio.run(main())
+    finally:
+        app['executor'].shutdown()
+
+
+def test_requests_need_a_current_session_cookie():
+    expired = time.time() - async_api.PERMANENT_SESSION_LIFETIME.total_seconds() - 60
+
+    async def scenario(client):
+        anonymous = await client.get('/api/async/decks')
+        stale = await client.get('/api/async/decks', cookies={'session': session_cookie(1, expired)})
+        forged = await client.get('/api/async/decks', cookies={'session': 'not-a-cookie'})
+        return anonymous.status, stale.status, forged.status
+
+    assert run(make_app(), scenario) == (401, 401, 401)
+
+
+def test_card_page_limit_must_be_positive():
+    async def scenario(client):
+        cookies = {'session': session_cookie(1)}
+        responses = [await client.get('/api/async/decks/1/cards', params={'limit': limit}, cookies=cookies)
+                     for limit in ('0', '-1', 'x')]
+        return [(response.status, (await response.json())['message']) for response in responses]
+
+    assert run(make_app(), scenario) == [
+        (400, "limit must be at least 1."),
+        (400, "limit must be at least 1."),
+        (400, "limit must be an integer."),
+    ]
+
+
+def test_finished_jobs_are_evicted(monkeypatch):
+    monkeypatch.setattr(async_api, 'fetch_article_word_freq', lambda title, lang_code: Counter())
+    app = make_app()
+    old = Job('old', 'wikipedia:es:Gato', owner_id=1)
+    old.status, old.finished_at = 'done', time.time() - async_api.JOB_KEEP_FINISHED - 1
+    app['jobs'][old.id] = old
+
+    async def scenario(client):
+        cookies = {'session': session_cookie(1)}
+        started = await client.post('/api/async/decks/wikipedia', json={'deck_name': 'Perro'}, cookies=cookies)
+        status_url = (await started.json())['status_url']
+        await asyncio.gather(*app['tasks'])
+        return started.status, await (await client.get(status_url, cookies=cookies)).json()
+
+    status, job = run(app, scenario)
+    assert status == 202
+    assert job['status'] == 'failed' and job['message'].startswith("Failed to fetch")
+    assert list(app['jobs']) == [job['id']]
+    assert app['jobs'][job['id']].finished_at is not None
@@ -0,0 +1,26 @@
+import sqlite3
+
+import pytest
+
+import migrate
+from sqlite_repository import dict_row
+
+
+@pytest.fixture
+def cursor():
+    connection = sqlite3.connect(':memory:')
+    connection.row_factory = dict_row
+    connection.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT)")
+    yield connection.cursor()
+    connection.close()
+
+
+def test_unique_username_precheck_lists_duplicates(cursor):
+    cursor.executemany("INSERT INTO users (username) VALUES (?)", [('ana',), ('ana',), ('bo',)])
+    with pytest.raises(migrate.MigrationBlocked, match=r"username=ana, copies=2"):
+        migrate.precheck(cursor, 7)
+
+
+def test_unique_username_precheck_passes_clean_table(cursor):
+    cursor.executemany("INSERT INTO users (username) VALUES (?)", [('ana',), ('bo',)])
+    migrate.precheck(cursor, 7)
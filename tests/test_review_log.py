@@ -0,0 +1,58 @@
+import threading
+import time
+from functools import partial
+
+import review_log
+from card_state import card_from_row
+from db_pool import ConnectionPool
+from review_log import ReviewEvent, ReviewLogWriter
+from sqlite_repository import SQLiteRepository, connect_sqlite
+
+
+def make_card(pool):
+    repository = SQLiteRepository(pool.acquire())
+    deck_id = repository.create_deck(1, 'Spanish', 'es')
+    card_id = repository.add_card(1, deck_id, 'hola', 'hello')
+    row = repository.card(card_id, 1)
+    repository.commit()
+    repository.close()
+    return row
+
+
+def graded_event(row):
+    card = card_from_row(row)
+    card.grade_answer('good')
+    return ReviewEvent.from_grade(row, card, 'good')
+
+
+def test_overlay_does_not_wait_for_spool_fsync(tmp_path, monkeypatch):
+    pool = ConnectionPool(partial(connect_sqlite, str(tmp_path / 'db.sqlite3')), min_size=0, max_size=2)
+    row = make_card(pool)
+    writer = ReviewLogWriter(lambda user_id: pool, str(tmp_path / 'spool'), SQLiteRepository,
+                             flush_interval=3600)
+
+    syncing, release = threading.Event(), threading.Event()
+
+    def slow_fsync(fd):
+        syncing.set()
+        release.wait(5)
+
+    monkeypatch.setattr(review_log.os, 'fsync', slow_fsync)
+    event = graded_event(row)
+    appending = threading.Thread(target=writer.append, args=(event,))
+    appending.start()
+    try:
+        assert syncing.wait(5)
+        started = time.perf_counter()
+        # The event isn't durable yet, so readers still see the stored row
+        assert writer.overlay(row) == row
+        assert writer.not_due([row['id']]) == set()
+        assert time.perf_counter() - started < 1
+    finally:
+        release.set()
+        appending.join()
+
+    assert writer.overlay(row)['last_reviewed'] == event.reviewed_at
+    writer.close()
+    assert writer.stats()['flushed'] == 1
+    pool.close_all()
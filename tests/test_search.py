@@ -0,0 +1,20 @@
+import search
+
+
+class RecordingCursor:
+    # Stands in for the MySQL cursor: keeps the statement, returns no rows
+    def execute(self, sql, params):
+        self.sql, self.params = sql, params
+
+    def fetchall(self):
+        return []
+
+
+def test_fulltext_search_requires_the_owner_token():
+    cursor = RecordingCursor()
+    search.search_flashcards(cursor, 42, "perro gato", limit=10)
+
+    assert "MATCH (owner_token, term, definition)" in cursor.sql
+    assert cursor.params[0] == "+zqxu42 +perro* +gato*"
+    assert cursor.params[2] == 42
+
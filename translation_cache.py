@@ -0,0 +1,194 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class StubTranslator:
+    """Offline translator for tests: looks words up in a dict, falls back to a marked copy."""
+
+    def __init__(self, dictionary=None):
+        self.dictionary = dictionary or {}
+        self.calls = 0
+
+    def translate_batch(self, words, source_lang, target_lang):
+        self.calls += 1
+        return [self.dictionary.get(word, f"{word} ({target_lang})") for word in words]
+
+
+class GoogleBatchTranslator:
+    """Translates a batch of words with a single Google Translate request.
+
+    Words are sent one per line; if the reply doesn't come back with the same
+    number of lines, the batch is retried word by word.
+    """
+
+    def translate_batch(self, words, source_lang, target_lang):
+        from deep_translator import GoogleTranslator
+
+        translator = GoogleTranslator(source=source_lang, target=target_lang)
+        translated = translator.translate("\n".join(words))
+        lines = translated.split("\n") if translated else []
+        if len(lines) == len(words):
+            return [line.strip() for line in lines]
+        return [translator.translate(word) for word in words]
+
+
+class AdaptiveRateLimiter:
+    """Spaces out translator calls: backs off on errors, speeds up again while calls succeed."""
+
+    def __init__(self, min_interval=0.0, max_interval=10.0, initial_interval=0.1):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = initial_interval
+        self._next_allowed = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_allowed - now
+            self._next_allowed = max(now, self._next_allowed) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+    def success(self):
+        with self._lock:
+            self.interval = max(self.min_interval, self.interval * 0.8)
+
+    def failure(self):
+        with self._lock:
+            self.interval = min(self.max_interval, max(self.interval * 2, 0.5))
+
+
+class MySQLTranslationStore:
+    """Persistent memo table: translations(source_lang, target_lang, word, translation)."""
+
+    def __init__(self, connect):
+        # connect() must return a DictCursor connection; close() gives it back
+        self.connect = connect
+
+    def get_many(self, source_lang, target_lang, words):
+        if not words:
+            return {}
+        connection = self.connect()
+        try:
+            cursor = connection.cursor()
+            placeholders = ', '.join(['%s'] * len(words))
+            cursor.execute(f"""
+                SELECT word, translation FROM translations
+                WHERE source_lang = %s AND target_lang = %s AND word IN ({placeholders})
+            """, [source_lang, target_lang, *words])
+            return {row['word']: row['translation'] for row in cursor.fetchall()}
+        finally:
+            connection.close()
+
+    def put_many(self, source_lang, target_lang, translations):
+        if not translations:
+            return
+        connection = self.connect()
+        try:
+            cursor = connection.cursor()
+            cursor.executemany("""
+                INSERT INTO translations (source_lang, target_lang, word, translation)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE translation = VALUES(translation)
+            """, [(source_lang, target_lang, word, translated) for word, translated in translations.items()])
+            connection.commit()
+        finally:
+            connection.close()
+
+
+class TranslationCache:
+    """Translation memo keyed by (source_lang, target_lang, word).
+
+    An in-memory LRU sits in front of an optional persistent store; only words
+    missing from both are sent to the translator, in batches, on a bounded
+    number of threads paced by an adaptive rate limiter.
+    """
+
+    def __init__(self, translator=None, store=None, max_entries=50000, batch_size=25, max_workers=4,
+                 rate_limiter=None):
+        self.translator = translator or GoogleBatchTranslator()
+        self.store = store
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lru_get(self, key):
+        with self._lock:
+            value = self._lru.get(key)
+            if value is not None:
+                self._lru.move_to_end(key)
+            return value
+
+    def _lru_put(self, key, value):
+        with self._lock:
+            self._lru[key] = value
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def _translate_batch(self, words, source_lang, target_lang, attempts=3):
+        for attempt in range(attempts):
+            self.rate_limiter.wait()
+            try:
+                result = self.translator.translate_batch(words, source_lang, target_lang)
+                self.rate_limiter.success()
+                return dict(zip(words, result))
+            except Exception as e:
+                self.rate_limiter.failure()
+                if attempt == attempts - 1:
+                    print(f"Error translating batch of {len(words)} words: {e}")
+        return {}
+
+    def translate(self, words, source_lang, target_lang, progress=None):
+        """Returns {word: translation}; words that could not be translated are left out."""
+        unique_words = list(dict.fromkeys(words))
+        found = {}
+        missing = []
+        for word in unique_words:
+            value = self._lru_get((source_lang, target_lang, word))
+            if value is None:
+                missing.append(word)
+            else:
+                found[word] = value
+
+        if missing and self.store is not None:
+            stored = self.store.get_many(source_lang, target_lang, missing)
+            for word, value in stored.items():
+                self._lru_put((source_lang, target_lang, word), value)
+            found.update(stored)
+            missing = [word for word in missing if word not in stored]
+
+        with self._lock:
+            self.hits += len(unique_words) - len(missing)
+            self.misses += len(missing)
+
+        total = len(unique_words)
+        if progress:
+            progress(len(found), total)
+
+        if missing:
+            batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+            fresh = {}
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+                futures = [executor.submit(self._translate_batch, batch, source_lang, target_lang) for batch in batches]
+                for future in futures:
+                    translated = {word: value for word, value in future.result().items() if value}
+                    fresh.update(translated)
+                    if progress:
+                        progress(len(found) + len(fresh), total)
+
+            for word, value in fresh.items():
+                self._lru_put((source_lang, target_lang, word), value)
+            if self.store is not None:
+                self.store.put_many(source_lang, target_lang, fresh)
+            found.update(fresh)
+
+        return found
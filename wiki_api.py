@@ -1,101 +1,325 @@
 import requests
+import argparse
 import csv
+import multiprocessing
+import os
 import re
+import sys
 import nltk
+import threading
 import time
+import unicodedata
 from collections import Counter
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from bs4 import BeautifulSoup
-from deep_translator import GoogleTranslator
-
-# Ensure that NLTK's stopwords and punkt are downloaded
-nltk.download('punkt')
-nltk.download('stopwords')
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from requests.adapters import HTTPAdapter
+from article_cache import ArticleCache, entry_is_fresh
+from metrics import timed
+from translation_cache import GoogleBatchTranslator, StubTranslator, TranslationCache
+
+# Map Wikipedia language codes to NLTK language names
+LANG_MAP = {
+    'es': 'spanish',
+    'fr': 'french',
+    'de': 'german',
+    'it': 'italian',
+    'pt': 'portuguese'
+}
+
+# NLTK data is only looked up (and downloaded if missing) the first time it is needed,
+# so importing this module stays cheap for app workers and tests
+_download_lock = threading.Lock()
+
+def ensure_nltk_resource(resource_path, package):
+    try:
+        nltk.data.find(resource_path)
+    except LookupError:
+        with _download_lock:
+            try:
+                nltk.data.find(resource_path)
+            except LookupError:
+                print(f"NLTK resource '{package}' not found. Downloading it.")
+                nltk.download(package, quiet=True)
+
+# Stopword set per NLTK language, loaded once per process. Only successful loads are kept:
+# after a failed download the next call tries again instead of filtering nothing for good.
+_stopwords = {}
+
+def get_stopwords(nltk_lang):
+    if nltk_lang in _stopwords:
+        return _stopwords[nltk_lang]
+    ensure_nltk_resource('corpora/stopwords', 'stopwords')
+    from nltk.corpus import stopwords  # the corpus package is only needed here
+    try:
+        words = _stopwords[nltk_lang] = frozenset(stopwords.words(nltk_lang))
+    except (OSError, LookupError):
+        print(f"Stopwords for '{nltk_lang}' not found. Using empty set.")
+        return frozenset()
+    return words
+
+# Optional warm-up for preforking servers: load everything once in the master before fork
+def warm_up(lang_codes=None):
+    for lang_code in lang_codes or LANG_MAP:
+        get_stopwords(LANG_MAP.get(lang_code, 'english'))
+
+# MediaWiki API endpoint; {lang} is the language code. Point it at a local fixture server
+# (benchmarks/wiki_fixture_server.py) to run without Wikipedia.
+WIKIPEDIA_API_URL = os.getenv('WIKIPEDIA_API_URL', 'https://{lang}.wikipedia.org/w/api.php')
+HTTP_TIMEOUT = float(os.getenv('WIKI_HTTP_TIMEOUT', 30))
+
+# Keep-alive session shared by every Wikipedia request (app job threads included)
+http_session = requests.Session()
+http_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+http_session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+http_session.headers['User-Agent'] = 'COP4710-MockAnki/1.0 (flashcard deck builder)'
+
+def api_url(lang_code):
+    return WIKIPEDIA_API_URL.format(lang=lang_code)
+
+class WikipediaError(Exception):
+    """The API answered, but with an error instead of a page."""
+
+def query_api(lang_code, params, etag=None):
+    """One API query -> (status, query dict, ETag). status 304 means the ETag still matches."""
+    headers = {'If-None-Match': etag} if etag else {}
+    response = http_session.get(api_url(lang_code), params=dict(params, action="query", format="json"),
+                                headers=headers, timeout=HTTP_TIMEOUT)
+    if response.status_code == 304:
+        return 304, None, etag
+    response.raise_for_status()
+    data = response.json()
+    if 'error' in data or 'query' not in data:
+        raise WikipediaError(data.get('error', {}).get('info', "response has no query"))
+    return response.status_code, data['query'], response.headers.get('ETag')
+
+def first_page(query):
+    pages = list(query.get('pages', {}).values())
+    return pages[0] if pages and 'missing' not in pages[0] and 'invalid' not in pages[0] else None
+
+# On-disk cache of extracts and their word counts (article_cache.py); WIKI_CACHE_DIR= turns it off.
+# Entries younger than WIKI_CACHE_MAX_AGE seconds are used as they are; older ones are
+# revalidated against the article's latest revision id before being reused.
+WIKI_CACHE_DIR = os.getenv('WIKI_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wiki_cache'))
+WIKI_CACHE_MAX_MB = float(os.getenv('WIKI_CACHE_MAX_MB', 200))
+WIKI_CACHE_MAX_AGE = float(os.getenv('WIKI_CACHE_MAX_AGE', 3600))
+article_cache = ArticleCache(WIKI_CACHE_DIR, int(WIKI_CACHE_MAX_MB * 1024 * 1024)) if WIKI_CACHE_DIR else None
+
+@timed('fetch_wikipedia_article')
+def fetch_article_entry(title, lang_code='es', cache=None):
+    """Cache entry for an article (extract, revid, etag, word_freq), fetching or revalidating it as needed.
+
+    Returns None when the article does not exist. A cached copy is still returned when
+    Wikipedia cannot be reached; without one, request and API errors are raised.
+    """
+    cache = cache or article_cache
+    entry = cache.get(lang_code, title) if cache else None
+    if entry is not None and entry_is_fresh(entry, WIKI_CACHE_MAX_AGE):
+        return entry
+
+    if entry is not None:
+        # Ask only for the latest revision id: a few hundred bytes instead of the extract
+        try:
+            status, query, etag = query_api(lang_code, {"titles": title, "prop": "info"}, entry.get('info_etag'))
+        except (requests.RequestException, ValueError, WikipediaError) as error:
+            print(f"Could not revalidate '{title}', using the cached copy: {error}")
+            return entry
+        page = first_page(query) if status != 304 else None
+        if status == 304 or (page is not None and page.get('lastrevid') == entry.get('revid')):
+            entry.update(validated_at=time.time(), info_etag=etag)
+            cache.put(lang_code, title, entry)
+            return entry
+
+    # A newer revision (or no revision id to compare): fetch the extract, still conditional on its ETag
+    # No "exintro" key at all: MediaWiki reads any value of a boolean parameter, even
+    # "False", as true and would return only the lead section
+    params = {"titles": title, "prop": "extracts|revisions", "rvprop": "ids"}
+    try:
+        status, query, etag = query_api(lang_code, params, entry and entry.get('etag'))
+    except (requests.RequestException, ValueError, WikipediaError):
+        if entry is not None:
+            return entry
+        raise
+    if status == 304:
+        entry['validated_at'] = time.time()
+        cache.put(lang_code, title, entry)
+        return entry
+    page = first_page(query)
+    if page is None or not page.get('extract'):
+        return None
+    revisions = page.get('revisions') or [{}]
+    entry = {
+        'extract': page['extract'],
+        'revid': revisions[0].get('revid'),
+        'etag': etag,
+        'info_etag': None,
+        'validated_at': time.time(),
+        'word_freq': None,
+    }
+    if cache:
+        cache.put(lang_code, title, entry)
+    return entry
 
 # Function to fetch the full article content from Wikipedia API (no references)
 def fetch_wikipedia_article(title, lang_code='es'):
-    url = f"https://{lang_code}.wikipedia.org/w/api.php"
-    params = {
-        "action": "query",
-        "format": "json",
-        "titles": title,
-        "prop": "extracts",
-        "exintro": False,
-    }
-    response = requests.get(url, params=params)
-    data = response.json()
-    page = list(data['query']['pages'].values())[0]
-    extract = page.get('extract', "")
-    return extract
-
-# Function to clean and process text (removes HTML tags and non-alphanumeric characters)
-def clean_text(text):
-    # Use BeautifulSoup to remove HTML tags
-    text = BeautifulSoup(text, "html.parser").get_text()
-
-    # Remove non-alphanumeric characters (except for accented characters)
-    text = re.sub(r'[^a-zA-Záéíóúüñ\s]', '', text.lower())
-
-    # Further clean up any excessive whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
-
-    return text
-
-# Function to remove references from the article content
-def remove_references(text):
-    # Use BeautifulSoup to parse the HTML and remove <ref> tags
-    soup = BeautifulSoup(text, "html.parser")
-
-    # Remove all <ref> and <sup> tags (commonly used for citations and references)
-    for ref_tag in soup.find_all(['ref', 'sup']):
-        ref_tag.decompose()  # Decomposing removes the tag and its contents
+    try:
+        entry = fetch_article_entry(title, lang_code)
+    except (requests.RequestException, ValueError, WikipediaError) as error:
+        print(f"Failed to fetch '{title}': {error}")
+        return ""
+    return entry['extract'] if entry else ""
+
+# Word counts for one article. Cached with the extract, so rebuilding a deck from an
+# unchanged article skips both the download and process_text. None if it can't be fetched.
+@timed('article_word_freq')
+def fetch_article_word_freq(title, lang_code='es', cache=None):
+    cache = cache or article_cache
+    try:
+        entry = fetch_article_entry(title, lang_code, cache)
+    except (requests.RequestException, ValueError, WikipediaError) as error:
+        print(f"Failed to fetch '{title}': {error}")
+        return None
+    if entry is None:
+        return None
+    if entry['word_freq'] is None:
+        entry['word_freq'] = process_text(entry['extract'], lang_code)
+        # Counts made without stopwords (NLTK data unavailable) are used once but not kept
+        if cache and get_stopwords(LANG_MAP.get(lang_code, 'english')):
+            cache.put(lang_code, title, entry)
+    return entry['word_freq']
+
+# ---- Corpus mode: many articles -> one word-frequency Counter ----
+
+# MediaWiki accepts up to 50 titles per query
+TITLES_PER_REQUEST = 50
+
+# Follows MediaWiki "continue" tokens until the query is exhausted
+def query_all(lang_code, params):
+    params = dict(params, action="query", format="json")
+    cont = {}
+    while True:
+        response = http_session.get(api_url(lang_code), params={**params, **cont}, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+        yield data.get('query', {})
+        if 'continue' not in data:
+            return
+        cont = data['continue']
+
+# Function to fetch several articles at once using titles=A|B|C batching.
+# TextExtracts returns one full extract per response and a continue token for the
+# rest, so a batch is one query followed by continuations on the same connection.
+@timed('fetch_wikipedia_articles')
+def fetch_wikipedia_articles(titles, lang_code='es'):
+    articles = {}
+    for start in range(0, len(titles), TITLES_PER_REQUEST):
+        batch = titles[start:start + TITLES_PER_REQUEST]
+        params = {"titles": "|".join(batch), "prop": "extracts", "redirects": 1}
+        for query in query_all(lang_code, params):
+            for page in query.get('pages', {}).values():
+                if page.get('extract'):
+                    articles[page['title']] = page['extract']
+    return articles
+
+# Function to list the article titles in a Wikipedia category
+def fetch_category_titles(category, lang_code='es', limit=200):
+    if ':' not in category:
+        category = f"Category:{category}"
+    titles = []
+    params = {"list": "categorymembers", "cmtitle": category, "cmtype": "page", "cmlimit": min(limit, 500)}
+    for query in query_all(lang_code, params):
+        titles.extend(member['title'] for member in query.get('categorymembers', []))
+        if len(titles) >= limit:
+            break
+    return titles[:limit]
+
+# Spawned (not forked) workers, so the pool is safe to create from a threaded web server
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+def get_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+        return _process_pool
+
+# Function to run process_text over every article on the process pool and merge the counts
+@timed('process_corpus')
+def process_corpus(articles, lang_code='es', progress=None):
+    texts = list(articles.values() if isinstance(articles, dict) else articles)
+    word_freq = Counter()
+    if not texts:
+        return word_freq
+
+    pool = get_process_pool()
+    for done, counts in enumerate(pool.map(process_text, texts, [lang_code] * len(texts)), start=1):
+        word_freq.update(counts)
+        if progress:
+            progress(done, len(texts))
+    return word_freq
 
-    return str(soup)
+# Streaming HTML -> token pipeline. The parser drops <ref>/<sup> subtrees as it goes and
+# hands visible text straight to the tokenizer, so the article is parsed once and never
+# rebuilt as a cleaned string.
+SKIPPED_TAGS = {'ref', 'sup'}
+FEED_CHUNK_SIZE = 64 * 1024
+
+# A word is a run of Unicode letters (any script, any accents); digits and punctuation split words
+WORD_RE = re.compile(r"[^\W\d_]+")
+
+class ArticleTextParser(HTMLParser):
+    def __init__(self, on_text):
+        super().__init__(convert_charrefs=True)
+        self.on_text = on_text
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.on_text(data)
+
+def iter_chunks(text, size=FEED_CHUNK_SIZE):
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+# Yields lowercased, NFC-normalized words from HTML given as a string or an iterable of chunks
+def iter_tokens(html):
+    chunks = iter_chunks(html) if isinstance(html, str) else html
+    pending = []
+    parser = ArticleTextParser(pending.append)
+    carry = ''
+
+    def drain(final):
+        nonlocal carry
+        text = unicodedata.normalize('NFC', (carry + ''.join(pending)).lower())
+        pending.clear()
+        words = WORD_RE.findall(text)
+        # A word touching the end of the buffer may continue in the next chunk (or next tag)
+        carry = words.pop() if words and not final and text.endswith(words[-1]) else ''
+        return words
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        if pending:
+            yield from drain(final=False)
+    parser.close()
+    yield from drain(final=True)
 
 # Function to process text and calculate word frequency
+@timed('process_text')
 def process_text(text, lang_code='es'):
-    # Clean the text
-    cleaned_text = clean_text(text)
-
-    # Map Wikipedia language codes to NLTK language names
-    lang_map = {
-        'es': 'spanish',
-        'fr': 'french',
-        'de': 'german',
-        'it': 'italian',
-        'pt': 'portuguese'
-    }
-
     # Get NLTK language name or fall back to English
-    nltk_lang = lang_map.get(lang_code, 'english')
-
-    # Load sentence tokenizer for the language
-    try:
-        sentence_tokenizer = nltk.data.load(f'tokenizers/punkt/{nltk_lang}.pickle')
-    except LookupError:
-        print(f"Tokenizer for '{nltk_lang}' not found. Downloading punkt again.")
-        nltk.download('punkt', force=True)
-        sentence_tokenizer = nltk.data.load(f'tokenizers/punkt/{nltk_lang}.pickle')
-
-    # Tokenize into sentences, then words
-    sentences = sentence_tokenizer.tokenize(cleaned_text)
-    words = []
-    for sentence in sentences:
-        words.extend(word_tokenize(sentence))
-
-    # Load stopwords for the language
-    try:
-        stop_words = set(stopwords.words(nltk_lang))
-    except OSError:
-        print(f"Stopwords for '{nltk_lang}' not found. Using empty set.")
-        stop_words = set()
-
-    # Filter out stopwords and count word frequency
-    words = [word for word in words if word not in stop_words]
-    word_freq = Counter(words)
+    stop_words = get_stopwords(LANG_MAP.get(lang_code, 'english'))
 
-    return word_freq
+    # Filter out stopwords and count word frequency in the same pass as parsing
+    return Counter(word for word in iter_tokens(text) if word not in stop_words)
 
 # Function to save results to CSV (top 100 words and their frequency)
 def save_to_csv(word_freq, filename='top_100_words.csv'):
@@ -110,18 +334,23 @@ def save_to_csv(word_freq, filename='top_100_words.csv'):
 
     print(f"Top 100 words saved to {filename}")
 
+# Function to pick the translator behind the shared translation memo
+def default_translator():
+    # TRANSLATOR=stub translates offline (tests, benchmarks); anything else uses Google
+    if os.getenv('TRANSLATOR') == 'stub':
+        return StubTranslator()
+    return GoogleBatchTranslator()
+
+# Shared translation memo (in-memory only); app.py passes one backed by the translations table
+translation_cache = TranslationCache(translator=default_translator())
+
 # Function to translate words to English
-def translate_words(word_list, source_lang='es', target_lang='en'):
-    translations = []
-    for word in word_list:
-        try:
-            translated = GoogleTranslator(source=source_lang, target=target_lang).translate(word)
-            translations.append([word, translated])
-            time.sleep(0.5)
-        except Exception as e:
-            print(f"Error translating {word}: {e}")
-            translations.append([word, ""])
-    return translations
+# progress, if given, is called as progress(done, total) as batches come back
+@timed('translate_words')
+def translate_words(word_list, source_lang='es', target_lang='en', progress=None, cache=None):
+    cache = cache or translation_cache
+    translated = cache.translate(word_list, source_lang, target_lang, progress=progress)
+    return [[word, translated.get(word, "")] for word in word_list]
 
 
 # Function to save translated words to CSV
@@ -146,11 +375,8 @@ def main():
     article_content = fetch_wikipedia_article(article_title)
 
     if article_content:
-        # Remove references (like <ref> tags) from the content
-        clean_article = remove_references(article_content)
-
-        # Process the cleaned text and get word frequencies
-        word_freq = process_text(clean_article)
+        # Process the article (references are skipped while parsing) and get word frequencies
+        word_freq = process_text(article_content)
 
         # Save the results to CSV (top 100 words)
         save_to_csv(word_freq)
@@ -167,5 +393,33 @@ def main():
     else:
         print("No content found for the given article.")
 
+# Corpus CLI: python wiki_api.py --titles "Perro" "Gato" --lang es --top 200
+def corpus_main(argv=None):
+    parser = argparse.ArgumentParser(description="Build one word list from several Wikipedia articles.")
+    parser.add_argument('--titles', nargs='*', default=[], help="article titles")
+    parser.add_argument('--category', help="use the articles in this category instead")
+    parser.add_argument('--lang', default='es', help="Wikipedia language code")
+    parser.add_argument('--limit', type=int, default=200, help="max articles taken from the category")
+    parser.add_argument('--top', type=int, default=100, help="number of words to keep")
+    parser.add_argument('--output', default='translated_words.csv')
+    args = parser.parse_args(argv)
+
+    titles = list(args.titles)
+    if args.category:
+        titles += fetch_category_titles(args.category, args.lang, args.limit)
+    if not titles:
+        parser.error("give --titles or --category")
+
+    articles = fetch_wikipedia_articles(titles, args.lang)
+    print(f"Fetched {len(articles)} of {len(titles)} articles")
+
+    word_freq = process_corpus(articles, args.lang)
+    top_words = [word for word, _ in word_freq.most_common(args.top)]
+    translations = translate_words(top_words, source_lang=args.lang)
+    save_translated_words(translations, args.output)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if len(sys.argv) > 1:
+        corpus_main()
+    else:
+        main()
\ No newline at end of file